@@ -0,0 +1,38 @@
+"""history and task indexes
+
+Revision ID: 3b9c1f4d7a20
+Revises: e8805db11b64
+Create Date: 2026-10-19 18:30:12.418022
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9c1f4d7a20'
+down_revision: Union[str, Sequence[str], None] = 'e8805db11b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_username_recorded_at', 'influencer_metrics_history', ['username', 'recorded_at'], unique=False)
+    op.drop_index(op.f('ix_influencer_metrics_history_id'), table_name='influencer_metrics_history')
+    op.create_index('ix_post_code_recorded_at_metrics', 'post_metrics_history', ['post_code', 'recorded_at', 'like_count', 'comment_count', 'play_count'], unique=False)
+    op.drop_index('ix_post_code_recorded_at', table_name='post_metrics_history')
+    op.drop_index(op.f('ix_post_metrics_history_id'), table_name='post_metrics_history')
+    op.create_index('ix_interval_seconds_status', 'task', ['interval_seconds', 'status'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_interval_seconds_status', table_name='task')
+    op.create_index(op.f('ix_post_metrics_history_id'), 'post_metrics_history', ['id'], unique=False)
+    op.create_index('ix_post_code_recorded_at', 'post_metrics_history', ['post_code', 'recorded_at'], unique=False)
+    op.drop_index('ix_post_code_recorded_at_metrics', table_name='post_metrics_history')
+    op.create_index(op.f('ix_influencer_metrics_history_id'), 'influencer_metrics_history', ['id'], unique=False)
+    op.drop_index('ix_username_recorded_at', table_name='influencer_metrics_history')
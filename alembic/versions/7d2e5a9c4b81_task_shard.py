@@ -0,0 +1,39 @@
+"""task shard
+
+Revision ID: 7d2e5a9c4b81
+Revises: 3b9c1f4d7a20
+Create Date: 2026-10-19 19:02:47.103384
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2e5a9c4b81'
+down_revision: Union[str, Sequence[str], None] = '3b9c1f4d7a20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# app.utils.sharding.SHARD_COUNT when this revision was written. Inlined so the
+# migration doesn't change if the constant does; scripts.reshard_tasks moves
+# tasks to a new count.
+SHARD_COUNT = 64
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('task', sa.Column('shard', sa.SmallInteger(), server_default='0', nullable=False))
+    # Same hash as app.utils.sharding.shard_for (zlib.crc32 == MySQL CRC32).
+    op.execute(sa.text('UPDATE task SET shard = CRC32(id) % :shard_count').bindparams(shard_count=SHARD_COUNT))
+    op.create_index('ix_interval_seconds_status_shard', 'task', ['interval_seconds', 'status', 'shard'], unique=False)
+    op.drop_index('ix_interval_seconds_status', table_name='task')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_interval_seconds_status', 'task', ['interval_seconds', 'status'], unique=False)
+    op.drop_index('ix_interval_seconds_status_shard', table_name='task')
+    op.drop_column('task', 'shard')
@@ -0,0 +1,35 @@
+"""run outcome throttled
+
+Revision ID: 9c3e7b2a5f18
+Revises: d6a1e4b9c027
+Create Date: 2026-10-20 10:12:36.481920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c3e7b2a5f18'
+down_revision: Union[str, Sequence[str], None] = 'd6a1e4b9c027'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.alter_column('task_run', 'outcome',
+               existing_type=sa.Enum('success', 'fallback', 'failed', name='runoutcomeenum'),
+               type_=sa.Enum('success', 'fallback', 'failed', 'throttled', name='runoutcomeenum'),
+               existing_nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM task_run WHERE outcome = 'throttled'")
+    op.alter_column('task_run', 'outcome',
+               existing_type=sa.Enum('success', 'fallback', 'failed', 'throttled', name='runoutcomeenum'),
+               type_=sa.Enum('success', 'fallback', 'failed', name='runoutcomeenum'),
+               existing_nullable=False)
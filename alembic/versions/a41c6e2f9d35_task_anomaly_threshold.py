@@ -0,0 +1,28 @@
+"""task anomaly threshold
+
+Revision ID: a41c6e2f9d35
+Revises: 7d2e5a9c4b81
+Create Date: 2026-10-19 20:14:09.552871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a41c6e2f9d35'
+down_revision: Union[str, Sequence[str], None] = '7d2e5a9c4b81'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('task', sa.Column('anomaly_threshold', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('task', 'anomaly_threshold')
@@ -0,0 +1,28 @@
+"""influencer engagement rate
+
+Revision ID: b8e4c1d7f362
+Revises: f3a9d27c6b15
+Create Date: 2026-10-19 23:18:02.640517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e4c1d7f362'
+down_revision: Union[str, Sequence[str], None] = 'f3a9d27c6b15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('influencer_metrics_history', sa.Column('engagement_rate', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('influencer_metrics_history', 'engagement_rate')
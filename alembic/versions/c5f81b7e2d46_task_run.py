@@ -0,0 +1,45 @@
+"""task run
+
+Revision ID: c5f81b7e2d46
+Revises: a41c6e2f9d35
+Create Date: 2026-10-19 20:51:33.218406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5f81b7e2d46'
+down_revision: Union[str, Sequence[str], None] = 'a41c6e2f9d35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('task_run',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('task_id', sa.String(length=36), nullable=False),
+    sa.Column('task_type', sa.Enum('influencer', 'post', name='tasktypeenum'), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.Column('outcome', sa.Enum('success', 'fallback', 'failed', name='runoutcomeenum'), nullable=False),
+    sa.Column('http_status', sa.SmallInteger(), nullable=True),
+    sa.Column('queue_wait_ms', sa.Integer(), nullable=True),
+    sa.Column('fetch_ms', sa.Integer(), nullable=True),
+    sa.Column('write_ms', sa.Integer(), nullable=True),
+    sa.Column('total_ms', sa.Integer(), nullable=False),
+    sa.Column('error', sa.String(length=255), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_task_id_started_at', 'task_run', ['task_id', 'started_at'], unique=False)
+    op.create_index('ix_started_at', 'task_run', ['started_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_started_at', table_name='task_run')
+    op.drop_index('ix_task_id_started_at', table_name='task_run')
+    op.drop_table('task_run')
@@ -0,0 +1,42 @@
+"""task listing indexes
+
+Revision ID: d6a1e4b9c027
+Revises: b8e4c1d7f362
+Create Date: 2026-10-20 09:41:27.318804
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd6a1e4b9c027'
+down_revision: Union[str, Sequence[str], None] = 'b8e4c1d7f362'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LISTING_INDEXES = {
+    'ix_task_type_username': ['task_type', 'username'],
+    'ix_task_type_status_username': ['task_type', 'status', 'username'],
+    'ix_task_type_interval_username': ['task_type', 'interval_seconds', 'username'],
+    'ix_task_type_post_code': ['task_type', 'post_code'],
+    'ix_task_type_status_post_code': ['task_type', 'status', 'post_code'],
+    'ix_task_type_interval_post_code': ['task_type', 'interval_seconds', 'post_code'],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, columns in LISTING_INDEXES.items():
+        op.create_index(name, 'task', columns, unique=False)
+    # A prefix of ix_task_type_username.
+    op.drop_index('ix_task_type', table_name='task')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_task_type', 'task', ['task_type'], unique=False)
+    for name in LISTING_INDEXES:
+        op.drop_index(name, table_name='task')
@@ -0,0 +1,48 @@
+"""metrics chunks
+
+Revision ID: f3a9d27c6b15
+Revises: c5f81b7e2d46
+Create Date: 2026-10-19 22:37:48.104733
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a9d27c6b15'
+down_revision: Union[str, Sequence[str], None] = 'c5f81b7e2d46'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('influencer_metrics_chunk',
+    sa.Column('username', sa.String(length=255), nullable=False),
+    sa.Column('chunk_start', sa.DateTime(), nullable=False),
+    sa.Column('user_id', sa.BigInteger(), nullable=False),
+    sa.Column('sample_count', sa.Integer(), nullable=False),
+    sa.Column('first_recorded_at', sa.DateTime(), nullable=False),
+    sa.Column('last_recorded_at', sa.DateTime(), nullable=False),
+    sa.Column('payload', sa.LargeBinary(length=16777215), nullable=False),
+    sa.PrimaryKeyConstraint('username', 'chunk_start')
+    )
+    op.create_table('post_metrics_chunk',
+    sa.Column('post_code', sa.String(length=50), nullable=False),
+    sa.Column('chunk_start', sa.DateTime(), nullable=False),
+    sa.Column('post_id', sa.String(length=50), nullable=False),
+    sa.Column('sample_count', sa.Integer(), nullable=False),
+    sa.Column('first_recorded_at', sa.DateTime(), nullable=False),
+    sa.Column('last_recorded_at', sa.DateTime(), nullable=False),
+    sa.Column('payload', sa.LargeBinary(length=16777215), nullable=False),
+    sa.PrimaryKeyConstraint('post_code', 'chunk_start')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('post_metrics_chunk')
+    op.drop_table('influencer_metrics_chunk')
@@ -0,0 +1,38 @@
+from typing import Optional
+from fastapi import Depends, Header, HTTPException, status
+from redis.asyncio import Redis
+from sqlalchemy.orm import Session
+from app.core.security import ADMIN_TOKEN_HEADER, is_admin_token
+from app.db.dependencies import get_db, get_read_db
+from app.db.history_cache import local_history_cache
+from app.db.redis import get_redis_client, get_redis_binary_client
+from app.services.influencer import InfluencerService
+from app.services.post import PostService
+from app.services.task_runs import TaskRunService
+
+
+async def get_influencer_service(
+    db: Session = Depends(get_db),
+    redis_client: Redis = Depends(get_redis_client),
+    cache_client: Redis = Depends(get_redis_binary_client),
+    read_db: Session = Depends(get_read_db),
+) -> InfluencerService:
+    return InfluencerService(db, redis_client, cache_client, read_db, local_history_cache)
+
+
+async def get_post_service(
+    db: Session = Depends(get_db),
+    redis_client: Redis = Depends(get_redis_client),
+    cache_client: Redis = Depends(get_redis_binary_client),
+    read_db: Session = Depends(get_read_db),
+) -> PostService:
+    return PostService(db, redis_client, cache_client, read_db, local_history_cache)
+
+
+def get_task_run_service(db: Session = Depends(get_read_db)) -> TaskRunService:
+    return TaskRunService(db)
+
+
+def require_admin(token: Optional[str] = Header(None, alias=ADMIN_TOKEN_HEADER)):
+    if not is_admin_token(token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin token required")
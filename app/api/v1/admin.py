@@ -0,0 +1,29 @@
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import FileResponse
+from app.api.dependencies import require_admin
+from app.core.config import settings
+from app.schemas.admin import ProfileListData
+from app.schemas.response import Response
+from app.utils.profiler import SUFFIX, list_profiles
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.get("/profiles", response_model=Response[ProfileListData])
+def get_profiles(limit: int = Query(50, ge=1, le=500)):
+    """
+    Recent profiler captures, newest first. Open them at https://www.speedscope.app.
+    """
+    return Response(data=ProfileListData(profiles=list_profiles(limit)))
+
+
+@router.get("/profiles/{name}")
+def download_profile(name: str):
+    """
+    Download one capture.
+    """
+    path = os.path.join(settings.PROFILE_DIR, os.path.basename(name))
+    if not name.endswith(SUFFIX) or not os.path.isfile(path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return FileResponse(path, media_type="application/json", filename=os.path.basename(name))
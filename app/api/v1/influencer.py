@@ -1,33 +1,46 @@
 import uuid
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from app.services.influencer import InfluencerService, get_influencer_service
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status, Response as HTTPResponse
+from app.api.dependencies import get_influencer_service
+from app.services.influencer import InfluencerService
 from app.schemas.influencer import (
     CreateMonitorTaskRequest,
     CreateMonitorTaskData,
     UserHistoryData,
-    TaskData,
+    TaskListData,
+    TaskSummaryData,
     StopTasksRequest,
     StopTasksData,
     TaskStatusData,
     TaskUpdateData,
+    AnomalyFeedData,
+    AnomalyThresholdRequest,
+    AnomalyThresholdData,
+    LeaderboardMetricEnum,
+    LeaderboardEntryData,
+    LeaderboardData,
 )
+from app.schemas.refresh import RefreshData
 from app.schemas.response import Response
+from app.schemas.enums import IntervalEnum, INTERVAL_MAP, LeaderboardWindowEnum, RefreshStateEnum
+from app.utils.http_cache import history_cache_headers, is_not_modified
 from app.db.enums import TaskStatusEnum
+from app.core.config import settings
 
 router = APIRouter()
 
 @router.post("/create_monitor_task", status_code=status.HTTP_201_CREATED, response_model=Response[CreateMonitorTaskData])
-def create_monitor_task(
+async def create_monitor_task(
     task_data: CreateMonitorTaskRequest,
     service: InfluencerService = Depends(get_influencer_service),
 ):
     """
     Create a new influencer monitoring task.
     """
-    if service.get_task_by_username(task_data.username):
+    if await service.run_db(service.get_task_by_username, task_data.username):
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Task with that username already exists")
-    task = service.create_monitor_task(task_data)
+    task = await service.create_monitor_task(task_data)
     return Response(
         status_code=status.HTTP_201_CREATED,
         data=CreateMonitorTaskData(
@@ -41,24 +54,57 @@ def create_monitor_task(
 @router.get("/user_history/{username}", response_model=Response[UserHistoryData])
 async def get_user_history(
     username: str,
+    request: Request,
     service: InfluencerService = Depends(get_influencer_service),
 ):
     """
     Retrieve historical data for a monitored user.
     """
-    history = await service.get_user_history(username)
-    return Response(data=UserHistoryData(username=username, history=history))
+    headers = history_cache_headers(await service.get_user_history_meta(username))
+    if is_not_modified(request.headers, headers):
+        return HTTPResponse(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
 
-@router.get("/tasks", response_model=Response[List[TaskData]])
-def list_tasks(service: InfluencerService = Depends(get_influencer_service)):
+    body = await service.get_user_history(username)
+    return HTTPResponse(content=body, media_type="application/json", headers=headers)
+
+@router.get("/tasks", response_model=Response[TaskListData])
+def list_tasks(
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    status: Optional[TaskStatusEnum] = None,
+    interval: Optional[IntervalEnum] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    updated_after: Optional[datetime] = None,
+    updated_before: Optional[datetime] = None,
+    username_prefix: Optional[str] = None,
+    service: InfluencerService = Depends(get_influencer_service),
+):
+    """
+    List influencer monitoring tasks, one page at a time. Pass `next_cursor` back as `cursor` for the next page.
+    """
+    tasks, next_cursor = service.list_tasks(
+        limit=limit,
+        cursor=cursor,
+        username_prefix=username_prefix,
+        status=status,
+        interval_seconds=INTERVAL_MAP[interval] if interval else None,
+        created_after=created_after,
+        created_before=created_before,
+        updated_after=updated_after,
+        updated_before=updated_before,
+    )
+    return Response(data=TaskListData(tasks=tasks, next_cursor=next_cursor))
+
+@router.get("/tasks/summary", response_model=Response[TaskSummaryData])
+async def task_summary(service: InfluencerService = Depends(get_influencer_service)):
     """
-    List all influencer monitoring tasks.
+    Count influencer monitoring tasks per status and interval.
     """
-    tasks = service.list_tasks()
-    return Response(data=tasks)
+    return Response(data=TaskSummaryData(**await service.task_summary()))
 
 @router.post("/stop_tasks", response_model=Response[StopTasksData])
-def stop_tasks(
+async def stop_tasks(
     stop_request: StopTasksRequest,
     service: InfluencerService = Depends(get_influencer_service),
 ):
@@ -66,7 +112,7 @@ def stop_tasks(
     Stop one or more monitoring tasks.
     """
     task_ids_str = [str(tid) for tid in stop_request.task_ids]
-    stopped_ids = service.stop_tasks(task_ids_str)
+    stopped_ids = await service.stop_tasks(task_ids_str)
     stopped_ids_uuid = [uuid.UUID(sid) for sid in stopped_ids]
     return Response(data=StopTasksData(deleted_task_ids=stopped_ids_uuid))
 
@@ -108,3 +154,99 @@ async def resume_task(
     if not task:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
     return Response(data=TaskUpdateData(task_id=uuid.UUID(task.id), status=task.status))
+
+@router.get("/anomalies", response_model=Response[AnomalyFeedData])
+async def list_anomalies(
+    username: Optional[str] = None,
+    before: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    service: InfluencerService = Depends(get_influencer_service),
+):
+    """
+    Anomalies flagged for influencer tasks (or one user), newest first. Pass `next_cursor` back as `before` for older ones.
+    """
+    anomalies, next_cursor = await service.anomaly_feed(username, before, limit)
+    return Response(data=AnomalyFeedData(anomalies=anomalies, next_cursor=next_cursor))
+
+@router.post("/anomaly_threshold/{task_id}", response_model=Response[AnomalyThresholdData])
+def set_anomaly_threshold(
+    task_id: uuid.UUID,
+    threshold_request: AnomalyThresholdRequest,
+    service: InfluencerService = Depends(get_influencer_service),
+):
+    """
+    Set the z-score threshold for flagging samples of a task; null restores the default.
+    """
+    task = service.set_anomaly_threshold(str(task_id), threshold_request.threshold)
+    if not task:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+    return Response(data=AnomalyThresholdData(task_id=uuid.UUID(task.id), anomaly_threshold=task.anomaly_threshold))
+
+@router.get("/leaderboard", response_model=Response[LeaderboardData])
+async def leaderboard(
+    metric: LeaderboardMetricEnum,
+    window: LeaderboardWindowEnum = LeaderboardWindowEnum.total,
+    limit: int = Query(50, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    service: InfluencerService = Depends(get_influencer_service),
+):
+    """
+    Top influencers by latest value ("total") or by growth over the last 1h/24h/7d.
+    """
+    entries = await service.leaderboard_top(metric.value, window.value, limit, offset)
+    return Response(data=LeaderboardData(metric=metric, window=window, entries=entries))
+
+@router.get("/leaderboard/{username}", response_model=Response[LeaderboardEntryData])
+async def leaderboard_rank(
+    username: str,
+    metric: LeaderboardMetricEnum,
+    window: LeaderboardWindowEnum = LeaderboardWindowEnum.total,
+    service: InfluencerService = Depends(get_influencer_service),
+):
+    """
+    Rank of one user on a leaderboard.
+    """
+    entry = await service.leaderboard_rank(metric.value, window.value, username)
+    if not entry:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User is not on this leaderboard")
+    return Response(data=LeaderboardEntryData(**entry))
+
+@router.post("/refresh/{task_id}", response_model=Response[RefreshData])
+async def refresh_task(
+    task_id: uuid.UUID,
+    response: HTTPResponse,
+    wait: float = Query(0, ge=0, le=settings.REFRESH_MAX_WAIT_SECONDS),
+    service: InfluencerService = Depends(get_influencer_service),
+):
+    """
+    Fetch a new sample for a influencer task now. Joins a run already queued or in flight,
+    and returns 429 during the per-task cooldown. With `wait`, blocks up to that many
+    seconds for the run; otherwise (or on timeout) returns 202 with `after_seq` to poll.
+    """
+    task = await service.run_db(service.get_task, str(task_id))
+    if not task:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+    if task.status == TaskStatusEnum.stopped:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Task is stopped")
+
+    refresh = await service.refresh(task.id, wait)
+    if refresh["state"] == "cooldown":
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Task was refreshed recently",
+            headers={"Retry-After": str(refresh["retry_after"])},
+        )
+    if refresh["state"] != RefreshStateEnum.done:
+        response.status_code = status.HTTP_202_ACCEPTED
+    return Response(status_code=response.status_code or status.HTTP_200_OK, data=RefreshData(**refresh))
+
+@router.get("/refresh_status/{task_id}", response_model=Response[RefreshData])
+async def refresh_status(
+    task_id: uuid.UUID,
+    after_seq: int,
+    service: InfluencerService = Depends(get_influencer_service),
+):
+    """
+    Poll a refresh started with `/refresh/{task_id}`.
+    """
+    return Response(data=RefreshData(**await service.refresh_status(str(task_id), after_seq)))
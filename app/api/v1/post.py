@@ -1,25 +1,38 @@
 import uuid
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from app.services.post import PostService, get_post_service, extract_post_code
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status, Response as HTTPResponse
+from app.api.dependencies import get_post_service
+from app.services.post import PostService, extract_post_code
 from app.schemas.post import (
     CreatePostMonitorTaskRequest,
     CreatePostMonitorTaskData,
     VideoHistoryData,
-    PostTaskData,
+    PostTaskListData,
+    PostTaskSummaryData,
     StopPostTasksRequest,
     StopPostTasksData,
     PostTaskStatusData,
     PostTaskUpdateData,
+    PostAnomalyFeedData,
+    PostAnomalyThresholdRequest,
+    PostAnomalyThresholdData,
+    PostLeaderboardMetricEnum,
+    PostLeaderboardEntryData,
+    PostLeaderboardData,
 )
+from app.schemas.refresh import RefreshData
 from app.schemas.response import Response
+from app.schemas.enums import IntervalEnum, INTERVAL_MAP, LeaderboardWindowEnum, RefreshStateEnum
+from app.utils.http_cache import history_cache_headers, is_not_modified
 from app.db.enums import TaskStatusEnum
+from app.core.config import settings
 
 router = APIRouter()
 
 
 @router.post("/create_monitor_task", status_code=status.HTTP_201_CREATED, response_model=Response[CreatePostMonitorTaskData])
-def create_monitor_task(
+async def create_monitor_task(
     task_data: CreatePostMonitorTaskRequest,
     service: PostService = Depends(get_post_service),
 ):
@@ -30,10 +43,10 @@ def create_monitor_task(
     if not post_code:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Instagram post URL")
     
-    if service.get_task_by_post_code(post_code):
+    if await service.run_db(service.get_task_by_post_code, post_code):
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Task with this post code already exists")
 
-    task = service.create_monitor_task(task_data, post_code)
+    task = await service.create_monitor_task(task_data, post_code)
     return Response(
         status_code=status.HTTP_201_CREATED,
         data=CreatePostMonitorTaskData(
@@ -48,26 +61,60 @@ def create_monitor_task(
 @router.get("/video_history/{post_code}", response_model=Response[VideoHistoryData])
 async def get_video_history(
     post_code: str,
+    request: Request,
     service: PostService = Depends(get_post_service),
 ):
     """
     Retrieve historical engagement data for the post.
     """
-    history = await service.get_video_history(post_code)
-    return Response(data=VideoHistoryData(post_code=post_code, history=history))
+    headers = history_cache_headers(await service.get_video_history_meta(post_code))
+    if is_not_modified(request.headers, headers):
+        return HTTPResponse(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
 
+    body = await service.get_video_history(post_code)
+    return HTTPResponse(content=body, media_type="application/json", headers=headers)
 
-@router.get("/tasks", response_model=Response[List[PostTaskData]])
-def list_tasks(service: PostService = Depends(get_post_service)):
+
+@router.get("/tasks", response_model=Response[PostTaskListData])
+def list_tasks(
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    status: Optional[TaskStatusEnum] = None,
+    interval: Optional[IntervalEnum] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    updated_after: Optional[datetime] = None,
+    updated_before: Optional[datetime] = None,
+    post_code_prefix: Optional[str] = None,
+    service: PostService = Depends(get_post_service),
+):
+    """
+    List post monitoring tasks, one page at a time. Pass `next_cursor` back as `cursor` for the next page.
+    """
+    tasks, next_cursor = service.list_tasks(
+        limit=limit,
+        cursor=cursor,
+        post_code_prefix=post_code_prefix,
+        status=status,
+        interval_seconds=INTERVAL_MAP[interval] if interval else None,
+        created_after=created_after,
+        created_before=created_before,
+        updated_after=updated_after,
+        updated_before=updated_before,
+    )
+    return Response(data=PostTaskListData(tasks=tasks, next_cursor=next_cursor))
+
+
+@router.get("/tasks/summary", response_model=Response[PostTaskSummaryData])
+async def task_summary(service: PostService = Depends(get_post_service)):
     """
-    List all post monitoring tasks.
+    Count post monitoring tasks per status and interval.
     """
-    tasks = service.list_tasks()
-    return Response(data=tasks)
+    return Response(data=PostTaskSummaryData(**await service.task_summary()))
 
 
 @router.post("/stop_tasks", response_model=Response[StopPostTasksData])
-def stop_tasks(
+async def stop_tasks(
     stop_request: StopPostTasksRequest,
     service: PostService = Depends(get_post_service),
 ):
@@ -75,7 +122,7 @@ def stop_tasks(
     Stop one or more post monitoring tasks.
     """
     task_ids_str = [str(tid) for tid in stop_request.task_ids]
-    stopped_ids = service.stop_tasks(task_ids_str)
+    stopped_ids = await service.stop_tasks(task_ids_str)
     stopped_ids_uuid = [uuid.UUID(sid) for sid in stopped_ids]
     return Response(data=StopPostTasksData(deleted_task_ids=stopped_ids_uuid))
 
@@ -120,3 +167,105 @@ async def resume_task(
     if not task:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
     return Response(data=PostTaskUpdateData(task_id=uuid.UUID(task.id), status=task.status))
+
+
+@router.get("/anomalies", response_model=Response[PostAnomalyFeedData])
+async def list_anomalies(
+    post_code: Optional[str] = None,
+    before: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    service: PostService = Depends(get_post_service),
+):
+    """
+    Anomalies flagged for post tasks (or one post), newest first. Pass `next_cursor` back as `before` for older ones.
+    """
+    anomalies, next_cursor = await service.anomaly_feed(post_code, before, limit)
+    return Response(data=PostAnomalyFeedData(anomalies=anomalies, next_cursor=next_cursor))
+
+
+@router.post("/anomaly_threshold/{task_id}", response_model=Response[PostAnomalyThresholdData])
+def set_anomaly_threshold(
+    task_id: uuid.UUID,
+    threshold_request: PostAnomalyThresholdRequest,
+    service: PostService = Depends(get_post_service),
+):
+    """
+    Set the z-score threshold for flagging samples of a task; null restores the default.
+    """
+    task = service.set_anomaly_threshold(str(task_id), threshold_request.threshold)
+    if not task:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+    return Response(data=PostAnomalyThresholdData(task_id=uuid.UUID(task.id), anomaly_threshold=task.anomaly_threshold))
+
+
+@router.get("/leaderboard", response_model=Response[PostLeaderboardData])
+async def leaderboard(
+    metric: PostLeaderboardMetricEnum,
+    window: LeaderboardWindowEnum = LeaderboardWindowEnum.total,
+    limit: int = Query(50, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    service: PostService = Depends(get_post_service),
+):
+    """
+    Top posts by latest value ("total") or by growth over the last 1h/24h/7d.
+    """
+    entries = await service.leaderboard_top(metric.value, window.value, limit, offset)
+    return Response(data=PostLeaderboardData(metric=metric, window=window, entries=entries))
+
+
+@router.get("/leaderboard/{post_code}", response_model=Response[PostLeaderboardEntryData])
+async def leaderboard_rank(
+    post_code: str,
+    metric: PostLeaderboardMetricEnum,
+    window: LeaderboardWindowEnum = LeaderboardWindowEnum.total,
+    service: PostService = Depends(get_post_service),
+):
+    """
+    Rank of one post on a leaderboard.
+    """
+    entry = await service.leaderboard_rank(metric.value, window.value, post_code)
+    if not entry:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post is not on this leaderboard")
+    return Response(data=PostLeaderboardEntryData(**entry))
+
+
+@router.post("/refresh/{task_id}", response_model=Response[RefreshData])
+async def refresh_task(
+    task_id: uuid.UUID,
+    response: HTTPResponse,
+    wait: float = Query(0, ge=0, le=settings.REFRESH_MAX_WAIT_SECONDS),
+    service: PostService = Depends(get_post_service),
+):
+    """
+    Fetch a new sample for a post task now. Joins a run already queued or in flight,
+    and returns 429 during the per-task cooldown. With `wait`, blocks up to that many
+    seconds for the run; otherwise (or on timeout) returns 202 with `after_seq` to poll.
+    """
+    task = await service.run_db(service.get_task, str(task_id))
+    if not task:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+    if task.status == TaskStatusEnum.stopped:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Task is stopped")
+
+    refresh = await service.refresh(task.id, wait)
+    if refresh["state"] == "cooldown":
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Task was refreshed recently",
+            headers={"Retry-After": str(refresh["retry_after"])},
+        )
+    if refresh["state"] != RefreshStateEnum.done:
+        response.status_code = status.HTTP_202_ACCEPTED
+    return Response(status_code=response.status_code or status.HTTP_200_OK, data=RefreshData(**refresh))
+
+
+@router.get("/refresh_status/{task_id}", response_model=Response[RefreshData])
+async def refresh_status(
+    task_id: uuid.UUID,
+    after_seq: int,
+    service: PostService = Depends(get_post_service),
+):
+    """
+    Poll a refresh started with `/refresh/{task_id}`.
+    """
+    return Response(data=RefreshData(**await service.refresh_status(str(task_id), after_seq)))
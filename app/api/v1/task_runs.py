@@ -0,0 +1,44 @@
+import uuid
+from fastapi import APIRouter, Depends, Query
+from app.api.dependencies import get_task_run_service
+from app.services.task_runs import TaskRunService
+from app.schemas.task_run import TaskRunListData, TaskRunStatsData, TaskRunReportData
+from app.schemas.response import Response
+
+router = APIRouter()
+
+
+@router.get("/report", response_model=Response[TaskRunReportData])
+def run_report(
+    hours: int = Query(24, ge=1, le=24 * 90),
+    limit: int = Query(20, ge=1, le=200),
+    service: TaskRunService = Depends(get_task_run_service),
+):
+    """
+    Slowest monitors by average run duration and monitors with the most failed or fallback runs.
+    """
+    return Response(data=TaskRunReportData(**service.report(hours, limit)))
+
+
+@router.get("/{task_id}", response_model=Response[TaskRunListData])
+def recent_runs(
+    task_id: uuid.UUID,
+    limit: int = Query(50, ge=1, le=1000),
+    service: TaskRunService = Depends(get_task_run_service),
+):
+    """
+    Most recent runs of a task, newest first.
+    """
+    return Response(data=TaskRunListData(runs=service.recent_runs(str(task_id), limit)))
+
+
+@router.get("/{task_id}/stats", response_model=Response[TaskRunStatsData])
+def run_stats(
+    task_id: uuid.UUID,
+    hours: int = Query(24, ge=1, le=24 * 90),
+    service: TaskRunService = Depends(get_task_run_service),
+):
+    """
+    Outcome counts and p50/p95/p99 of queue wait, fetch, write and total time for a task.
+    """
+    return Response(data=TaskRunStatsData(**service.run_stats(str(task_id), hours)))
@@ -0,0 +1 @@
+from .segments import ArchiveRecord, ArchiveSpool, ArchiveWriter, SegmentReader, get_archive_writer, list_segments, prune_archive
@@ -0,0 +1,144 @@
+"""
+Replays archived raw responses through the metrics extraction.
+
+Walks the archive segments in parallel (one segment per worker process),
+re-extracts the metrics from every stored response and rebuilds the history
+rows with the original recorded_at. Without --write it only reports what would
+be produced, which is how a parser change can be validated against real
+payloads; with --write the rows are bulk-inserted, which rebuilds history
+that is missing (e.g. lost tables or a gap). Responses whose monitor already
+has a sample recorded within ARCHIVE_REPLAY_MATCH_SECONDS after them were
+written by their run at the time and are skipped, so replaying a range twice
+(or over history that is still there) adds no duplicates. Existing samples are
+never updated, so --write does not fill a new metric into them.
+
+Usage:
+    python -m app.archive.replay --since 2024-01-01 --until 2024-02-01 --workers 8 [--write]
+"""
+import argparse
+import bisect
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from itertools import repeat
+from typing import Optional
+from app.archive.segments import SegmentReader, list_segments
+from app.core.config import settings
+from app.db.enums import TaskTypeEnum
+from app.utils.tikhub import extract_metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _new_rows(db, store, rows: list) -> list:
+    """
+    The rows whose monitor has no sample recorded from a second before them
+    (recorded_at may be truncated to the second) up to ARCHIVE_REPLAY_MATCH_SECONDS after.
+    """
+    before = timedelta(seconds=1)
+    after = timedelta(seconds=settings.ARCHIVE_REPLAY_MATCH_SECONDS)
+    by_key = defaultdict(list)
+    for row in rows:
+        by_key[row[store.key_name]].append(row)
+    new = []
+    for key, key_rows in by_key.items():
+        times = [row["recorded_at"] for row in key_rows]
+        existing = [store.recorded_at(sample) for sample in store.history(db, key, since=min(times) - before, until=max(times) + after, desc=False)]
+        for row in key_rows:
+            i = bisect.bisect_left(existing, row["recorded_at"] - before)
+            if i == len(existing) or existing[i] >= row["recorded_at"] + after:
+                new.append(row)
+    return new
+
+
+def replay_segment(path: str, task_id: Optional[str] = None, write: bool = False) -> tuple[int, int, int]:
+    """
+    Replays one segment and returns (responses read, history rows built, rows
+    skipped as already recorded). Rows are only checked against the history when writing.
+    """
+    from app.services.influencer import HISTORY_CHUNKS as INFLUENCER_CHUNKS, build_history_row as build_influencer_row
+    from app.services.post import HISTORY_CHUNKS as POST_CHUNKS, build_history_row as build_post_row
+
+    builders = {
+        TaskTypeEnum.influencer: (INFLUENCER_CHUNKS, build_influencer_row),
+        TaskTypeEnum.post: (POST_CHUNKS, build_post_row),
+    }
+    rows = {task_type: [] for task_type in builders}
+    responses = 0
+    with SegmentReader(path) as reader:
+        records = reader.find(task_id=task_id) if task_id else reader
+        for record in records:
+            responses += 1
+            metrics = extract_metrics(record.task_type, record.response())
+            if not metrics:
+                continue
+            try:
+                row = builders[record.task_type][1](record.key, metrics)
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Skipping record for task {record.task_id} in {path}: {e}")
+                continue
+            row["recorded_at"] = datetime.fromtimestamp(record.recorded_at, timezone.utc).replace(tzinfo=None)
+            rows[record.task_type].append(row)
+
+    built = sum(len(r) for r in rows.values())
+    skipped = 0
+    if write:
+        from app.db.session import SessionLocal
+
+        db = SessionLocal()
+        try:
+            for task_type, (store, _) in builders.items():
+                new = _new_rows(db, store, rows[task_type])
+                skipped += len(rows[task_type]) - len(new)
+                db.bulk_insert_mappings(store.model, new)
+            db.commit()
+        finally:
+            db.close()
+    return responses, built, skipped
+
+
+def replay(since: Optional[date] = None, until: Optional[date] = None, workers: int = os.cpu_count() or 1,
+           task_id: Optional[str] = None, write: bool = False, root: str = settings.ARCHIVE_DIR) -> dict:
+    segments = list_segments(root, since, until)
+    started = time.perf_counter()
+    responses = rows = skipped = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for segment_responses, segment_rows, segment_skipped in executor.map(replay_segment, segments, repeat(task_id), repeat(write)):
+            responses += segment_responses
+            rows += segment_rows
+            skipped += segment_skipped
+    elapsed = time.perf_counter() - started
+    return {
+        "segments": len(segments),
+        "responses": responses,
+        "rows": rows,
+        "skipped": skipped,
+        "seconds": elapsed,
+        "responses_per_second": responses / elapsed if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--since", type=date.fromisoformat, help="first day to replay (UTC, inclusive)")
+    parser.add_argument("--until", type=date.fromisoformat, help="last day to replay (UTC, exclusive)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--task-id", help="only replay responses for this task")
+    parser.add_argument("--archive-dir", default=settings.ARCHIVE_DIR)
+    parser.add_argument("--write", action="store_true", help="insert the rebuilt rows into the history tables")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    result = replay(args.since, args.until, args.workers, args.task_id, args.write, args.archive_dir)
+    print(
+        f"{result['segments']} segments, {result['responses']} responses, {result['rows']} rows "
+        f"in {result['seconds']:.2f}s ({result['responses_per_second']:.0f} responses/s)"
+        + (f", {result['skipped']} already recorded" if args.write else " [dry run]")
+    )
+
+
+if __name__ == "__main__":
+    main()
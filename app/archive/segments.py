@@ -0,0 +1,288 @@
+"""
+Append-only archive of raw TikHub responses.
+
+Each worker process appends to its own segment files under
+`{ARCHIVE_DIR}/{YYYYMMDD}/{host}-{pid}-{seq}.seg`, rolling to a new segment
+when the day changes or the segment reaches ARCHIVE_SEGMENT_BYTES. A record is
+a fixed header followed by the task key and the compressed response, so
+segments can be memory-mapped and walked without parsing the payloads. Every
+segment has a `.idx` sidecar of fixed-size (task_id, recorded_at, offset)
+entries for lookups by task and time. Day directories older than
+ARCHIVE_RETENTION_DAYS are pruned whenever a writer rolls to a new day.
+"""
+import logging
+import mmap
+import os
+import shutil
+import socket
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterator, List, NamedTuple, Optional
+import orjson
+from app.core.config import settings
+from app.db.enums import TaskTypeEnum
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+RECORD_MAGIC = b"RAWR"
+# magic, crc32(payload), recorded_at, task type, codec, task id, key length, payload length
+RECORD_HEADER = struct.Struct("<4sIdBB36sHI")
+# task id, recorded_at, record offset
+INDEX_ENTRY = struct.Struct("<36sdQ")
+
+CODEC_ZLIB = 0
+CODEC_ZSTD = 1
+
+TASK_TYPE_CODES = {TaskTypeEnum.influencer: 0, TaskTypeEnum.post: 1}
+TASK_TYPES = {code: task_type for task_type, code in TASK_TYPE_CODES.items()}
+
+
+def _compress(raw: bytes) -> tuple[int, bytes]:
+    if zstandard:
+        return CODEC_ZSTD, zstandard.ZstdCompressor(level=3).compress(raw)
+    return CODEC_ZLIB, zlib.compress(raw, 6)
+
+
+def _decompress(codec: int, payload: bytes) -> bytes:
+    if codec == CODEC_ZSTD:
+        # decompressobj, as frames from older writers may not record the content size.
+        return zstandard.ZstdDecompressor().decompressobj().decompress(payload)
+    return zlib.decompress(payload)
+
+
+def _day(recorded_at: float) -> str:
+    return datetime.fromtimestamp(recorded_at, timezone.utc).strftime("%Y%m%d")
+
+
+class ArchiveRecord(NamedTuple):
+    task_id: str
+    task_type: TaskTypeEnum
+    key: str
+    recorded_at: float
+    codec: int
+    payload: bytes
+
+    def raw(self) -> bytes:
+        return _decompress(self.codec, self.payload)
+
+    def response(self) -> dict:
+        return orjson.loads(self.raw())
+
+
+class ArchiveWriter:
+    def __init__(self, root: str, segment_bytes: int, name: Optional[str] = None, retention_days: Optional[int] = None):
+        self.root = root
+        self.segment_bytes = segment_bytes
+        self.retention_days = retention_days
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self._segment = None
+        self._index = None
+        self._day = None
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def _roll(self, day: str):
+        self.close()
+        if day != self._day and self.retention_days:
+            prune_archive(self.root, datetime.strptime(day, "%Y%m%d").date() - timedelta(days=self.retention_days))
+        directory = os.path.join(self.root, day)
+        os.makedirs(directory, exist_ok=True)
+        while True:
+            self._seq += 1
+            path = os.path.join(directory, f"{self.name}-{self._seq:06d}.seg")
+            if not os.path.exists(path):
+                break
+        self._segment = open(path, "ab")
+        self._index = open(f"{path[:-4]}.idx", "ab")
+        self._day = day
+        logger.info(f"Opened archive segment {path}")
+
+    def append(self, task_id: str, task_type: TaskTypeEnum, key: str, raw: bytes, recorded_at: Optional[float] = None):
+        codec, payload = _compress(raw)
+        self.append_payload(task_id, task_type, key, codec, payload, recorded_at)
+
+    def append_payload(self, task_id: str, task_type: TaskTypeEnum, key: str, codec: int, payload: bytes, recorded_at: Optional[float] = None):
+        """
+        Appends a response already compressed with `codec` (see ArchiveSpool).
+        """
+        recorded_at = recorded_at or time.time()
+        key_bytes = key.encode()
+        header = RECORD_HEADER.pack(
+            RECORD_MAGIC, zlib.crc32(payload), recorded_at, TASK_TYPE_CODES[task_type], codec,
+            task_id.encode(), len(key_bytes), len(payload),
+        )
+        day = _day(recorded_at)
+        with self._lock:
+            if self._segment is None or day != self._day or self._segment.tell() >= self.segment_bytes:
+                self._roll(day)
+            offset = self._segment.tell()
+            self._segment.write(header + key_bytes + payload)
+            self._segment.flush()
+            self._index.write(INDEX_ENTRY.pack(task_id.encode(), recorded_at, offset))
+            self._index.flush()
+
+    def close(self):
+        for f in (self._segment, self._index):
+            if f:
+                f.close()
+        self._segment = self._index = None
+
+
+class ArchiveSpool:
+    """
+    Collects a response body chunk by chunk while it is being parsed, in
+    memory up to ARCHIVE_SPOOL_BYTES and in a temporary file beyond, so
+    in-flight fetches don't each hold a whole body (or a compressor's
+    buffers) until they finish.
+    """
+
+    def __init__(self, max_memory: int = settings.ARCHIVE_SPOOL_BYTES):
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_memory)
+
+    def write(self, chunk: bytes):
+        self._file.write(chunk)
+
+    def compress(self) -> tuple[int, bytes]:
+        """
+        Returns (codec, payload) for ArchiveWriter.append_payload and releases the spool.
+        """
+        try:
+            self._file.seek(0)
+            return _compress(self._file.read())
+        finally:
+            self._file.close()
+
+    def close(self):
+        self._file.close()
+
+
+class SegmentReader:
+    """
+    Memory-mapped reader for one segment. A torn record at the end of a segment
+    that is still being written is treated as the end of the segment.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._map = self._mmap(path)
+
+    @staticmethod
+    def _mmap(path: str):
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+    def read_at(self, offset: int) -> tuple[Optional[ArchiveRecord], int]:
+        """
+        Returns the record at `offset` and the offset of the next one.
+        """
+        end = offset + RECORD_HEADER.size
+        if end > len(self._map):
+            return None, offset
+        magic, crc, recorded_at, type_code, codec, task_id, key_length, payload_length = RECORD_HEADER.unpack_from(self._map, offset)
+        key_end = end + key_length
+        payload_end = key_end + payload_length
+        if magic != RECORD_MAGIC or payload_end > len(self._map):
+            return None, offset
+        payload = self._map[key_end:payload_end]
+        if zlib.crc32(payload) != crc:
+            return None, offset
+        record = ArchiveRecord(task_id.decode(), TASK_TYPES[type_code], self._map[end:key_end].decode(), recorded_at, codec, payload)
+        return record, payload_end
+
+    def __iter__(self) -> Iterator[ArchiveRecord]:
+        offset = 0
+        while True:
+            record, offset = self.read_at(offset)
+            if record is None:
+                return
+            yield record
+
+    def find(self, task_id: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None) -> Iterator[ArchiveRecord]:
+        """
+        Looks records up through the segment's index instead of walking every record.
+        """
+        index = self._mmap(f"{self.path[:-4]}.idx")
+        try:
+            usable = len(index) - len(index) % INDEX_ENTRY.size
+            wanted = task_id.encode() if task_id else None
+            for entry_task_id, recorded_at, offset in INDEX_ENTRY.iter_unpack(index[:usable]):
+                if wanted and entry_task_id != wanted:
+                    continue
+                if (since and recorded_at < since) or (until and recorded_at >= until):
+                    continue
+                record, _ = self.read_at(offset)
+                if record:
+                    yield record
+        finally:
+            if isinstance(index, mmap.mmap):
+                index.close()
+
+
+def list_segments(root: str, since: Optional[date] = None, until: Optional[date] = None) -> List[str]:
+    """
+    Segment paths ordered by day, optionally limited to days in [since, until).
+    """
+    if not os.path.isdir(root):
+        return []
+    paths = []
+    for day in sorted(os.listdir(root)):
+        if since and day < since.strftime("%Y%m%d"):
+            continue
+        if until and day >= until.strftime("%Y%m%d"):
+            continue
+        directory = os.path.join(root, day)
+        paths += [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.endswith(".seg")]
+    return paths
+
+
+def prune_archive(root: str, before: date) -> int:
+    """
+    Deletes the day directories before `before` and returns how many were deleted.
+    """
+    if not os.path.isdir(root):
+        return 0
+    pruned = 0
+    for day in sorted(os.listdir(root)):
+        if not (day.isdigit() and len(day) == 8) or day >= before.strftime("%Y%m%d"):
+            continue
+        # Another writer on this host may be pruning the same day.
+        shutil.rmtree(os.path.join(root, day), ignore_errors=True)
+        pruned += 1
+        logger.info(f"Pruned archive day {day} under {root}")
+    return pruned
+
+
+_writer: Optional[ArchiveWriter] = None
+
+
+def get_archive_writer() -> Optional[ArchiveWriter]:
+    """
+    The current process's writer, created on first use (i.e. after the worker forks).
+    """
+    global _writer
+    if not settings.ARCHIVE_ENABLED:
+        return None
+    if _writer is None or _writer.name != f"{socket.gethostname()}-{os.getpid()}":
+        _writer = ArchiveWriter(settings.ARCHIVE_DIR, settings.ARCHIVE_SEGMENT_BYTES, retention_days=settings.ARCHIVE_RETENTION_DAYS)
+    return _writer
@@ -1,5 +1,7 @@
 from celery import Celery
+from celery.signals import worker_init
 from app.core.config import settings
+from app.worker.memory import watch_memory
 
 celery_app = Celery(
     "Celery Scheduler",
@@ -15,32 +17,28 @@ celery_app.conf.update(
     timezone="UTC",
     enable_utc=True,
     broker_connection_retry_on_startup=True,
+    # Bounds worker memory: a prefork child that crossed the cap is replaced after its
+    # current task. Other pools get the same cap from watch_memory below.
+    worker_max_memory_per_child=settings.WORKER_MAX_MEMORY_PER_CHILD_KB or None,
+    worker_max_tasks_per_child=settings.WORKER_MAX_TASKS_PER_CHILD or None,
 )
 
+worker_init.connect(watch_memory)
+
+# Maintenance only; monitoring tasks are enqueued by the dispatcher nodes.
 celery_app.conf.beat_schedule = {
-    "retrieve-scheduled-tasks-30-seconds": {
-        "task": "app.worker.tasks.retrieve_scheduled_tasks",
-        "schedule": 30.0,
-        "args": (30,),
-    },
-    "retrieve-scheduled-tasks-30-minutes": {
-        "task": "app.worker.tasks.retrieve_scheduled_tasks",
-        "schedule": 1800.0,
-        "args": (1800,),
-    },
-    "retrieve-scheduled-tasks-1-hour": {
-        "task": "app.worker.tasks.retrieve_scheduled_tasks",
-        "schedule": 3600.0,
-        "args": (3600,),
+    "flush-task-runs": {
+        "task": "app.worker.tasks.flush_runs",
+        "schedule": settings.TASK_RUN_FLUSH_SECONDS,
     },
-    "retrieve-scheduled-tasks-1-day": {
-        "task": "app.worker.tasks.retrieve_scheduled_tasks",
-        "schedule": 86400.0,
-        "args": (86400,),
+    "prune-task-runs": {
+        "task": "app.worker.tasks.prune_runs",
+        "schedule": 60 * 60,
     },
-    "retrieve-scheduled-tasks-7-days": {
-        "task": "app.worker.tasks.retrieve_scheduled_tasks",
-        "schedule": 604800.0,
-        "args": (604800,),
-    },
-}
\ No newline at end of file
+}
+
+if settings.CHUNK_STORAGE_ENABLED:
+    celery_app.conf.beat_schedule["seal-history-chunks"] = {
+        "task": "app.worker.tasks.seal_chunks",
+        "schedule": settings.CHUNK_SEAL_INTERVAL_SECONDS,
+    }
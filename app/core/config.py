@@ -1,11 +1,85 @@
+from typing import List, Literal
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     DATABASE_URL: str
+    # JSON list in the environment, e.g. DATABASE_REPLICA_URLS='["mysql+pymysql://..."]'
+    DATABASE_REPLICA_URLS: List[str] = []
+    DATABASE_REPLICA_MAX_LAG_SECONDS: float = 5.0
+    # Per engine. Async endpoints check a connection out only for each unit of DB work
+    # (run off the event loop), so the pool bounds concurrent queries, not requests.
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_TIMEOUT: float = 30.0
     REDIS_HOST: str
     REDIS_PORT: int
     TIKHUB_API_BASE_URL: str = "https://api.tikhub.io/api/v1/instagram/web_app"
     TIKHUB_API_KEY: str
+    TIKHUB_USER_POSTS_ENDPOINT: str = "/fetch_user_posts_by_username_v2"
+    # Token bucket shared by every worker's TikHub requests; 0 disables it.
+    TIKHUB_RATE_PER_SECOND: float = 0.0
+    TIKHUB_RATE_BURST: int = 10
+    TIKHUB_RATE_MAX_WAIT_SECONDS: float = 10.0
+    # Metrics responses larger than this are abandoned mid-stream.
+    TIKHUB_MAX_RESPONSE_BYTES: int = 32 * 1024 * 1024
+    HISTORY_CACHE_FORMAT: Literal["json", "columnar"] = "json"
+    HISTORY_CACHE_COMPRESSION: Literal["none", "zstd", "lz4"] = "zstd"
+    HISTORY_CACHE_COMPRESS_MIN_BYTES: int = 32 * 1024
+    # In-process history tier per API worker; 0 disables it.
+    LOCAL_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    LOCAL_CACHE_TTL_SECONDS: int = 60
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+    SCHEDULER_TICK_SECONDS: float = 1.0
+    SCHEDULER_NODE_TTL_SECONDS: int = 10
+    SCHEDULER_LEASE_TTL_SECONDS: int = 10
+    ANOMALY_ALPHA: float = 0.1
+    ANOMALY_Z_THRESHOLD: float = 4.0
+    # Floors for the standard deviation of a growth rate (per second, and relative to
+    # its mean), so a spike after a flat series (zero variance) can still be scored.
+    ANOMALY_MIN_STD: float = 0.001
+    ANOMALY_MIN_RELATIVE_STD: float = 0.05
+    ANOMALY_MIN_SAMPLES: int = 10
+    ANOMALY_FEED_MAXLEN: int = 10000
+    ANOMALY_MONITOR_FEED_MAXLEN: int = 500
+    LEADERBOARD_TRIM_BATCH: int = 100
+    TASK_RUN_FLUSH_SECONDS: int = 5
+    TASK_RUN_FLUSH_BATCH: int = 1000
+    TASK_RUN_RETENTION_DAYS: int = 14
+    REFRESH_COOLDOWN_SECONDS: int = 60
+    # Upper bound on a run (the TikHub request times out after 60s); a crashed worker's marker expires after it.
+    REFRESH_INFLIGHT_TTL_SECONDS: int = 120
+    REFRESH_MAX_WAIT_SECONDS: float = 30.0
+    # Prefork children are replaced once their RSS passes this (KiB) or after this many tasks; 0 disables.
+    WORKER_MAX_MEMORY_PER_CHILD_KB: int = 512 * 1024
+    WORKER_MAX_TASKS_PER_CHILD: int = 0
+    # Sent as X-Admin-Token for the admin endpoints and X-Profile; unset disables both.
+    ADMIN_TOKEN: str = ""
+    PROFILE_ENABLED: bool = False
+    PROFILE_DIR: str = "data/profiles"
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_INTERVAL_MS: float = 5.0
+    PROFILE_TASK_IDS: List[str] = []
+    PROFILE_KEEP: int = 200
+    ARCHIVE_ENABLED: bool = False
+    ARCHIVE_DIR: str = "data/archive"
+    # Day directories older than this are deleted by each writer when it rolls to a new day.
+    ARCHIVE_RETENTION_DAYS: int = 30
+    ARCHIVE_SEGMENT_BYTES: int = 64 * 1024 * 1024
+    ARCHIVE_SPOOL_BYTES: int = 64 * 1024
+    # Replay --write skips a response when its monitor already has a sample recorded
+    # this soon after it (a run writes its sample shortly after the fetch is archived).
+    ARCHIVE_REPLAY_MATCH_SECONDS: int = 15
+    # Recent posts averaged into an influencer's engagement rate; 0 disables the enrichment.
+    ENGAGEMENT_RECENT_POSTS: int = 0
+    ENGAGEMENT_CONCURRENCY: int = 4
+    ENGAGEMENT_POST_CACHE_SECONDS: int = 60 * 60
+    ENGAGEMENT_INFLIGHT_WAIT_SECONDS: float = 10.0
+    CHUNK_STORAGE_ENABLED: bool = False
+    # Fixed once chunks have been sealed; sealed chunks are looked up by their start.
+    CHUNK_SECONDS: int = 24 * 60 * 60
+    # How long after a chunk's end its rows stay unsealed, for late writes.
+    CHUNK_SEAL_DELAY_SECONDS: int = 60 * 60
+    CHUNK_SEAL_INTERVAL_SECONDS: int = 60 * 60
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,15 @@
+import hmac
+from typing import Optional
+from app.core.config import settings
+
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+
+
+def is_admin_token(token: Optional[str]) -> bool:
+    """
+    Whether `token` matches ADMIN_TOKEN. Always false while ADMIN_TOKEN is unset,
+    which keeps the admin endpoints closed by default.
+    """
+    if not settings.ADMIN_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode(), settings.ADMIN_TOKEN.encode())
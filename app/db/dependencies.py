@@ -1,4 +1,11 @@
-from app.db.session import SessionLocal
+from typing import Optional
+from fastapi import Depends, Request
+from sqlalchemy.orm import Session
+from app.db.session import SessionLocal, ReadSessionLocal, reads_use_primary
+
+LAST_WRITE_HEADER = "X-Last-Write"
+READ_AFTER_HEADER = "X-Read-After"
+
 
 def get_db():
     db = SessionLocal()
@@ -6,3 +13,28 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def _read_after(request: Request) -> Optional[float]:
+    try:
+        return float(request.headers[READ_AFTER_HEADER])
+    except (KeyError, ValueError):
+        return None
+
+
+def get_read_db(request: Request, db: Session = Depends(get_db)):
+    """
+    Session on a read replica, or the request's primary session (from get_db)
+    when no replicas are configured or the client sends `X-Read-After` with
+    the `X-Last-Write` value of a recent write. Sharing the primary session
+    keeps a request to one connection from the primary pool.
+    """
+    last_write = _read_after(request)
+    if reads_use_primary(last_write):
+        yield db
+        return
+    read_db = ReadSessionLocal(last_write)
+    try:
+        yield read_db
+    finally:
+        read_db.close()
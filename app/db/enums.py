@@ -9,3 +9,10 @@ class TaskStatusEnum(str, enum.Enum):
     active = "active"
     paused = "paused"
     stopped = "stopped"
+
+class RunOutcomeEnum(str, enum.Enum):
+    success = "success"
+    fallback = "fallback"
+    failed = "failed"
+    # The TikHub rate budget stayed exhausted; nothing was fetched or recorded.
+    throttled = "throttled"
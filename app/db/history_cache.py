@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import time
+from typing import Any, Optional, Sequence
+from redis.asyncio import Redis
+from app.core.config import settings
+from app.utils.cache_codec import HistoryCodec
+from app.utils.lru import ByteLRUCache
+
+logger = logging.getLogger(__name__)
+
+# Every recorded sample publishes the history's cache key here.
+INVALIDATION_CHANNEL = "history_invalidate"
+# Rough in-memory footprint of a cached meta dict.
+META_SIZE = 256
+# Meta outlives a few missed samples before it is reseeded from MySQL.
+META_TTL_INTERVALS = 3
+
+# Seeds the meta hash unless a writer has set it meanwhile; a seed computed
+# before the latest sample must not overwrite the validators written after it.
+SEED_META_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('HSET', KEYS[1], 'count', ARGV[1], 'last', ARGV[2], 'interval', ARGV[3])
+    redis.call('EXPIRE', KEYS[1], ARGV[4])
+end
+"""
+
+# Per-process tier in front of Redis, shared by the API worker's services.
+local_history_cache = ByteLRUCache(settings.LOCAL_CACHE_MAX_BYTES) if settings.LOCAL_CACHE_MAX_BYTES > 0 else None
+redis_tier_stats = {"hits": 0, "misses": 0}
+
+
+def _meta_key_for(cache_key: str) -> str:
+    prefix, _, key = cache_key.partition(":")
+    return f"{prefix}_meta:{key}"
+
+
+class HistoryCache:
+    """
+    Redis cache for history responses, keyed as `{prefix}:{key}`.
+
+    Alongside each history it keeps a small `{prefix}_meta:{key}` hash with the
+    sample count, the time of the latest sample and the monitor interval, which
+    is enough to answer conditional requests without reading the history.
+
+    With `local`, decoded bodies and meta are also kept in process memory and
+    dropped when any process records a sample (see listen_for_invalidations).
+    """
+
+    def __init__(self, client: Redis, prefix: str, key_name: str, columns: Sequence[Any], local: Optional[ByteLRUCache] = None):
+        self.client = client
+        self.prefix = prefix
+        self.local = local
+        self.codec = HistoryCodec(
+            key_name,
+            columns,
+            fmt=settings.HISTORY_CACHE_FORMAT,
+            compression=settings.HISTORY_CACHE_COMPRESSION,
+            compress_min_bytes=settings.HISTORY_CACHE_COMPRESS_MIN_BYTES,
+        )
+
+    def cache_key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def meta_key(self, key: str) -> str:
+        return f"{self.prefix}_meta:{key}"
+
+    def _local_ttl(self, ttl: Optional[int] = None) -> float:
+        return min(ttl, settings.LOCAL_CACHE_TTL_SECONDS) if ttl else settings.LOCAL_CACHE_TTL_SECONDS
+
+    async def get(self, key: str) -> Optional[bytes]:
+        generation = None
+        if self.local:
+            body = self.local.get(self.cache_key(key))
+            if body is not None:
+                return body
+            # Taken before the Redis read, so an invalidation arriving during it isn't undone below.
+            generation = self.local.generation(self.cache_key(key))
+        value = await self.client.get(self.cache_key(key))
+        body = self.codec.decode(key, value) if value else None
+        if body is None:
+            redis_tier_stats["misses"] += 1
+            return None
+        redis_tier_stats["hits"] += 1
+        if self.local:
+            self.local.set(self.cache_key(key), body, len(body), self._local_ttl(), generation)
+        return body
+
+    async def set(self, key: str, rows: Sequence[Sequence[Any]], body: bytes, ttl: int):
+        value = self.codec.encode(rows, body)
+        await self.client.set(self.cache_key(key), value, ex=ttl)
+        if self.local:
+            self.local.set(self.cache_key(key), body, len(body), self._local_ttl(ttl))
+        if rows:
+            logger.info(f"Cached {len(rows)} points for {self.cache_key(key)}: {len(value)} bytes ({len(value) / len(rows):.1f} bytes/point)")
+
+    async def invalidate(self, key: str):
+        await self.client.delete(self.cache_key(key))
+        if self.local:
+            self.local.delete(self.cache_key(key), self.meta_key(key))
+
+    async def record_sample(self, key: str, meta: Optional[dict]):
+        """
+        Stores the history validators after a new sample has been written and
+        tells every API worker to drop its local copies. `meta` holds absolute
+        values read back from the primary, so writing it again is harmless;
+        without it the validators are dropped and reseeded on the next read.
+        """
+        async with self.client.pipeline(transaction=True) as pipe:
+            if meta:
+                pipe.hset(self.meta_key(key), mapping=meta)
+                pipe.expire(self.meta_key(key), meta["interval"] * META_TTL_INTERVALS)
+            else:
+                pipe.delete(self.meta_key(key))
+            pipe.publish(INVALIDATION_CHANNEL, self.cache_key(key))
+            await pipe.execute()
+
+    async def get_meta(self, key: str) -> Optional[dict]:
+        generation = None
+        if self.local:
+            meta = self.local.get(self.meta_key(key))
+            if meta is not None:
+                return meta
+            generation = self.local.generation(self.meta_key(key))
+        meta = await self.client.hgetall(self.meta_key(key))
+        if b"interval" not in meta:
+            return None
+        meta = {
+            "count": int(meta.get(b"count", 0)),
+            "last": float(meta.get(b"last", 0)),
+            "interval": int(meta[b"interval"]),
+        }
+        if self.local:
+            self.local.set(self.meta_key(key), meta, META_SIZE, self._local_ttl(meta["interval"]), generation)
+        return meta
+
+    async def seed_meta(self, key: str, count: int, last: float, interval: int):
+        """
+        Stores validators computed on a read, unless a sample was recorded meanwhile.
+        """
+        await self.client.eval(SEED_META_SCRIPT, 1, self.meta_key(key), count, last, interval, interval * META_TTL_INTERVALS)
+
+
+def history_cache_stats() -> dict:
+    redis_lookups = redis_tier_stats["hits"] + redis_tier_stats["misses"]
+    return {
+        "local": local_history_cache.stats() if local_history_cache else None,
+        "redis": {**redis_tier_stats, "hit_ratio": redis_tier_stats["hits"] / redis_lookups if redis_lookups else None},
+    }
+
+
+async def listen_for_invalidations(client: Redis, local: ByteLRUCache):
+    """
+    Drops local entries whenever any process records a sample. Runs for the
+    life of the API worker and resubscribes after connection errors.
+    """
+    while True:
+        try:
+            async with client.pubsub() as pubsub:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Messages published while unsubscribed are lost, so start clean.
+                local.clear()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        cache_key = message["data"].decode() if isinstance(message["data"], bytes) else message["data"]
+                        local.delete(cache_key, _meta_key_for(cache_key))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"History invalidation listener failed, resubscribing: {e}")
+            await asyncio.sleep(1)
@@ -3,5 +3,19 @@ from app.core.config import settings
 
 redis_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, decode_responses=True)
 
+# Cache values are stored as raw bytes so they can be returned as-is.
+redis_binary_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+
 async def get_redis_client():
-    return redis_client
\ No newline at end of file
+    return redis_client
+
+async def get_redis_binary_client():
+    return redis_binary_client
+
+def new_redis_client(binary: bool = False) -> redis.Redis:
+    """
+    A client with its own connection pool, for code that runs in its own event
+    loop (every Celery task runs in a fresh asyncio.run). Pooled connections are
+    bound to the loop they were opened in, so close it before the loop ends.
+    """
+    return redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, decode_responses=not binary)
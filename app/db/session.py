@@ -1,18 +1,120 @@
-import os
+import asyncio
+import itertools
+import time
+from functools import lru_cache
+from typing import Any, Callable, List, Optional, Sequence, Tuple
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from dotenv import load_dotenv
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from app.core.config import settings
+from app.utils.profiler import profile_thread
 
-load_dotenv()
+Base = declarative_base()
 
-DATABASE_URL = os.getenv("DATABASE_URL")
+_session_factory = sessionmaker(autocommit=False, autoflush=False)
 
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL environment variable not set")
 
-print(DATABASE_URL)
+def _create_engine(url: str) -> Engine:
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        # In-memory SQLite uses a single-connection pool that takes no sizing.
+        return create_engine(url)
+    return create_engine(url, pool_size=settings.DATABASE_POOL_SIZE, max_overflow=settings.DATABASE_MAX_OVERFLOW, pool_timeout=settings.DATABASE_POOL_TIMEOUT)
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
+@lru_cache
+def get_engine() -> Engine:
+    """
+    Creates the engine (and loads the DB driver) on first use rather than at import.
+    """
+    return _create_engine(settings.DATABASE_URL)
+
+
+@lru_cache
+def get_replica_engines() -> Tuple[Engine, ...]:
+    """
+    One pooled engine per DATABASE_REPLICA_URLS entry, created on first use.
+    """
+    return tuple(_create_engine(url) for url in settings.DATABASE_REPLICA_URLS)
+
+
+_replica_cycle = None
+
+
+def get_read_engine() -> Engine:
+    """
+    The next replica engine (round robin), or the primary if no replicas are configured.
+    """
+    global _replica_cycle
+    replicas = get_replica_engines()
+    if not replicas:
+        return get_engine()
+    if _replica_cycle is None:
+        _replica_cycle = itertools.cycle(replicas)
+    return next(_replica_cycle)
+
+
+def SessionLocal() -> Session:
+    return _session_factory(bind=get_engine())
+
+
+def reads_use_primary(last_write: Optional[float] = None) -> bool:
+    """
+    Whether reads go to the primary: when no replicas are configured, or
+    within DATABASE_REPLICA_MAX_LAG_SECONDS of the caller's last write so the
+    caller sees its own writes.
+    """
+    if not get_replica_engines():
+        return True
+    return bool(last_write and time.time() - last_write < settings.DATABASE_REPLICA_MAX_LAG_SECONDS)
+
+
+def ReadSessionLocal(last_write: Optional[float] = None) -> Session:
+    """
+    Session for reads that may lag the primary (see reads_use_primary).
+    """
+    if reads_use_primary(last_write):
+        return SessionLocal()
+    return _session_factory(bind=get_read_engine())
+
+
+async def run_blocking(func: Callable[..., Any], *args, release: Sequence[Session] = ()) -> Any:
+    """
+    Runs blocking database work (pool checkout, queries) in a worker thread, so
+    a request waiting for a connection or a slow query doesn't stall the event
+    loop. The thread is included in the request's profile, if any.
+
+    The `release` sessions are closed afterwards, returning their connections
+    to the pool; loaded attributes of their objects stay readable. A request
+    must not hold a connection across an await: with every thread waiting for
+    a connection, the requests holding them could never get a thread to finish.
+    """
+    def call():
+        with profile_thread():
+            try:
+                return func(*args)
+            finally:
+                for session in release:
+                    session.close()
+
+    return await asyncio.to_thread(call)
+
+
+def pool_status() -> List[dict]:
+    """
+    Connection pool utilization of the primary and every replica engine.
+    """
+    engines = [("primary", get_engine())] + [(f"replica-{i}", engine) for i, engine in enumerate(get_replica_engines())]
+    status = []
+    for name, engine in engines:
+        pool = engine.pool
+        status.append({
+            "name": name,
+            "url": engine.url.render_as_string(hide_password=True),
+            "pool": type(pool).__name__,
+            "size": pool.size() if hasattr(pool, "size") else None,
+            "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+            "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else None,
+            "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+        })
+    return status
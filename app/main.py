@@ -1,18 +1,73 @@
-from fastapi import FastAPI
-from app.api.v1 import influencer, post
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from app.api.v1 import admin, influencer, post, task_runs
+from app.core.config import settings
+from app.db.dependencies import LAST_WRITE_HEADER
+from app.db.history_cache import history_cache_stats, listen_for_invalidations, local_history_cache
+from app.db.redis import redis_client
+from app.db.session import pool_status
+from app.utils.profiler import ProfilingMiddleware
 
-app = FastAPI()
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Keeps this worker's in-process history tier in sync with new samples.
+    listener = asyncio.create_task(listen_for_invalidations(redis_client, local_history_cache)) if local_history_cache else None
+    yield
+    if listener:
+        listener.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Brotli when available (it falls back to gzip for clients without `br`), gzip otherwise.
+if BrotliMiddleware:
+    app.add_middleware(BrotliMiddleware, minimum_size=settings.COMPRESSION_MINIMUM_SIZE, gzip_fallback=True)
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=settings.COMPRESSION_MINIMUM_SIZE)
+
+if settings.PROFILE_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+@app.middleware("http")
+async def last_write_header(request: Request, call_next):
+    """
+    Stamps successful writes so clients can send the value back as `X-Read-After`
+    and get read-your-writes from the primary while replicas catch up.
+    """
+    response = await call_next(request)
+    if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        response.headers[LAST_WRITE_HEADER] = f"{time.time():.3f}"
+    return response
 
 @app.get("/health")
 def health():
     return {"message": "ok"}
   
+@app.get("/health/db")
+def health_db():
+    return {"engines": pool_status()}
+
+@app.get("/health/cache")
+def health_cache():
+    return history_cache_stats()
+
 @app.get("/")
 def root():
     return {"message": "Hello, World!"}
 
 app.include_router(influencer.router, prefix="/api/v1/instagram/influencer_monitor", tags=["Influencer"])
 app.include_router(post.router, prefix="/api/v1/instagram/post_monitor", tags=["Post"])
+app.include_router(task_runs.router, prefix="/api/v1/instagram/task_runs", tags=["Task runs"])
+app.include_router(admin.router, prefix="/api/v1/admin", tags=["Admin"])
 
 if __name__ == "__main__":
   import uvicorn
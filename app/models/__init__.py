@@ -1,3 +1,6 @@
 from .influencer_metrics_history import InfluencerMetricsHistory
+from .influencer_metrics_chunk import InfluencerMetricsChunk
 from .post_metrics_history import PostMetricsHistory
-from .task import Task
\ No newline at end of file
+from .post_metrics_chunk import PostMetricsChunk
+from .task import Task
+from .task_run import TaskRun
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, LargeBinary
+from app.db.session import Base
+
+class InfluencerMetricsChunk(Base):
+    """
+    One sealed chunk of influencer_metrics_history: every sample of a monitor
+    within [chunk_start, chunk_start + CHUNK_SECONDS), packed by encode_chunk.
+    """
+    __tablename__ = "influencer_metrics_chunk"
+
+    username = Column(String(255), primary_key=True)
+    chunk_start = Column(DateTime, primary_key=True)
+    user_id = Column(BigInteger, nullable=False)
+    sample_count = Column(Integer, nullable=False)
+    first_recorded_at = Column(DateTime, nullable=False)
+    last_recorded_at = Column(DateTime, nullable=False)
+    payload = Column(LargeBinary(length=2 ** 24 - 1), nullable=False)
@@ -1,11 +1,11 @@
-from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Index
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Float, Index
 from app.db.session import Base
 from sqlalchemy.sql import func
 
 class InfluencerMetricsHistory(Base):
     __tablename__ = "influencer_metrics_history"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     user_id = Column(BigInteger, nullable=False)
     username = Column(String(255), nullable=False)
     bio = Column(Text)
@@ -13,7 +13,10 @@ class InfluencerMetricsHistory(Base):
     following_count = Column(Integer)
     post_count = Column(Integer)
     recorded_at = Column(DateTime, server_default=func.now())
+    # Percent; NULL unless ENGAGEMENT_RECENT_POSTS is set.
+    engagement_rate = Column(Float)
 
     __table_args__ = (
         Index("ix_user_id_recorded_at", "user_id", "recorded_at"),
+        Index("ix_username_recorded_at", "username", "recorded_at"),
     )
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, DateTime, LargeBinary
+from app.db.session import Base
+
+class PostMetricsChunk(Base):
+    """
+    One sealed chunk of post_metrics_history: every sample of a monitor
+    within [chunk_start, chunk_start + CHUNK_SECONDS), packed by encode_chunk.
+    """
+    __tablename__ = "post_metrics_chunk"
+
+    post_code = Column(String(50), primary_key=True)
+    chunk_start = Column(DateTime, primary_key=True)
+    post_id = Column(String(50), nullable=False)
+    sample_count = Column(Integer, nullable=False)
+    first_recorded_at = Column(DateTime, nullable=False)
+    last_recorded_at = Column(DateTime, nullable=False)
+    payload = Column(LargeBinary(length=2 ** 24 - 1), nullable=False)
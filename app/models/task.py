@@ -1,7 +1,8 @@
-from sqlalchemy import Column, String, Integer, Enum, DateTime, Index
+from sqlalchemy import Column, String, Integer, SmallInteger, Float, Enum, DateTime, Index
 from sqlalchemy.sql import func
 from app.db.session import Base
 from app.db.enums import TaskTypeEnum, TaskStatusEnum
+from app.utils.sharding import shard_for
 
 class Task(Base):
     __tablename__ = "task"
@@ -14,8 +15,18 @@ class Task(Base):
     status = Column(Enum(TaskStatusEnum), nullable=False)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    # z-score above which a sample is flagged; NULL uses ANOMALY_Z_THRESHOLD
+    anomaly_threshold = Column(Float)
+    shard = Column(SmallInteger, nullable=False, server_default="0", default=lambda context: shard_for(context.get_current_parameters()["id"]))
 
     __table_args__ = (
-        Index("ix_task_type", "task_type"),
+        # Task listings: one per key column, optionally narrowed by status or interval, in key order.
+        Index("ix_task_type_username", "task_type", "username"),
+        Index("ix_task_type_status_username", "task_type", "status", "username"),
+        Index("ix_task_type_interval_username", "task_type", "interval_seconds", "username"),
+        Index("ix_task_type_post_code", "task_type", "post_code"),
+        Index("ix_task_type_status_post_code", "task_type", "status", "post_code"),
+        Index("ix_task_type_interval_post_code", "task_type", "interval_seconds", "post_code"),
         Index("ix_status", "status"),
+        Index("ix_interval_seconds_status_shard", "interval_seconds", "status", "shard"),
     )
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, BigInteger, Integer, SmallInteger, String, Enum, DateTime, Index
+from app.db.session import Base
+from app.db.enums import TaskTypeEnum, RunOutcomeEnum
+
+class TaskRun(Base):
+    __tablename__ = "task_run"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    task_id = Column(String(36), nullable=False)
+    task_type = Column(Enum(TaskTypeEnum), nullable=False)
+    started_at = Column(DateTime, nullable=False)
+    outcome = Column(Enum(RunOutcomeEnum), nullable=False)
+    http_status = Column(SmallInteger)
+    # Milliseconds; queue_wait_ms is NULL for runs that were not dispatched.
+    queue_wait_ms = Column(Integer)
+    fetch_ms = Column(Integer)
+    write_ms = Column(Integer)
+    total_ms = Column(Integer, nullable=False)
+    error = Column(String(255))
+
+    __table_args__ = (
+        Index("ix_task_id_started_at", "task_id", "started_at"),
+        Index("ix_started_at", "started_at"),
+    )
@@ -0,0 +1,15 @@
+from datetime import datetime
+from pydantic import BaseModel
+from typing import List
+
+
+class ProfileData(BaseModel):
+    name: str
+    kind: str
+    label: str
+    created_at: datetime
+    size_bytes: int
+
+
+class ProfileListData(BaseModel):
+    profiles: List[ProfileData]
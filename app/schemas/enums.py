@@ -15,4 +15,18 @@ INTERVAL_MAP = {
     IntervalEnum.one_hour: 60 * 60,
     IntervalEnum.one_day: 24 * 60 * 60,
     IntervalEnum.seven_days: 7 * 24 * 60 * 60,
-} 
\ No newline at end of file
+} 
+
+
+class LeaderboardWindowEnum(str, Enum):
+    total = "total"
+    one_hour = "1h"
+    one_day = "24h"
+    seven_days = "7d"
+
+
+class RefreshStateEnum(str, Enum):
+    queued = "queued"
+    running = "running"
+    done = "done"
+    idle = "idle"
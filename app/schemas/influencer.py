@@ -1,15 +1,16 @@
 import uuid
 from datetime import datetime
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 from app.db.enums import TaskStatusEnum
-from app.schemas.enums import IntervalEnum
+from app.schemas.enums import IntervalEnum, LeaderboardWindowEnum
 from enum import Enum
 
 
 class CreateMonitorTaskRequest(BaseModel):
     username: str
     interval: IntervalEnum
+    anomaly_threshold: Optional[float] = Field(None, gt=0)
 
 
 class CreateMonitorTaskData(BaseModel):
@@ -25,6 +26,7 @@ class InfluencerHistoryData(BaseModel):
     post_count: int
     bio: str
     recorded_at: datetime
+    engagement_rate: Optional[float] = None
 
     class Config:
         from_attributes = True
@@ -49,6 +51,17 @@ class TaskData(BaseModel):
         validate_by_name = True
 
 
+class TaskListData(BaseModel):
+    tasks: List[TaskData]
+    next_cursor: Optional[str] = None
+
+
+class TaskSummaryData(BaseModel):
+    total: int
+    by_status: Dict[TaskStatusEnum, int]
+    by_interval: Dict[int, int]
+
+
 class StopTasksRequest(BaseModel):
     task_ids: List[uuid.UUID]
 
@@ -63,4 +76,48 @@ class TaskStatusData(BaseModel):
 
 class TaskUpdateData(BaseModel):
     task_id: uuid.UUID
-    status: TaskStatusEnum 
\ No newline at end of file
+    status: TaskStatusEnum 
+
+
+class AnomalyData(BaseModel):
+    id: str
+    task_id: uuid.UUID
+    username: str
+    metric: str
+    value: float
+    previous: float
+    rate: float
+    expected: float
+    z_score: float
+    recorded_at: datetime
+
+
+class AnomalyFeedData(BaseModel):
+    anomalies: List[AnomalyData]
+    next_cursor: Optional[str] = None
+
+
+class AnomalyThresholdRequest(BaseModel):
+    threshold: Optional[float] = Field(None, gt=0)
+
+
+class AnomalyThresholdData(BaseModel):
+    task_id: uuid.UUID
+    anomaly_threshold: Optional[float]
+
+
+class LeaderboardMetricEnum(str, Enum):
+    follower_count = "follower_count"
+    post_count = "post_count"
+
+
+class LeaderboardEntryData(BaseModel):
+    rank: int
+    username: str
+    score: float
+
+
+class LeaderboardData(BaseModel):
+    metric: LeaderboardMetricEnum
+    window: LeaderboardWindowEnum
+    entries: List[LeaderboardEntryData]
@@ -1,14 +1,16 @@
 import uuid
 from datetime import datetime
 from pydantic import BaseModel, Field, HttpUrl
-from typing import List
-from app.schemas.enums import IntervalEnum
+from typing import Dict, List, Optional
+from app.schemas.enums import IntervalEnum, LeaderboardWindowEnum
 from app.db.enums import TaskStatusEnum
+from enum import Enum
 
 
 class CreatePostMonitorTaskRequest(BaseModel):
     post_url: HttpUrl
     interval: IntervalEnum
+    anomaly_threshold: Optional[float] = Field(None, gt=0)
 
 
 class CreatePostMonitorTaskData(BaseModel):
@@ -46,6 +48,17 @@ class PostTaskData(BaseModel):
         populate_by_name = True
 
 
+class PostTaskListData(BaseModel):
+    tasks: List[PostTaskData]
+    next_cursor: Optional[str] = None
+
+
+class PostTaskSummaryData(BaseModel):
+    total: int
+    by_status: Dict[TaskStatusEnum, int]
+    by_interval: Dict[int, int]
+
+
 class StopPostTasksRequest(BaseModel):
     task_ids: List[uuid.UUID]
 
@@ -60,4 +73,49 @@ class PostTaskStatusData(BaseModel):
 
 class PostTaskUpdateData(BaseModel):
     task_id: uuid.UUID
-    status: TaskStatusEnum 
\ No newline at end of file
+    status: TaskStatusEnum 
+
+
+class PostAnomalyData(BaseModel):
+    id: str
+    task_id: uuid.UUID
+    post_code: str
+    metric: str
+    value: float
+    previous: float
+    rate: float
+    expected: float
+    z_score: float
+    recorded_at: datetime
+
+
+class PostAnomalyFeedData(BaseModel):
+    anomalies: List[PostAnomalyData]
+    next_cursor: Optional[str] = None
+
+
+class PostAnomalyThresholdRequest(BaseModel):
+    threshold: Optional[float] = Field(None, gt=0)
+
+
+class PostAnomalyThresholdData(BaseModel):
+    task_id: uuid.UUID
+    anomaly_threshold: Optional[float]
+
+
+class PostLeaderboardMetricEnum(str, Enum):
+    like_count = "like_count"
+    comment_count = "comment_count"
+    play_count = "play_count"
+
+
+class PostLeaderboardEntryData(BaseModel):
+    rank: int
+    post_code: str
+    score: float
+
+
+class PostLeaderboardData(BaseModel):
+    metric: PostLeaderboardMetricEnum
+    window: LeaderboardWindowEnum
+    entries: List[PostLeaderboardEntryData]
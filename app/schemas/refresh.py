@@ -0,0 +1,14 @@
+import uuid
+from pydantic import BaseModel
+from typing import Optional
+from app.db.enums import RunOutcomeEnum
+from app.schemas.enums import RefreshStateEnum
+
+
+class RefreshData(BaseModel):
+    task_id: uuid.UUID
+    state: RefreshStateEnum
+    # Handle for polling: the refresh is done once a run newer than this has finished.
+    after_seq: int
+    run_seq: Optional[int] = None
+    outcome: Optional[RunOutcomeEnum] = None
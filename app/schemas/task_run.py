@@ -0,0 +1,53 @@
+import uuid
+from datetime import datetime
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+from app.db.enums import RunOutcomeEnum, TaskTypeEnum
+
+
+class TaskRunData(BaseModel):
+    task_id: uuid.UUID
+    task_type: TaskTypeEnum
+    started_at: datetime
+    outcome: RunOutcomeEnum
+    http_status: Optional[int] = None
+    queue_wait_ms: Optional[int] = None
+    fetch_ms: Optional[int] = None
+    write_ms: Optional[int] = None
+    total_ms: int
+    error: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class TaskRunListData(BaseModel):
+    runs: List[TaskRunData]
+
+
+class PercentilesData(BaseModel):
+    p50: Optional[int] = None
+    p95: Optional[int] = None
+    p99: Optional[int] = None
+
+
+class TaskRunStatsData(BaseModel):
+    task_id: uuid.UUID
+    runs: int
+    outcomes: Dict[RunOutcomeEnum, int]
+    timings: Dict[str, PercentilesData]
+
+
+class MonitorRunSummaryData(BaseModel):
+    task_id: uuid.UUID
+    task_type: TaskTypeEnum
+    runs: int
+    avg_total_ms: float
+    max_total_ms: int
+    failed: int
+    fallback: int
+
+
+class TaskRunReportData(BaseModel):
+    slowest: List[MonitorRunSummaryData]
+    failing: List[MonitorRunSummaryData]
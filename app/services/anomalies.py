@@ -0,0 +1,149 @@
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from redis.asyncio import Redis
+from app.core.config import settings
+from app.db.enums import TaskTypeEnum
+
+# Scores one sample against the monitor's running statistics and folds it in.
+# Per metric the `anomaly_stats:{task_type}:{key}` hash keeps the last value,
+# the sample count and an EWMA mean/variance of the growth rate (per second),
+# so each sample costs O(1) regardless of how long the history is. A rate
+# more than `threshold` standard deviations from the EWMA mean is appended to
+# the per-type and per-monitor anomaly streams. The first rate seeds the mean
+# (with zero variance) rather than being blended into a mean of 0. The
+# standard deviation is floored at max(min std, min relative std * |mean|),
+# so a metric with a flat rate (zero variance) still flags a later spike.
+#
+# KEYS: stats hash, per-type feed, per-monitor feed
+# ARGV: now, alpha, threshold, min samples, feed maxlen, monitor feed maxlen,
+#       task id, key, min std, min relative std, then metric/value pairs
+OBSERVE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local alpha = tonumber(ARGV[2])
+local threshold = tonumber(ARGV[3])
+local min_samples = tonumber(ARGV[4])
+local min_std = tonumber(ARGV[9])
+local min_relative_std = tonumber(ARGV[10])
+local last_ts = tonumber(redis.call('HGET', KEYS[1], 'ts'))
+local flagged = {}
+for i = 11, #ARGV, 2 do
+    local metric = ARGV[i]
+    local value = tonumber(ARGV[i + 1])
+    local last = tonumber(redis.call('HGET', KEYS[1], metric .. ':last'))
+    if last and last_ts and now > last_ts then
+        local rate = (value - last) / (now - last_ts)
+        local n = tonumber(redis.call('HGET', KEYS[1], metric .. ':n') or '0')
+        local mean = tonumber(redis.call('HGET', KEYS[1], metric .. ':mean') or '0')
+        local var = tonumber(redis.call('HGET', KEYS[1], metric .. ':var') or '0')
+        local diff = rate - mean
+        local std = math.max(math.sqrt(var), min_std, min_relative_std * math.abs(mean))
+        if n >= min_samples and std > 0 then
+            local z = diff / std
+            if math.abs(z) >= threshold then
+                local event = {
+                    'task_id', ARGV[7], 'key', ARGV[8], 'metric', metric,
+                    'value', tostring(value), 'previous', tostring(last),
+                    'rate', tostring(rate), 'expected', tostring(mean),
+                    'z_score', tostring(z), 'recorded_at', tostring(now),
+                }
+                redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[5], '*', unpack(event))
+                redis.call('XADD', KEYS[3], 'MAXLEN', '~', ARGV[6], '*', unpack(event))
+                table.insert(flagged, metric)
+            end
+        end
+        if n == 0 then
+            mean = rate
+            var = 0
+        else
+            local increment = alpha * diff
+            mean = mean + increment
+            var = (1 - alpha) * (var + diff * increment)
+        end
+        redis.call('HSET', KEYS[1], metric .. ':n', n + 1, metric .. ':mean', tostring(mean), metric .. ':var', tostring(var))
+    end
+    redis.call('HSET', KEYS[1], metric .. ':last', tostring(value))
+end
+redis.call('HSET', KEYS[1], 'ts', tostring(now))
+return flagged
+"""
+
+
+class AnomalyDetector:
+    """
+    Streaming anomaly detection on the growth rate of monitor metrics.
+
+    Statistics live in Redis and are updated atomically at ingest; flagged
+    samples go to the `anomalies:{task_type}` stream and to the monitor's own
+    `anomalies:{task_type}:{key}` stream.
+    """
+
+    def __init__(self, redis_client: Redis, task_type: TaskTypeEnum, key_name: str, metrics: Tuple[str, ...]):
+        self.redis_client = redis_client
+        self.task_type = task_type
+        self.key_name = key_name
+        self.metrics = metrics
+
+    def stats_key(self, key: str) -> str:
+        return f"anomaly_stats:{self.task_type.value}:{key}"
+
+    def feed_key(self, key: Optional[str] = None) -> str:
+        if key:
+            return f"anomalies:{self.task_type.value}:{key}"
+        return f"anomalies:{self.task_type.value}"
+
+    async def observe(self, key: str, task_id: str, row: dict, threshold: Optional[float] = None, recorded_at: Optional[float] = None) -> List[str]:
+        """
+        Scores a new sample and returns the metrics that were flagged.
+        """
+        args = []
+        for metric in self.metrics:
+            if row.get(metric) is not None:
+                args += [metric, row[metric]]
+        if not args:
+            return []
+        return await self.redis_client.eval(
+            OBSERVE_SCRIPT,
+            3,
+            self.stats_key(key),
+            self.feed_key(),
+            self.feed_key(key),
+            recorded_at or time.time(),
+            settings.ANOMALY_ALPHA,
+            threshold or settings.ANOMALY_Z_THRESHOLD,
+            settings.ANOMALY_MIN_SAMPLES,
+            settings.ANOMALY_FEED_MAXLEN,
+            settings.ANOMALY_MONITOR_FEED_MAXLEN,
+            task_id,
+            key,
+            settings.ANOMALY_MIN_STD,
+            settings.ANOMALY_MIN_RELATIVE_STD,
+            *args,
+        )
+
+    def _event(self, entry_id: str, fields: Dict[str, str]) -> dict:
+        return {
+            "id": entry_id,
+            "task_id": fields["task_id"],
+            self.key_name: fields["key"],
+            "metric": fields["metric"],
+            "value": float(fields["value"]),
+            "previous": float(fields["previous"]),
+            "rate": float(fields["rate"]),
+            "expected": float(fields["expected"]),
+            "z_score": float(fields["z_score"]),
+            "recorded_at": datetime.fromtimestamp(float(fields["recorded_at"]), timezone.utc),
+        }
+
+    async def reset(self, key: str):
+        await self.redis_client.delete(self.stats_key(key))
+
+    async def feed(self, key: Optional[str] = None, before: Optional[str] = None, limit: int = 100) -> Tuple[List[dict], Optional[str]]:
+        """
+        Newest-first page of anomalies, for one monitor or the whole task type.
+        Pass the returned cursor back as `before` for the next page.
+        """
+        entries = await self.redis_client.xrevrange(self.feed_key(key), max=f"({before}" if before else "+", min="-", count=limit)
+        anomalies = [self._event(entry_id, fields) for entry_id, fields in entries]
+        next_cursor = entries[-1][0] if len(entries) == limit else None
+        return anomalies, next_cursor
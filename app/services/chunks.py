@@ -0,0 +1,147 @@
+import logging
+from datetime import datetime, timedelta
+from heapq import merge
+from operator import itemgetter
+from typing import Any, Optional, Sequence, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.utils.chunk_codec import EPOCH, decode_chunk, encode_chunk
+
+logger = logging.getLogger(__name__)
+
+
+def chunk_start(recorded_at: datetime, chunk_seconds: int = settings.CHUNK_SECONDS) -> datetime:
+    span = timedelta(seconds=chunk_seconds)
+    return EPOCH + (recorded_at - EPOCH) // span * span
+
+
+class ChunkStore:
+    """
+    A monitor history kept as recent rows in `model` (one per sample) plus
+    sealed chunks in `chunk_model` (one per monitor per CHUNK_SECONDS, with
+    the samples packed by encode_chunk). Reads merge both, so callers see a
+    single history whatever has been sealed.
+
+    `columns` are the history columns stored in a chunk and returned by reads,
+    including recorded_at. Columns are only ever appended, so chunks sealed
+    before a column existed read it as None. `extra` are per-monitor columns
+    (e.g. user_id) kept on the chunk row from its latest sample.
+    """
+
+    def __init__(self, model, chunk_model, key_name: str, columns: Sequence[Any], extra: Sequence[Any] = ()):
+        self.model = model
+        self.chunk_model = chunk_model
+        self.key_name = key_name
+        self.columns = tuple(columns)
+        self.extra = tuple(extra)
+        self.fields = tuple(column.key for column in self.columns)
+        self.types = tuple(column.type.python_type for column in self.columns)
+        self.recorded_at = itemgetter(self.fields.index("recorded_at"))
+
+    def _rows(self, db: Session, key: str):
+        return db.query(*self.columns).filter(getattr(self.model, self.key_name) == key)
+
+    def _chunks(self, db: Session, key: str):
+        return db.query(self.chunk_model.payload).filter(getattr(self.chunk_model, self.key_name) == key)
+
+    def project(self, rows: Sequence[Sequence[Any]], fields: Sequence[str]) -> list:
+        """
+        Picks `fields`, in that order, out of history rows.
+        """
+        indexes = [self.fields.index(field) for field in fields]
+        return [tuple(row[i] for i in indexes) for row in rows]
+
+    def history(self, db: Session, key: str, since: Optional[datetime] = None, desc: bool = True, until: Optional[datetime] = None) -> list:
+        """
+        The history (in [since, until), where given) as column tuples, newest
+        first unless `desc` is false.
+        """
+        rows = self._rows(db, key)
+        chunks = self._chunks(db, key)
+        if since:
+            rows = rows.filter(self.model.recorded_at >= since)
+            # Chunks are aligned, so only those starting less than a span earlier can hold later samples.
+            chunks = chunks.filter(self.chunk_model.chunk_start > since - timedelta(seconds=settings.CHUNK_SECONDS))
+        if until:
+            rows = rows.filter(self.model.recorded_at < until)
+            chunks = chunks.filter(self.chunk_model.chunk_start < until)
+        rows = rows.order_by(self.model.recorded_at.desc() if desc else self.model.recorded_at).all()
+        chunks = chunks.order_by(self.chunk_model.chunk_start.desc() if desc else self.chunk_model.chunk_start).all()
+        if not chunks:
+            return rows
+
+        sealed = []
+        for payload, in chunks:
+            samples = decode_chunk(payload, len(self.fields))
+            if since:
+                samples = [sample for sample in samples if self.recorded_at(sample) >= since]
+            if until:
+                samples = [sample for sample in samples if self.recorded_at(sample) < until]
+            sealed.extend(reversed(samples) if desc else samples)
+        # Rows written late for an already sealed chunk can interleave with it.
+        return list(merge(rows, sealed, key=self.recorded_at, reverse=desc))
+
+    def last_before(self, db: Session, key: str, before: datetime) -> Optional[tuple]:
+        """
+        The latest sample recorded before `before`, or None.
+        """
+        candidates = []
+        row = self._rows(db, key).filter(self.model.recorded_at < before).order_by(self.model.recorded_at.desc()).first()
+        if row:
+            candidates.append(row)
+        # The newest chunk starting before `before` may only hold later samples; the one before it cannot.
+        for payload, in self._chunks(db, key).filter(self.chunk_model.chunk_start < before).order_by(self.chunk_model.chunk_start.desc()).limit(2):
+            samples = [sample for sample in decode_chunk(payload, len(self.fields)) if self.recorded_at(sample) < before]
+            if samples:
+                candidates.append(samples[-1])
+                break
+        return max(candidates, key=self.recorded_at, default=None)
+
+    def stats(self, db: Session, key: str) -> Tuple[int, Optional[datetime]]:
+        """
+        Sample count and time of the latest sample, across rows and chunks.
+        """
+        count, last = db.query(func.count(), func.max(self.model.recorded_at)).filter(getattr(self.model, self.key_name) == key).one()
+        sealed_count, sealed_last = db.query(
+            func.coalesce(func.sum(self.chunk_model.sample_count), 0), func.max(self.chunk_model.last_recorded_at)
+        ).filter(getattr(self.chunk_model, self.key_name) == key).one()
+        return count + int(sealed_count), max(filter(None, (last, sealed_last)), default=None)
+
+    def seal(self, db: Session, key: str, before: datetime) -> int:
+        """
+        Packs the rows of every chunk that ends by `before` into its chunk row
+        (merging with a chunk sealed earlier) and deletes them, one chunk per
+        transaction. Returns the number of rows sealed.
+        """
+        key_column = getattr(self.model, self.key_name)
+        span = timedelta(seconds=settings.CHUNK_SECONDS)
+        sealed = 0
+        while True:
+            first = db.query(func.min(self.model.recorded_at)).filter(key_column == key).scalar()
+            if first is None or chunk_start(first) + span > before:
+                return sealed
+            start = chunk_start(first)
+            rows = db.query(self.model.id, *self.extra, *self.columns).filter(
+                key_column == key, self.model.recorded_at >= start, self.model.recorded_at < start + span
+            ).order_by(self.model.recorded_at).all()
+            samples = [tuple(row[1 + len(self.extra):]) for row in rows]
+
+            chunk = db.get(self.chunk_model, (key, start))
+            if chunk:
+                samples = sorted(decode_chunk(chunk.payload, len(self.fields)) + samples, key=self.recorded_at)
+            else:
+                chunk = self.chunk_model(**{self.key_name: key, "chunk_start": start})
+                db.add(chunk)
+            chunk.payload = encode_chunk(self.types, samples)
+            chunk.sample_count = len(samples)
+            chunk.first_recorded_at = self.recorded_at(samples[0])
+            chunk.last_recorded_at = self.recorded_at(samples[-1])
+            for column, value in zip(self.extra, rows[-1][1:]):
+                setattr(chunk, column.key, value)
+
+            # By id, so a sample written meanwhile stays behind for the next run.
+            db.query(self.model).filter(self.model.id.in_([row[0] for row in rows])).delete(synchronize_session=False)
+            db.commit()
+            sealed += len(rows)
+            logger.info(f"Sealed {len(rows)} rows of {self.model.__tablename__} {key} into chunk {start.isoformat()}: {len(chunk.payload)} bytes ({len(chunk.payload) / len(samples):.1f} bytes/sample)")
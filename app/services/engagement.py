@@ -0,0 +1,101 @@
+"""
+Engagement rate of an influencer: the average likes + comments of their most
+recent ENGAGEMENT_RECENT_POSTS posts, as a percentage of their followers.
+
+Post metrics come from, in order:
+  - `engagement_post:{post_code}`, cached for ENGAGEMENT_POST_CACHE_SECONDS,
+    so a poll only fetches posts it hasn't seen recently;
+  - the latest result of a post monitor already tracking the post (its
+    `fallback:{task_id}`), waiting for its run if one is in flight;
+  - /fetch_post_details_by_url, at most ENGAGEMENT_CONCURRENCY at a time and
+    within the shared TikHub rate budget.
+"""
+import asyncio
+import logging
+from typing import Dict, List, Optional
+import orjson
+from redis.asyncio import Redis
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.enums import TaskTypeEnum
+from app.models.task import Task
+from app.services.rate_budget import RateBudget
+from app.services.refresh import RefreshCoordinator
+from app.utils.tikhub import fetch_metrics_from_tikhub, fetch_recent_post_codes_from_tikhub
+
+logger = logging.getLogger(__name__)
+
+ENGAGEMENT_FIELDS = ("like_count", "comment_count")
+
+
+def engagement_post_key(post_code: str) -> str:
+    return f"engagement_post:{post_code}"
+
+
+def engagement_rate(follower_count: Optional[int], posts: List[dict]) -> Optional[float]:
+    if not follower_count or not posts:
+        return None
+    interactions = sum((post.get("like_count") or 0) + (post.get("comment_count") or 0) for post in posts)
+    return round(interactions / len(posts) / follower_count * 100, 4)
+
+
+class EngagementEnricher:
+    def __init__(self, db: Session, redis_client: Redis, budget: Optional[RateBudget] = None, recent_posts: int = settings.ENGAGEMENT_RECENT_POSTS):
+        self.db = db
+        self.redis_client = redis_client
+        self.budget = budget or RateBudget(redis_client)
+        self.recent_posts = recent_posts
+        self.refresh_coordinator = RefreshCoordinator(redis_client)
+
+    async def recent_post_codes(self, username: str) -> List[str]:
+        """
+        Codes of the user's most recent posts, streamed from the listing without decoding it whole.
+        """
+        if not await self.budget.acquire():
+            return []
+        return await fetch_recent_post_codes_from_tikhub(settings.TIKHUB_USER_POSTS_ENDPOINT, {"username": username}, self.recent_posts) or []
+
+    async def engagement_rate(self, username: str, follower_count: Optional[int]) -> Optional[float]:
+        """
+        Returns the engagement rate, or None if it is disabled or no recent post could be read.
+        """
+        if self.recent_posts <= 0:
+            return None
+        codes = await self.recent_post_codes(username)
+        if not codes:
+            logger.warning(f"No recent posts found for {username}; engagement rate not computed.")
+            return None
+
+        monitored = dict(self.db.query(Task.post_code, Task.id).filter(Task.task_type == TaskTypeEnum.post, Task.post_code.in_(codes)).all())
+        semaphore = asyncio.Semaphore(settings.ENGAGEMENT_CONCURRENCY)
+        posts = await asyncio.gather(*(self.post_metrics(code, monitored.get(code), semaphore) for code in codes))
+        posts = [post for post in posts if post]
+        logger.info(f"Engagement of {username} over {len(posts)}/{len(codes)} recent posts.")
+        return engagement_rate(follower_count, posts)
+
+    async def post_metrics(self, post_code: str, task_id: Optional[str], semaphore: asyncio.Semaphore) -> Optional[Dict[str, int]]:
+        cached = await self.redis_client.get(engagement_post_key(post_code))
+        if cached:
+            return orjson.loads(cached)
+
+        metrics = await self.monitored_metrics(task_id) if task_id else None
+        if metrics is None:
+            async with semaphore:
+                if await self.budget.acquire():
+                    metrics = await fetch_metrics_from_tikhub(TaskTypeEnum.post, "/fetch_post_details_by_url", {"url": f"https://www.instagram.com/p/{post_code}/"})
+        if not metrics:
+            return None
+
+        post = {field: metrics.get(field) for field in ENGAGEMENT_FIELDS}
+        await self.redis_client.set(engagement_post_key(post_code), orjson.dumps(post), ex=settings.ENGAGEMENT_POST_CACHE_SECONDS)
+        return post
+
+    async def monitored_metrics(self, task_id: str) -> Optional[dict]:
+        """
+        The latest metrics of a post monitor, after its in-flight run if there is one.
+        """
+        if await self.refresh_coordinator.state(task_id) == "running":
+            last = await self.refresh_coordinator.last_run(task_id)
+            await self.refresh_coordinator.wait(task_id, last["seq"] if last else 0, settings.ENGAGEMENT_INFLIGHT_WAIT_SECONDS)
+        latest = await self.redis_client.get(f"fallback:{task_id}")
+        return orjson.loads(latest) if latest else None
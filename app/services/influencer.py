@@ -1,28 +1,82 @@
 import uuid
-import json
-from typing import List
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, List, Optional, Tuple
 from sqlalchemy.orm import Session
-from fastapi import Depends
-from app.db.dependencies import get_db
-from app.db.redis import get_redis_client
+from app.db.redis import redis_binary_client
 from app.models.task import Task
 from app.models.influencer_metrics_history import InfluencerMetricsHistory
-from app.schemas.influencer import CreateMonitorTaskRequest, UserHistoryData
+from app.models.influencer_metrics_chunk import InfluencerMetricsChunk
 from app.schemas.enums import INTERVAL_MAP
 from app.db.enums import TaskTypeEnum, TaskStatusEnum
+from app.db.history_cache import HistoryCache
+from app.db.session import run_blocking
+from app.services.anomalies import AnomalyDetector
+from app.services.chunks import ChunkStore
+from app.services.leaderboards import LONGEST_WINDOW, Leaderboard
+from app.services.refresh import RefreshCoordinator
+from app.services.tasks import TaskCounter, filter_tasks, paginate_tasks
+from app.utils.history import dump_history_response
+from app.utils.lru import ByteLRUCache
 from redis.asyncio import Redis
 
+if TYPE_CHECKING:
+    from app.schemas.influencer import CreateMonitorTaskRequest
+
+HISTORY_COLUMNS = (
+    InfluencerMetricsHistory.follower_count,
+    InfluencerMetricsHistory.following_count,
+    InfluencerMetricsHistory.post_count,
+    InfluencerMetricsHistory.bio,
+    InfluencerMetricsHistory.recorded_at,
+    # Appended after recorded_at: sealed history chunks are positional (see ChunkStore).
+    InfluencerMetricsHistory.engagement_rate,
+)
+HISTORY_FIELDS = tuple(column.key for column in HISTORY_COLUMNS)
+HISTORY_CHUNKS = ChunkStore(InfluencerMetricsHistory, InfluencerMetricsChunk, "username", HISTORY_COLUMNS, extra=(InfluencerMetricsHistory.user_id,))
+# Metrics whose growth rate is scored for anomalies at ingest
+ANOMALY_METRICS = ("follower_count", "following_count", "post_count")
+# Metrics ranked on the leaderboards
+LEADERBOARD_METRICS = ("follower_count", "post_count")
+
+
+def build_history_row(username: str, metrics: dict) -> dict:
+    """
+    Maps TikHub user info to influencer_metrics_history columns.
+    """
+    return dict(
+        username=username,
+        user_id=int(metrics.get("id")),
+        bio=metrics.get("biography"),
+        follower_count=metrics.get("follower_count", 0),
+        following_count=metrics.get("following_count", 0),
+        post_count=metrics.get("media_count", 0),
+        engagement_rate=metrics.get("engagement_rate"),
+    )
+
 
 class InfluencerService:
-    def __init__(self, db: Session, redis_client: Redis):
+    def __init__(self, db: Session, redis_client: Redis, cache_client: Redis = None, read_db: Session = None, local_cache: ByteLRUCache = None):
         self.db = db
+        # History and listing reads; may be a lagging replica session.
+        self.read_db = read_db or db
         self.redis_client = redis_client
+        self.history_cache = HistoryCache(cache_client or redis_binary_client, "user_history", "username", HISTORY_COLUMNS, local_cache)
+        self.task_counter = TaskCounter(redis_client, TaskTypeEnum.influencer)
+        self.anomaly_detector = AnomalyDetector(redis_client, TaskTypeEnum.influencer, "username", ANOMALY_METRICS)
+        self.leaderboard = Leaderboard(redis_client, TaskTypeEnum.influencer, "username", LEADERBOARD_METRICS)
+        self.refresh_coordinator = RefreshCoordinator(redis_client)
+
+    async def run_db(self, func, *args):
+        """
+        Runs blocking DB work off the event loop and returns the connections to the pool (see run_blocking).
+        """
+        return await run_blocking(func, *args, release=(self.db, self.read_db))
 
     def get_task_by_username(self, username: str) -> Task:
         return self.db.query(Task).filter(Task.username == username, Task.task_type == TaskTypeEnum.influencer).first()
 
-    def create_monitor_task(self, task_data: CreateMonitorTaskRequest) -> Task:
-        existing_task = self.get_task_by_username(task_data.username)
+    async def create_monitor_task(self, task_data: "CreateMonitorTaskRequest") -> Task:
+        existing_task = await self.run_db(self.get_task_by_username, task_data.username)
         if existing_task:
             return None
             
@@ -33,79 +87,199 @@ class InfluencerService:
             username=task_data.username,
             interval_seconds=interval_seconds,
             status=TaskStatusEnum.active,
+            anomaly_threshold=task_data.anomaly_threshold,
         )
-        self.db.add(new_task)
-        self.db.commit()
-        self.db.refresh(new_task)
+        async with self.task_counter.writing() as changes:
+            await self.run_db(self._insert_task, new_task)
+            changes[(new_task.status, new_task.interval_seconds)] += 1
         return new_task
 
-    async def create_metrics_history(self, username: str, metrics: dict):
-        new_history = InfluencerMetricsHistory(
-            username=username,
-            user_id=int(metrics.get("id")),
-            bio=metrics.get("biography"),
-            follower_count=metrics.get("follower_count", 0),
-            following_count=metrics.get("following_count", 0),
-            post_count=metrics.get("media_count", 0)
-        )
+    def _insert_task(self, task: Task):
+        self.db.add(task)
+        self.db.commit()
+        self.db.refresh(task)
+
+    async def create_metrics_history(self, username: str, metrics: dict, task: Optional[Task] = None):
+        row = build_history_row(username, metrics)
+        new_history = InfluencerMetricsHistory(**row)
         self.db.add(new_history)
         self.db.commit()
 
-        # Invalidate cache
-        cache_key = f"user_history:{username}"
-        await self.redis_client.delete(cache_key)
+        # Invalidate cache. The validators are recomputed rather than incremented,
+        # so a meta seeded by a concurrent read can't count this sample twice.
+        await self.history_cache.invalidate(username)
+        await self.history_cache.record_sample(username, self.history_meta(username, task.interval_seconds) if task else None)
+
+        if task:
+            await self.anomaly_detector.observe(username, task.id, row, task.anomaly_threshold)
+        await self.leaderboard.record(username, row)
+
+    def query_history(self, username: str, db: Session = None) -> list:
+        return HISTORY_CHUNKS.history(db or self.read_db, username)
 
-    async def get_user_history(self, username: str) -> List[InfluencerMetricsHistory]:
-        cache_key = f"user_history:{username}"
-        cached_history = await self.redis_client.get(cache_key)
+    def query_history_stats(self, username: str) -> tuple:
+        # Primary: the seeded count is what replica history reads are checked against.
+        return HISTORY_CHUNKS.stats(self.db, username)
+
+    async def get_user_history(self, username: str) -> bytes:
+        """
+        Returns the serialized history response, served from Redis when possible.
+        """
+        cached_history = await self.history_cache.get(username)
 
         if cached_history:
-            history_data = json.loads(cached_history)
-            return [InfluencerMetricsHistory(**item) for item in history_data]
-
-        user_history = self.db.query(InfluencerMetricsHistory).filter(InfluencerMetricsHistory.username == username).order_by(InfluencerMetricsHistory.recorded_at.desc()).all()
-        
-        if user_history:
-            task = self.get_task_by_username(username)
-            if task and task.interval_seconds > 0:
-                history_to_cache = []
-                for h in user_history:
-                    h_dict = h.__dict__
-                    h_dict.pop('_sa_instance_state', None)
-                    h_dict['recorded_at'] = h.recorded_at.isoformat() if h.recorded_at else None
-                    history_to_cache.append(h_dict)
-                
-                await self.redis_client.set(cache_key, json.dumps(history_to_cache), ex=task.interval_seconds)
-
-        return user_history
-
-    def list_tasks(self) -> List[Task]:
-        return self.db.query(Task).filter(Task.task_type == TaskTypeEnum.influencer).all()
-
-    def stop_tasks(self, task_ids: List[str]) -> List[str]:
-        self.db.query(Task).filter(Task.id.in_(task_ids)).update({"status": TaskStatusEnum.stopped}, synchronize_session=False)
+            return cached_history
+
+        meta = await self.history_cache.get_meta(username)
+        user_history, body, interval_seconds = await self.run_db(self.load_history, username, meta)
+        if user_history and interval_seconds:
+            await self.history_cache.set(username, user_history, body, interval_seconds)
+
+        return body
+
+    def load_history(self, username: str, meta: Optional[dict]) -> tuple:
+        """
+        Reads and serializes the history (blocking). Returns the rows, the
+        response body and the task's interval, or None if it shouldn't be cached.
+        """
+        user_history = self.query_history(username)
+        if meta and len(user_history) < meta["count"] and self.read_db is not self.db:
+            # The replica hasn't caught up with the samples already recorded; don't serve or cache that.
+            user_history = self.query_history(username, self.db)
+        body = dump_history_response("username", username, HISTORY_FIELDS, user_history)
+        task = self.get_task_by_username(username) if user_history else None
+        return user_history, body, task.interval_seconds if task and task.interval_seconds > 0 else None
+
+    def history_meta(self, username: str, interval_seconds: int) -> Optional[dict]:
+        """
+        The history validators (sample count, time of the latest sample, interval) read from the primary.
+        """
+        count, last_recorded_at = self.query_history_stats(username)
+        if not count:
+            return None
+        return {"count": count, "last": last_recorded_at.replace(tzinfo=timezone.utc).timestamp(), "interval": interval_seconds}
+
+    async def get_user_history_meta(self, username: str) -> Optional[dict]:
+        """
+        Returns the history validators kept in Redis, seeding them from MySQL if missing.
+        """
+        meta = await self.history_cache.get_meta(username)
+        if meta:
+            return meta
+
+        meta = await self.run_db(self.load_history_meta, username)
+        if meta:
+            await self.history_cache.seed_meta(username, **meta)
+        return meta
+
+    def load_history_meta(self, username: str) -> Optional[dict]:
+        task = self.get_task_by_username(username)
+        return self.history_meta(username, task.interval_seconds) if task else None
+
+    def list_tasks(self, limit: int = 100, cursor: Optional[str] = None, username_prefix: Optional[str] = None, **filters) -> Tuple[List[Task], Optional[str]]:
+        """
+        Returns one page of tasks ordered by username, plus the cursor for the next page.
+        """
+        query = filter_tasks(self.read_db.query(Task).filter(Task.task_type == TaskTypeEnum.influencer), **filters)
+        return paginate_tasks(query, Task.username, limit, cursor, username_prefix)
+
+    async def task_summary(self) -> dict:
+        return await self.task_counter.summary(self.db)
+
+    async def stop_tasks(self, task_ids: List[str]) -> List[str]:
+        """
+        Stops the given tasks of this type. Returns the ids of those that weren't stopped already.
+        """
+        async with self.task_counter.writing() as changes:
+            stopping = await self.run_db(self._stop_tasks, task_ids)
+            for _, status, interval_seconds in stopping:
+                changes[(status, interval_seconds)] -= 1
+                changes[(TaskStatusEnum.stopped, interval_seconds)] += 1
+        return [task_id for task_id, _, _ in stopping]
+
+    def _stop_tasks(self, task_ids: List[str]) -> list:
+        # Locked, so the counts are adjusted from the statuses that were actually replaced.
+        stopping = self.db.query(Task.id, Task.status, Task.interval_seconds).filter(
+            Task.id.in_(task_ids), Task.task_type == TaskTypeEnum.influencer, Task.status != TaskStatusEnum.stopped
+        ).with_for_update().all()
+        if stopping:
+            self.db.query(Task).filter(Task.id.in_([task_id for task_id, _, _ in stopping])).update({"status": TaskStatusEnum.stopped}, synchronize_session=False)
         self.db.commit()
-        return task_ids
+        return stopping
+
+    def set_anomaly_threshold(self, task_id: str, threshold: Optional[float]) -> Task:
+        task = self.get_task(task_id)
+        if task:
+            task.anomaly_threshold = threshold
+            self.db.commit()
+            self.db.refresh(task)
+        return task
+
+    async def anomaly_feed(self, username: Optional[str] = None, before: Optional[str] = None, limit: int = 100) -> Tuple[List[dict], Optional[str]]:
+        return await self.anomaly_detector.feed(username, before, limit)
+
+    async def leaderboard_top(self, metric: str, board: str, limit: int = 50, offset: int = 0) -> List[dict]:
+        return await self.leaderboard.top(metric, board, limit, offset)
+
+    async def leaderboard_rank(self, metric: str, board: str, username: str) -> Optional[dict]:
+        return await self.leaderboard.rank(metric, board, username)
 
-    def get_task(self, task_id: str) -> Task:
-        return self.db.query(Task).filter(Task.id == task_id).first()
+    def query_leaderboard_samples(self, username: str, since: datetime) -> list:
+        """
+        History since `since` plus the last sample before it, oldest first.
+        """
+        anchor = HISTORY_CHUNKS.last_before(self.db, username, since)
+        samples = HISTORY_CHUNKS.history(self.db, username, since=since, desc=False)
+        return HISTORY_CHUNKS.project(([anchor] if anchor else []) + samples, ("recorded_at", *LEADERBOARD_METRICS))
+
+    async def rebuild_leaderboard(self) -> int:
+        """
+        Reseeds the leaderboards from MySQL history. Returns the number of monitors replayed.
+        """
+        await self.leaderboard.clear()
+        since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=LONGEST_WINDOW)
+        keys = [key for key, in self.db.query(Task.username).filter(Task.task_type == TaskTypeEnum.influencer, Task.status != TaskStatusEnum.stopped)]
+        for key in keys:
+            await self.leaderboard.rebuild(key, self.query_leaderboard_samples(key, since))
+        await self.leaderboard.expire()
+        return len(keys)
+
+    def seal_history(self, before: datetime) -> int:
+        """
+        Seals every monitor's history chunks that end by `before`. Returns the number of rows sealed.
+        """
+        keys = [key for key, in self.db.query(Task.username).filter(Task.task_type == TaskTypeEnum.influencer)]
+        return sum(HISTORY_CHUNKS.seal(self.db, key, before) for key in keys)
+
+    async def refresh(self, task_id: str, wait: float = 0) -> dict:
+        return await self.refresh_coordinator.request(task_id, wait)
+
+    async def refresh_status(self, task_id: str, after_seq: int) -> dict:
+        return await self.refresh_coordinator.status(task_id, after_seq)
+
+    def get_task(self, task_id: str, for_update: bool = False) -> Task:
+        query = self.db.query(Task).filter(Task.id == task_id, Task.task_type == TaskTypeEnum.influencer)
+        return (query.with_for_update() if for_update else query).first()
 
     async def update_task_status(self, task_id: str, status: TaskStatusEnum) -> Task:
-        task = self.get_task(task_id)
+        async with self.task_counter.writing() as changes:
+            task, old_status = await self.run_db(self._set_status, task_id, status)
+            if task:
+                changes[(old_status, task.interval_seconds)] -= 1
+                changes[(task.status, task.interval_seconds)] += 1
         if task:
             if status == TaskStatusEnum.paused:
                 await self.redis_client.set(f"paused_task:{task_id}", 1)
             elif status == TaskStatusEnum.active:
                 await self.redis_client.delete(f"paused_task:{task_id}")
-            
-            task.status = status
-            self.db.commit()
-            self.db.refresh(task)
         return task
 
-
-async def get_influencer_service(
-    db: Session = Depends(get_db),
-    redis_client: Redis = Depends(get_redis_client)
-) -> InfluencerService:
-    return InfluencerService(db, redis_client) 
\ No newline at end of file
+    def _set_status(self, task_id: str, status: TaskStatusEnum) -> Tuple[Optional[Task], Optional[TaskStatusEnum]]:
+        task = self.get_task(task_id, for_update=True)
+        if not task:
+            return None, None
+        old_status = task.status
+        task.status = status
+        self.db.commit()
+        self.db.refresh(task)
+        return task, old_status
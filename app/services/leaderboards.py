@@ -0,0 +1,164 @@
+import time
+from datetime import timezone
+from typing import List, Optional, Tuple
+from redis.asyncio import Redis
+from app.core.config import settings
+from app.db.enums import TaskTypeEnum
+
+# Board name -> window in seconds; "total" ranks by the latest absolute value.
+WINDOWS = {"total": 0, "1h": 3600, "24h": 86400, "7d": 7 * 86400}
+LONGEST_WINDOW = max(WINDOWS.values())
+
+# Folds one sample into the boards of a monitor.
+#
+# The monitor's recent samples are kept in a sorted set scored by time (member
+# "ts|v1|v2..."), trimmed to the longest window plus one anchor sample before
+# it, so growth over a window is the current value minus the value at the
+# window start. Each board has an expiry sorted set (member -> last sample +
+# window); members past it are dropped a batch at a time on every ingest, so
+# monitors that stop reporting fall off without any sweep.
+#
+# KEYS: samples, then per board: one sorted set per metric and its expiry set
+# ARGV: now, member, metric count, board count, board windows..., metric values..., trim batch
+RECORD_SCRIPT = """
+local now = tonumber(ARGV[1])
+local member = ARGV[2]
+local m = tonumber(ARGV[3])
+local b = tonumber(ARGV[4])
+local windows, values = {}, {}
+local longest = 0
+for j = 1, b do
+    windows[j] = tonumber(ARGV[4 + j])
+    if windows[j] > longest then longest = windows[j] end
+end
+for i = 1, m do values[i] = ARGV[4 + b + i] end
+local batch = tonumber(ARGV[5 + b + m])
+
+redis.call('ZADD', KEYS[1], now, now .. '|' .. table.concat(values, '|'))
+local anchor = redis.call('ZREVRANGEBYSCORE', KEYS[1], '(' .. (now - longest), '-inf', 'WITHSCORES', 'LIMIT', 0, 1)
+if anchor[2] then
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', '(' .. anchor[2])
+end
+redis.call('EXPIRE', KEYS[1], 2 * longest)
+
+for j = 1, b do
+    local base = 1 + (j - 1) * (m + 1)
+    local baseline = nil
+    if windows[j] > 0 then
+        local start = redis.call('ZREVRANGEBYSCORE', KEYS[1], now - windows[j], '-inf', 'LIMIT', 0, 1)[1]
+                   or redis.call('ZRANGEBYSCORE', KEYS[1], now - windows[j], '+inf', 'LIMIT', 0, 1)[1]
+        baseline = {}
+        for value in string.gmatch(start, '[^|]+') do table.insert(baseline, tonumber(value)) end
+    end
+    for i = 1, m do
+        local score = tonumber(values[i])
+        if baseline then score = score - baseline[i + 1] end
+        redis.call('ZADD', KEYS[base + i], score, member)
+    end
+    local expiry = KEYS[base + m + 1]
+    redis.call('ZADD', expiry, now + (windows[j] > 0 and windows[j] or longest), member)
+    for _, expired in ipairs(redis.call('ZRANGEBYSCORE', expiry, '-inf', now, 'LIMIT', 0, batch)) do
+        for i = 1, m do redis.call('ZREM', KEYS[base + i], expired) end
+        redis.call('ZREM', expiry, expired)
+    end
+end
+"""
+
+
+class Leaderboard:
+    """
+    Rolling leaderboards per metric kept in Redis sorted sets at ingest:
+    `leaderboard:{task_type}:{metric}:{board}` holds the absolute value
+    ("total") or the growth over the board's window, so top-N and rank
+    lookups are O(log n) and never touch MySQL.
+    """
+
+    def __init__(self, redis_client: Redis, task_type: TaskTypeEnum, key_name: str, metrics: Tuple[str, ...]):
+        self.redis_client = redis_client
+        self.task_type = task_type
+        self.key_name = key_name
+        self.metrics = metrics
+
+    def board_key(self, metric: str, board: str) -> str:
+        return f"leaderboard:{self.task_type.value}:{metric}:{board}"
+
+    def expiry_key(self, board: str) -> str:
+        return f"leaderboard:{self.task_type.value}:expiry:{board}"
+
+    def samples_key(self, key: str) -> str:
+        return f"leaderboard_samples:{self.task_type.value}:{key}"
+
+    def _keys(self, key: str) -> List[str]:
+        keys = [self.samples_key(key)]
+        for board in WINDOWS:
+            keys += [self.board_key(metric, board) for metric in self.metrics]
+            keys.append(self.expiry_key(board))
+        return keys
+
+    async def record(self, key: str, row: dict, recorded_at: Optional[float] = None):
+        values = [row.get(metric) or 0 for metric in self.metrics]
+        await self.redis_client.eval(
+            RECORD_SCRIPT,
+            len(WINDOWS) * (len(self.metrics) + 1) + 1,
+            *self._keys(key),
+            recorded_at or time.time(),
+            key,
+            len(self.metrics),
+            len(WINDOWS),
+            *WINDOWS.values(),
+            *values,
+            settings.LEADERBOARD_TRIM_BATCH,
+        )
+
+    async def top(self, metric: str, board: str, limit: int = 50, offset: int = 0) -> List[dict]:
+        entries = await self.redis_client.zrevrange(self.board_key(metric, board), offset, offset + limit - 1, withscores=True)
+        return [{"rank": offset + i + 1, self.key_name: key, "score": score} for i, (key, score) in enumerate(entries)]
+
+    async def rank(self, metric: str, board: str, key: str) -> Optional[dict]:
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.zrevrank(self.board_key(metric, board), key)
+            pipe.zscore(self.board_key(metric, board), key)
+            rank, score = await pipe.execute()
+        if rank is None:
+            return None
+        return {"rank": rank + 1, self.key_name: key, "score": score}
+
+    async def clear(self):
+        """
+        Drops every board and sample set of this task type.
+        """
+        patterns = (f"leaderboard:{self.task_type.value}:*", f"leaderboard_samples:{self.task_type.value}:*")
+        for pattern in patterns:
+            keys = [key async for key in self.redis_client.scan_iter(match=pattern, count=1000)]
+            for i in range(0, len(keys), 1000):
+                await self.redis_client.delete(*keys[i:i + 1000])
+
+    async def expire(self, now: Optional[float] = None):
+        """
+        Drops every member whose board window has passed (ingest only does this a batch at a time).
+        """
+        now = now or time.time()
+        for board in WINDOWS:
+            expired = await self.redis_client.zrangebyscore(self.expiry_key(board), "-inf", now)
+            if expired:
+                async with self.redis_client.pipeline(transaction=False) as pipe:
+                    for metric in self.metrics:
+                        pipe.zrem(self.board_key(metric, board), *expired)
+                    pipe.zrem(self.expiry_key(board), *expired)
+                    await pipe.execute()
+
+    async def rebuild(self, key: str, samples: List[Tuple]):
+        """
+        Reseeds a monitor from its history, given as (recorded_at, *metrics)
+        tuples in time order: the sample set is loaded as-is and only the
+        latest sample goes through the ingest script.
+        """
+        if not samples:
+            return
+        mapping = {}
+        for recorded_at, *values in samples:
+            ts = recorded_at.replace(tzinfo=timezone.utc).timestamp()
+            mapping[f"{ts:.14g}|" + "|".join(str(value or 0) for value in values)] = ts
+        await self.redis_client.zadd(self.samples_key(key), mapping)
+        recorded_at, *values = samples[-1]
+        await self.record(key, dict(zip(self.metrics, values)), recorded_at.replace(tzinfo=timezone.utc).timestamp())
@@ -1,28 +1,77 @@
 import uuid
-import json
-from typing import List
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, List, Optional, Tuple
 from sqlalchemy.orm import Session
-from fastapi import Depends
-from app.db.dependencies import get_db
-from app.db.redis import get_redis_client
+from app.db.redis import redis_binary_client
 from app.models.task import Task
 from app.models.post_metrics_history import PostMetricsHistory
-from app.schemas.post import CreatePostMonitorTaskRequest
+from app.models.post_metrics_chunk import PostMetricsChunk
 from app.schemas.enums import INTERVAL_MAP
 from app.db.enums import TaskTypeEnum, TaskStatusEnum
 from app.utils.common import extract_post_code
+from app.db.history_cache import HistoryCache
+from app.db.session import run_blocking
+from app.services.anomalies import AnomalyDetector
+from app.services.chunks import ChunkStore
+from app.services.leaderboards import LONGEST_WINDOW, Leaderboard
+from app.services.refresh import RefreshCoordinator
+from app.services.tasks import TaskCounter, filter_tasks, paginate_tasks
+from app.utils.history import dump_history_response
+from app.utils.lru import ByteLRUCache
 from redis.asyncio import Redis
 
+if TYPE_CHECKING:
+    from app.schemas.post import CreatePostMonitorTaskRequest
+
+HISTORY_COLUMNS = (
+    PostMetricsHistory.like_count,
+    PostMetricsHistory.comment_count,
+    PostMetricsHistory.play_count,
+    PostMetricsHistory.recorded_at,
+)
+HISTORY_FIELDS = tuple(column.key for column in HISTORY_COLUMNS)
+HISTORY_CHUNKS = ChunkStore(PostMetricsHistory, PostMetricsChunk, "post_code", HISTORY_COLUMNS, extra=(PostMetricsHistory.post_id,))
+# Metrics whose growth rate is scored for anomalies at ingest
+ANOMALY_METRICS = ("like_count", "comment_count", "play_count")
+# Metrics ranked on the leaderboards
+LEADERBOARD_METRICS = ("like_count", "comment_count", "play_count")
+
+
+def build_history_row(post_code: str, metrics: dict) -> dict:
+    """
+    Maps TikHub post details to post_metrics_history columns.
+    """
+    return dict(
+        post_id=int(metrics.get("id")),
+        post_code=post_code,
+        like_count=metrics.get("like_count", 0),
+        comment_count=metrics.get("comment_count", 0),
+        play_count=metrics.get("play_count"),
+    )
+
 
 class PostService:
-    def __init__(self, db: Session, redis_client: Redis):
+    def __init__(self, db: Session, redis_client: Redis, cache_client: Redis = None, read_db: Session = None, local_cache: ByteLRUCache = None):
         self.db = db
+        # History and listing reads; may be a lagging replica session.
+        self.read_db = read_db or db
         self.redis_client = redis_client
+        self.history_cache = HistoryCache(cache_client or redis_binary_client, "post_history", "post_code", HISTORY_COLUMNS, local_cache)
+        self.task_counter = TaskCounter(redis_client, TaskTypeEnum.post)
+        self.anomaly_detector = AnomalyDetector(redis_client, TaskTypeEnum.post, "post_code", ANOMALY_METRICS)
+        self.leaderboard = Leaderboard(redis_client, TaskTypeEnum.post, "post_code", LEADERBOARD_METRICS)
+        self.refresh_coordinator = RefreshCoordinator(redis_client)
+
+    async def run_db(self, func, *args):
+        """
+        Runs blocking DB work off the event loop and returns the connections to the pool (see run_blocking).
+        """
+        return await run_blocking(func, *args, release=(self.db, self.read_db))
 
     def get_task_by_post_code(self, post_code: str) -> Task:
         return self.db.query(Task).filter(Task.post_code == post_code, Task.task_type == TaskTypeEnum.post).first()
 
-    def create_monitor_task(self, task_data: CreatePostMonitorTaskRequest, post_code: str) -> Task:
+    async def create_monitor_task(self, task_data: "CreatePostMonitorTaskRequest", post_code: str) -> Task:
         interval_seconds = INTERVAL_MAP[task_data.interval]
         new_task = Task(
             id=str(uuid.uuid4()),
@@ -30,79 +79,199 @@ class PostService:
             post_code=post_code,
             interval_seconds=interval_seconds,
             status=TaskStatusEnum.active,
+            anomaly_threshold=task_data.anomaly_threshold,
         )
-        self.db.add(new_task)
-        self.db.commit()
-        self.db.refresh(new_task)
+        async with self.task_counter.writing() as changes:
+            await self.run_db(self._insert_task, new_task)
+            changes[(new_task.status, new_task.interval_seconds)] += 1
         return new_task
 
-    async def create_metrics_history(self, post_code: str, metrics: dict):
-        new_history = PostMetricsHistory(
-            post_id=int(metrics.get("id")),
-            post_code=post_code,
-            like_count=metrics.get("like_count", 0),
-            comment_count=metrics.get("comment_count", 0),
-            play_count=metrics.get("play_count")
-        )
+    def _insert_task(self, task: Task):
+        self.db.add(task)
+        self.db.commit()
+        self.db.refresh(task)
+
+    async def create_metrics_history(self, post_code: str, metrics: dict, task: Optional[Task] = None):
+        row = build_history_row(post_code, metrics)
+        new_history = PostMetricsHistory(**row)
         self.db.add(new_history)
         self.db.commit()
 
-        # Invalidate cache
-        cache_key = f"post_history:{post_code}"
-        await self.redis_client.delete(cache_key)
+        # Invalidate cache. The validators are recomputed rather than incremented,
+        # so a meta seeded by a concurrent read can't count this sample twice.
+        await self.history_cache.invalidate(post_code)
+        await self.history_cache.record_sample(post_code, self.history_meta(post_code, task.interval_seconds) if task else None)
+
+        if task:
+            await self.anomaly_detector.observe(post_code, task.id, row, task.anomaly_threshold)
+        await self.leaderboard.record(post_code, row)
+
+    def query_history(self, post_code: str, db: Session = None) -> list:
+        return HISTORY_CHUNKS.history(db or self.read_db, post_code)
+
+    def query_history_stats(self, post_code: str) -> tuple:
+        # Primary: the seeded count is what replica history reads are checked against.
+        return HISTORY_CHUNKS.stats(self.db, post_code)
+
+    async def get_video_history(self, post_code: str) -> bytes:
+        """
+        Returns the serialized history response, served from Redis when possible.
+        """
+        cached_history = await self.history_cache.get(post_code)
 
-    async def get_video_history(self, post_code: str) -> List[PostMetricsHistory]:
-        cache_key = f"post_history:{post_code}"
-        print(f"cache_key: {cache_key}")
-        cached_history = await self.redis_client.get(cache_key)
-        print(f"cached_history: {cached_history}")
         if cached_history:
-            history_data = json.loads(cached_history)
-            return [PostMetricsHistory(**item) for item in history_data]
-
-        post_history = self.db.query(PostMetricsHistory).filter(PostMetricsHistory.post_code == post_code).order_by(PostMetricsHistory.recorded_at.desc()).all()
-        print(f"post_history: {post_history}")
-        if post_history:
-            task = self.get_task_by_post_code(post_code)
-            if task and task.interval_seconds > 0:
-                history_to_cache = []
-                for h in post_history:
-                    h_dict = h.__dict__
-                    h_dict.pop('_sa_instance_state', None)
-                    h_dict['recorded_at'] = h.recorded_at.isoformat() if h.recorded_at else None
-                    history_to_cache.append(h_dict)
-                
-                await self.redis_client.set(cache_key, json.dumps(history_to_cache), ex=task.interval_seconds)
-
-        return post_history
-
-    def list_tasks(self) -> List[Task]:
-        return self.db.query(Task).filter(Task.task_type == TaskTypeEnum.post).all()
-
-    def stop_tasks(self, task_ids: List[str]) -> List[str]:
-        self.db.query(Task).filter(Task.id.in_(task_ids)).update({"status": TaskStatusEnum.stopped}, synchronize_session=False)
+            return cached_history
+
+        meta = await self.history_cache.get_meta(post_code)
+        post_history, body, interval_seconds = await self.run_db(self.load_history, post_code, meta)
+        if post_history and interval_seconds:
+            await self.history_cache.set(post_code, post_history, body, interval_seconds)
+
+        return body
+
+    def load_history(self, post_code: str, meta: Optional[dict]) -> tuple:
+        """
+        Reads and serializes the history (blocking). Returns the rows, the
+        response body and the task's interval, or None if it shouldn't be cached.
+        """
+        post_history = self.query_history(post_code)
+        if meta and len(post_history) < meta["count"] and self.read_db is not self.db:
+            # The replica hasn't caught up with the samples already recorded; don't serve or cache that.
+            post_history = self.query_history(post_code, self.db)
+        body = dump_history_response("post_code", post_code, HISTORY_FIELDS, post_history)
+        task = self.get_task_by_post_code(post_code) if post_history else None
+        return post_history, body, task.interval_seconds if task and task.interval_seconds > 0 else None
+
+    def history_meta(self, post_code: str, interval_seconds: int) -> Optional[dict]:
+        """
+        The history validators (sample count, time of the latest sample, interval) read from the primary.
+        """
+        count, last_recorded_at = self.query_history_stats(post_code)
+        if not count:
+            return None
+        return {"count": count, "last": last_recorded_at.replace(tzinfo=timezone.utc).timestamp(), "interval": interval_seconds}
+
+    async def get_video_history_meta(self, post_code: str) -> Optional[dict]:
+        """
+        Returns the history validators kept in Redis, seeding them from MySQL if missing.
+        """
+        meta = await self.history_cache.get_meta(post_code)
+        if meta:
+            return meta
+
+        meta = await self.run_db(self.load_history_meta, post_code)
+        if meta:
+            await self.history_cache.seed_meta(post_code, **meta)
+        return meta
+
+    def load_history_meta(self, post_code: str) -> Optional[dict]:
+        task = self.get_task_by_post_code(post_code)
+        return self.history_meta(post_code, task.interval_seconds) if task else None
+
+    def list_tasks(self, limit: int = 100, cursor: Optional[str] = None, post_code_prefix: Optional[str] = None, **filters) -> Tuple[List[Task], Optional[str]]:
+        """
+        Returns one page of tasks ordered by post_code, plus the cursor for the next page.
+        """
+        query = filter_tasks(self.read_db.query(Task).filter(Task.task_type == TaskTypeEnum.post), **filters)
+        return paginate_tasks(query, Task.post_code, limit, cursor, post_code_prefix)
+
+    async def task_summary(self) -> dict:
+        return await self.task_counter.summary(self.db)
+
+    async def stop_tasks(self, task_ids: List[str]) -> List[str]:
+        """
+        Stops the given tasks of this type. Returns the ids of those that weren't stopped already.
+        """
+        async with self.task_counter.writing() as changes:
+            stopping = await self.run_db(self._stop_tasks, task_ids)
+            for _, status, interval_seconds in stopping:
+                changes[(status, interval_seconds)] -= 1
+                changes[(TaskStatusEnum.stopped, interval_seconds)] += 1
+        return [task_id for task_id, _, _ in stopping]
+
+    def _stop_tasks(self, task_ids: List[str]) -> list:
+        # Locked, so the counts are adjusted from the statuses that were actually replaced.
+        stopping = self.db.query(Task.id, Task.status, Task.interval_seconds).filter(
+            Task.id.in_(task_ids), Task.task_type == TaskTypeEnum.post, Task.status != TaskStatusEnum.stopped
+        ).with_for_update().all()
+        if stopping:
+            self.db.query(Task).filter(Task.id.in_([task_id for task_id, _, _ in stopping])).update({"status": TaskStatusEnum.stopped}, synchronize_session=False)
         self.db.commit()
-        return task_ids
+        return stopping
+
+    def set_anomaly_threshold(self, task_id: str, threshold: Optional[float]) -> Task:
+        task = self.get_task(task_id)
+        if task:
+            task.anomaly_threshold = threshold
+            self.db.commit()
+            self.db.refresh(task)
+        return task
+
+    async def anomaly_feed(self, post_code: Optional[str] = None, before: Optional[str] = None, limit: int = 100) -> Tuple[List[dict], Optional[str]]:
+        return await self.anomaly_detector.feed(post_code, before, limit)
+
+    async def leaderboard_top(self, metric: str, board: str, limit: int = 50, offset: int = 0) -> List[dict]:
+        return await self.leaderboard.top(metric, board, limit, offset)
+
+    async def leaderboard_rank(self, metric: str, board: str, post_code: str) -> Optional[dict]:
+        return await self.leaderboard.rank(metric, board, post_code)
 
-    def get_task(self, task_id: str) -> Task:
-        return self.db.query(Task).filter(Task.id == task_id).first()
+    def query_leaderboard_samples(self, post_code: str, since: datetime) -> list:
+        """
+        History since `since` plus the last sample before it, oldest first.
+        """
+        anchor = HISTORY_CHUNKS.last_before(self.db, post_code, since)
+        samples = HISTORY_CHUNKS.history(self.db, post_code, since=since, desc=False)
+        return HISTORY_CHUNKS.project(([anchor] if anchor else []) + samples, ("recorded_at", *LEADERBOARD_METRICS))
+
+    async def rebuild_leaderboard(self) -> int:
+        """
+        Reseeds the leaderboards from MySQL history. Returns the number of monitors replayed.
+        """
+        await self.leaderboard.clear()
+        since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=LONGEST_WINDOW)
+        keys = [key for key, in self.db.query(Task.post_code).filter(Task.task_type == TaskTypeEnum.post, Task.status != TaskStatusEnum.stopped)]
+        for key in keys:
+            await self.leaderboard.rebuild(key, self.query_leaderboard_samples(key, since))
+        await self.leaderboard.expire()
+        return len(keys)
+
+    def seal_history(self, before: datetime) -> int:
+        """
+        Seals every monitor's history chunks that end by `before`. Returns the number of rows sealed.
+        """
+        keys = [key for key, in self.db.query(Task.post_code).filter(Task.task_type == TaskTypeEnum.post)]
+        return sum(HISTORY_CHUNKS.seal(self.db, key, before) for key in keys)
+
+    async def refresh(self, task_id: str, wait: float = 0) -> dict:
+        return await self.refresh_coordinator.request(task_id, wait)
+
+    async def refresh_status(self, task_id: str, after_seq: int) -> dict:
+        return await self.refresh_coordinator.status(task_id, after_seq)
+
+    def get_task(self, task_id: str, for_update: bool = False) -> Task:
+        query = self.db.query(Task).filter(Task.id == task_id, Task.task_type == TaskTypeEnum.post)
+        return (query.with_for_update() if for_update else query).first()
 
     async def update_task_status(self, task_id: str, status: TaskStatusEnum) -> Task:
-        task = self.get_task(task_id)
+        async with self.task_counter.writing() as changes:
+            task, old_status = await self.run_db(self._set_status, task_id, status)
+            if task:
+                changes[(old_status, task.interval_seconds)] -= 1
+                changes[(task.status, task.interval_seconds)] += 1
         if task:
             if status == TaskStatusEnum.paused:
                 await self.redis_client.set(f"paused_task:{task_id}", 1)
             elif status == TaskStatusEnum.active:
                 await self.redis_client.delete(f"paused_task:{task_id}")
-
-            task.status = status
-            self.db.commit()
-            self.db.refresh(task)
         return task
 
-
-async def get_post_service(
-    db: Session = Depends(get_db),
-    redis_client: Redis = Depends(get_redis_client)
-) -> PostService:
-    return PostService(db, redis_client) 
\ No newline at end of file
+    def _set_status(self, task_id: str, status: TaskStatusEnum) -> Tuple[Optional[Task], Optional[TaskStatusEnum]]:
+        task = self.get_task(task_id, for_update=True)
+        if not task:
+            return None, None
+        old_status = task.status
+        task.status = status
+        self.db.commit()
+        self.db.refresh(task)
+        return task, old_status
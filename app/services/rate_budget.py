@@ -0,0 +1,63 @@
+import asyncio
+import logging
+from redis.asyncio import Redis
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TIKHUB_BUDGET_KEY = "rate_budget:tikhub"
+
+# Token bucket refilled from Redis' clock, so every worker draws from the same
+# budget. Takes one token if available and returns 0, otherwise returns the
+# milliseconds until one will be.
+TAKE_TOKEN_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = redis.call('TIME')
+now = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate / 1000)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + 1000)
+return wait
+"""
+
+
+class RateBudget:
+    """
+    Requests per second shared by all workers. With `rate` <= 0 every request
+    is allowed.
+    """
+
+    def __init__(self, redis_client: Redis, key: str = TIKHUB_BUDGET_KEY, rate: float = settings.TIKHUB_RATE_PER_SECOND, burst: int = settings.TIKHUB_RATE_BURST):
+        self.redis_client = redis_client
+        self.key = key
+        self.rate = rate
+        self.burst = burst
+
+    async def acquire(self, max_wait: float = settings.TIKHUB_RATE_MAX_WAIT_SECONDS) -> bool:
+        """
+        Takes one request from the budget, waiting up to `max_wait` seconds for
+        it. Returns False if the budget stayed exhausted.
+        """
+        if self.rate <= 0:
+            return True
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max_wait
+        while True:
+            wait_ms = await self.redis_client.eval(TAKE_TOKEN_SCRIPT, 1, self.key, self.rate, self.burst)
+            if not wait_ms:
+                return True
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                logger.warning(f"Rate budget {self.key} exhausted for {max_wait}s.")
+                return False
+            await asyncio.sleep(min(wait_ms / 1000, remaining))
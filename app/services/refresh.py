@@ -0,0 +1,165 @@
+"""
+On-demand refresh of a monitor, merged with any run already in flight.
+
+`inflight:{task_id}` holds "queued" (a refresh was enqueued) or "running" (a
+worker is fetching). Every finished run increments `run_seq:{task_id}`, stores
+{seq, outcome} in `run_last:{task_id}` and publishes it on `run_done:{task_id}`.
+A refresh records the sequence it saw when it was requested (`after_seq`): any
+run finishing after that satisfies it, whether it was the refresh's own run or
+a scheduled one.
+"""
+import asyncio
+import math
+from typing import Optional, Tuple
+import orjson
+from redis.asyncio import Redis
+from app.core.config import settings
+from app.db.session import run_blocking
+
+# Joins a queued/running run, refuses during the cooldown, or marks a new refresh as queued.
+# Returns {result, state or cooldown ms, current sequence}.
+CLAIM_REFRESH_SCRIPT = """
+local seq = tonumber(redis.call('GET', KEYS[3]) or '0')
+local state = redis.call('GET', KEYS[1])
+if state then
+    return {'joined', state, seq}
+end
+local cooldown = redis.call('PTTL', KEYS[2])
+if cooldown > 0 then
+    return {'cooldown', tostring(cooldown), seq}
+end
+redis.call('SET', KEYS[1], 'queued', 'EX', ARGV[1])
+redis.call('SET', KEYS[2], 1, 'EX', ARGV[2])
+return {'queued', 'queued', seq}
+"""
+
+# Run by the worker before fetching. Skips the run if another one is already
+# fetching, or if this is a refresh that a run finished since has satisfied.
+START_RUN_SCRIPT = """
+local seq = tonumber(redis.call('GET', KEYS[2]) or '0')
+local state = redis.call('GET', KEYS[1])
+if ARGV[1] ~= '' and seq > tonumber(ARGV[1]) then
+    if state == 'queued' then redis.call('DEL', KEYS[1]) end
+    return 0
+end
+if state == 'running' then
+    return 0
+end
+redis.call('SET', KEYS[1], 'running', 'EX', ARGV[2])
+return 1
+"""
+
+
+def inflight_key(task_id: str) -> str:
+    return f"inflight:{task_id}"
+
+
+def run_seq_key(task_id: str) -> str:
+    return f"run_seq:{task_id}"
+
+
+def run_last_key(task_id: str) -> str:
+    return f"run_last:{task_id}"
+
+
+def run_done_channel(task_id: str) -> str:
+    return f"run_done:{task_id}"
+
+
+async def start_run(redis_client: Redis, task_id: str, after_seq: Optional[int] = None) -> bool:
+    started = await redis_client.eval(
+        START_RUN_SCRIPT, 2, inflight_key(task_id), run_seq_key(task_id),
+        "" if after_seq is None else after_seq, settings.REFRESH_INFLIGHT_TTL_SECONDS,
+    )
+    return bool(started)
+
+
+async def finish_run(redis_client: Redis, task_id: str, outcome: str):
+    seq = await redis_client.incr(run_seq_key(task_id))
+    message = orjson.dumps({"seq": seq, "outcome": outcome})
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.set(run_last_key(task_id), message)
+        pipe.delete(inflight_key(task_id))
+        pipe.publish(run_done_channel(task_id), message)
+        await pipe.execute()
+
+
+class RefreshCoordinator:
+    def __init__(self, redis_client: Redis):
+        self.redis_client = redis_client
+
+    async def claim(self, task_id: str) -> Tuple[str, str, int]:
+        """
+        Returns (result, state, after_seq); result is "queued" (the caller must
+        enqueue the run), "joined" or "cooldown" (state is then the remaining ms).
+        """
+        result, state, seq = await self.redis_client.eval(
+            CLAIM_REFRESH_SCRIPT, 3, inflight_key(task_id), f"refresh_cooldown:{task_id}", run_seq_key(task_id),
+            settings.REFRESH_INFLIGHT_TTL_SECONDS, settings.REFRESH_COOLDOWN_SECONDS,
+        )
+        return result, state, int(seq)
+
+    async def request(self, task_id: str, wait: float = 0) -> dict:
+        """
+        Starts (or joins) a refresh and optionally waits up to `wait` seconds for it.
+        Returns the refresh status; state "cooldown" carries `retry_after` seconds.
+        """
+        result, state, after_seq = await self.claim(task_id)
+        if result == "cooldown":
+            return {"task_id": task_id, "state": "cooldown", "after_seq": after_seq, "retry_after": math.ceil(int(state) / 1000)}
+        if result == "queued":
+            try:
+                # send_task blocks on the broker connection, so it runs off the event loop.
+                await run_blocking(self.enqueue, task_id, after_seq)
+            except Exception:
+                await self.redis_client.delete(inflight_key(task_id), f"refresh_cooldown:{task_id}")
+                raise
+        if wait:
+            done = await self.wait(task_id, after_seq, wait)
+            if done:
+                return {"task_id": task_id, "state": "done", "after_seq": after_seq, "run_seq": done["seq"], "outcome": done["outcome"]}
+        return await self.status(task_id, after_seq)
+
+    async def status(self, task_id: str, after_seq: int) -> dict:
+        """
+        Status of a refresh handle: "done" once a run newer than `after_seq` finished,
+        otherwise the in-flight state ("queued", "running") or "idle".
+        """
+        last = await self.last_run(task_id)
+        if last and last["seq"] > after_seq:
+            return {"task_id": task_id, "state": "done", "after_seq": after_seq, "run_seq": last["seq"], "outcome": last["outcome"]}
+        return {"task_id": task_id, "state": await self.state(task_id) or "idle", "after_seq": after_seq}
+
+    @staticmethod
+    def enqueue(task_id: str, after_seq: int):
+        # Imported here so the API doesn't load the worker modules.
+        from app.celery_app import celery_app
+
+        celery_app.send_task("app.worker.tasks.process_task", kwargs={"task_id": task_id, "after_seq": after_seq})
+
+    async def last_run(self, task_id: str) -> Optional[dict]:
+        last = await self.redis_client.get(run_last_key(task_id))
+        return orjson.loads(last) if last else None
+
+    async def state(self, task_id: str) -> Optional[str]:
+        return await self.redis_client.get(inflight_key(task_id))
+
+    async def wait(self, task_id: str, after_seq: int, timeout: float) -> Optional[dict]:
+        """
+        Waits up to `timeout` seconds for a run newer than `after_seq` and returns its {seq, outcome}.
+        """
+        async with self.redis_client.pubsub() as pubsub:
+            await pubsub.subscribe(run_done_channel(task_id))
+            # Checked after subscribing so a run finishing in between isn't missed.
+            last = await self.last_run(task_id)
+            if last and last["seq"] > after_seq:
+                return last
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            while (remaining := deadline - loop.time()) > 0:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+                if message:
+                    done = orjson.loads(message["data"])
+                    if done["seq"] > after_seq:
+                        return done
+        return None
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+import orjson
+from redis.asyncio import Redis
+from redis.exceptions import LockError
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.enums import RunOutcomeEnum
+from app.db.session import run_blocking
+from app.models.task_run import TaskRun
+
+# Workers push one JSON record per run here; flush_task_runs moves them to MySQL in batches.
+PENDING_RUNS_KEY = "task_runs:pending"
+# Held while flushing, so overlapping flushes don't both insert the head of the list.
+# The flush renews it every third of its timeout, so a slow insert keeps it.
+FLUSH_LOCK_KEY = "task_runs:flush_lock"
+FLUSH_LOCK_SECONDS = 300
+TIMING_FIELDS = ("queue_wait_ms", "fetch_ms", "write_ms", "total_ms")
+
+logger = logging.getLogger(__name__)
+
+# Removes a written batch from the head of the list, but only while the flush
+# still holds the lock: once another flush may have read the same head, the
+# records are left in place rather than trimmed from under it.
+#
+# KEYS: pending list, lock. ARGV: batch length, lock token
+TRIM_FLUSHED_SCRIPT = """
+if redis.call('GET', KEYS[2]) ~= ARGV[2] then
+    return 0
+end
+redis.call('LTRIM', KEYS[1], ARGV[1], -1)
+return 1
+"""
+
+
+async def record_run(redis_client: Redis, run: dict):
+    await redis_client.rpush(PENDING_RUNS_KEY, orjson.dumps(run))
+
+
+async def _renew_lock(lock, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        await lock.reacquire()
+
+
+def _insert_runs(db: Session, rows: List[dict]):
+    db.bulk_insert_mappings(TaskRun, rows)
+    db.commit()
+
+
+async def flush_task_runs(db: Session, redis_client: Redis, batch_size: int = settings.TASK_RUN_FLUSH_BATCH) -> int:
+    """
+    Bulk-inserts the pending run records. Returns the number written.
+
+    A batch is only removed from Redis once its insert has been committed, so a
+    failed insert leaves the records for the next flush. Returns 0 without
+    flushing while another flush holds the lock, and stops if this flush lost
+    it (e.g. Redis was unreachable for the whole lock timeout).
+    """
+    lock = redis_client.lock(FLUSH_LOCK_KEY, timeout=FLUSH_LOCK_SECONDS)
+    if not await lock.acquire(blocking=False):
+        return 0
+    renewal = asyncio.create_task(_renew_lock(lock, FLUSH_LOCK_SECONDS / 3))
+    written = 0
+    try:
+        while True:
+            batch = await redis_client.lrange(PENDING_RUNS_KEY, 0, batch_size - 1)
+            if not batch:
+                return written
+            rows = []
+            for raw in batch:
+                run = orjson.loads(raw)
+                run["started_at"] = datetime.fromtimestamp(run["started_at"], timezone.utc).replace(tzinfo=None)
+                rows.append(run)
+            # Off the event loop, so the lock keeps being renewed during the insert.
+            await run_blocking(_insert_runs, db, rows, release=(db,))
+            # Workers only append, so the head is still the batch just written.
+            if not await redis_client.eval(TRIM_FLUSHED_SCRIPT, 2, PENDING_RUNS_KEY, FLUSH_LOCK_KEY, len(batch), lock.local.token):
+                logger.error(f"Lost {FLUSH_LOCK_KEY} while flushing; {len(batch)} written runs are left in {PENDING_RUNS_KEY}.")
+                return written + len(rows)
+            written += len(rows)
+            if len(batch) < batch_size:
+                return written
+    finally:
+        renewal.cancel()
+        try:
+            await lock.release()
+        except LockError:
+            pass
+
+
+def prune_task_runs(db: Session, retention_days: int = settings.TASK_RUN_RETENTION_DAYS, batch_size: int = 10000) -> int:
+    """
+    Deletes runs older than the retention period in batches. Returns the number deleted.
+    """
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=retention_days)
+    deleted = 0
+    while True:
+        ids = [run_id for run_id, in db.query(TaskRun.id).filter(TaskRun.started_at < cutoff).order_by(TaskRun.id).limit(batch_size)]
+        if not ids:
+            return deleted
+        db.query(TaskRun).filter(TaskRun.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        deleted += len(ids)
+
+
+def percentiles(values: List[int], points=(50, 95, 99)) -> Dict[str, Optional[int]]:
+    """
+    Nearest-rank percentiles, e.g. {"p50": .., "p95": .., "p99": ..}.
+    """
+    values = sorted(values)
+    if not values:
+        return {f"p{p}": None for p in points}
+    return {f"p{p}": values[max(0, -(-p * len(values) // 100) - 1)] for p in points}
+
+
+class TaskRunService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    @staticmethod
+    def _since(hours: int) -> datetime:
+        return datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=hours)
+
+    def recent_runs(self, task_id: str, limit: int = 50) -> List[TaskRun]:
+        return self.db.query(TaskRun).filter(TaskRun.task_id == task_id).order_by(TaskRun.started_at.desc()).limit(limit).all()
+
+    def run_stats(self, task_id: str, hours: int = 24) -> dict:
+        """
+        Outcome counts and timing percentiles for one task over the last `hours`.
+        """
+        rows = self.db.query(TaskRun.outcome, *(getattr(TaskRun, field) for field in TIMING_FIELDS)).filter(
+            TaskRun.task_id == task_id, TaskRun.started_at >= self._since(hours)
+        ).all()
+        outcomes = {outcome: 0 for outcome in RunOutcomeEnum}
+        for row in rows:
+            outcomes[row.outcome] += 1
+        timings = {field: percentiles([getattr(row, field) for row in rows if getattr(row, field) is not None]) for field in TIMING_FIELDS}
+        return {"task_id": task_id, "runs": len(rows), "outcomes": outcomes, "timings": timings}
+
+    def report(self, hours: int = 24, limit: int = 20) -> dict:
+        """
+        The slowest monitors by average total duration, and the monitors with
+        the most failed or fallback runs, over the last `hours`.
+        """
+        since = self._since(hours)
+        failures = func.sum(case((TaskRun.outcome.in_((RunOutcomeEnum.failed, RunOutcomeEnum.fallback)), 1), else_=0))
+        grouped = self.db.query(
+            TaskRun.task_id,
+            TaskRun.task_type,
+            func.count().label("runs"),
+            func.avg(TaskRun.total_ms).label("avg_total_ms"),
+            func.max(TaskRun.total_ms).label("max_total_ms"),
+            func.sum(case((TaskRun.outcome == RunOutcomeEnum.failed, 1), else_=0)).label("failed"),
+            func.sum(case((TaskRun.outcome == RunOutcomeEnum.fallback, 1), else_=0)).label("fallback"),
+        ).filter(TaskRun.started_at >= since).group_by(TaskRun.task_id, TaskRun.task_type)
+
+        slowest = grouped.order_by(func.avg(TaskRun.total_ms).desc()).limit(limit).all()
+        failing = grouped.having(failures > 0).order_by(failures.desc()).limit(limit).all()
+        return {"slowest": [row._asdict() for row in slowest], "failing": [row._asdict() for row in failing]}
@@ -0,0 +1,164 @@
+import time
+import uuid
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from redis.asyncio import Redis
+from sqlalchemy import func
+from sqlalchemy.orm import Query, Session
+from app.db.enums import TaskStatusEnum, TaskTypeEnum
+from app.db.session import run_blocking
+from app.models.task import Task
+
+# A count seeded from MySQL is only stored if no task write overlapped the
+# seed: every write registers itself in the writes set before touching MySQL
+# and, when it adjusts the counts afterwards, leaves it; both steps drop the
+# seed's marker. Otherwise a write counted by the seed's query but adjusted
+# after the seed (or the reverse) would leave the counts off until they expire.
+#
+# KEYS: writes set, seeding marker. ARGV: now, write id
+WRITE_STARTED_SCRIPT = """
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+redis.call('DEL', KEYS[2])
+"""
+
+# Only adjusts counters that have already been seeded, so a missing hash is
+# rebuilt from MySQL on the next summary instead of holding partial counts.
+#
+# KEYS: counts hash, writes set, seeding marker. ARGV: write id, then field/delta pairs
+ADJUST_COUNTS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    for i = 2, #ARGV, 2 do
+        redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+    end
+end
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('DEL', KEYS[3])
+"""
+
+# Stores the seeded counts if the marker set before the query is still there
+# and no write is in flight. Writes older than the stale cutoff are presumed
+# dead (their process exited before adjusting) and dropped.
+#
+# KEYS: counts hash, writes set, seeding marker. ARGV: token, stale cutoff, then field/count pairs
+SEED_COUNTS_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[2])
+if redis.call('GET', KEYS[3]) ~= ARGV[1] or redis.call('ZCARD', KEYS[2]) > 0 then
+    return 0
+end
+redis.call('DEL', KEYS[1], KEYS[3])
+redis.call('HSET', KEYS[1], unpack(ARGV, 3))
+return 1
+"""
+SEEDED_FIELD = "_seeded"
+SEED_MARKER_SECONDS = 60
+WRITE_STALE_SECONDS = 60
+
+
+def filter_tasks(
+    query: Query,
+    status: Optional[TaskStatusEnum] = None,
+    interval_seconds: Optional[int] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    updated_after: Optional[datetime] = None,
+    updated_before: Optional[datetime] = None,
+) -> Query:
+    if status:
+        query = query.filter(Task.status == status)
+    if interval_seconds:
+        query = query.filter(Task.interval_seconds == interval_seconds)
+    if created_after:
+        query = query.filter(Task.created_at >= created_after)
+    if created_before:
+        query = query.filter(Task.created_at < created_before)
+    if updated_after:
+        query = query.filter(Task.updated_at >= updated_after)
+    if updated_before:
+        query = query.filter(Task.updated_at < updated_before)
+    return query
+
+
+def paginate_tasks(query: Query, key_column, limit: int, cursor: Optional[str] = None, prefix: Optional[str] = None) -> Tuple[List[Task], Optional[str]]:
+    """
+    Keyset pagination over a unique task column (username or post_code).
+    Returns the page and the cursor for the next one, or None on the last page.
+    """
+    if prefix:
+        query = query.filter(key_column.startswith(prefix, autoescape=True))
+    if cursor:
+        query = query.filter(key_column > cursor)
+    tasks = query.order_by(key_column).limit(limit + 1).all()
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        return tasks, getattr(tasks[-1], key_column.key)
+    return tasks, None
+
+
+class TaskCounter:
+    """
+    Task counts per status and interval, kept in the `task_counts:{task_type}`
+    hash and adjusted on every create/status change instead of counted.
+    Writes go through writing(), so a seed they overlap isn't stored.
+    """
+
+    def __init__(self, redis_client: Redis, task_type: TaskTypeEnum):
+        self.redis_client = redis_client
+        self.task_type = task_type
+        self.key = f"task_counts:{task_type.value}"
+        self.writes_key = f"task_counts_writes:{task_type.value}"
+        self.seeding_key = f"task_counts_seeding:{task_type.value}"
+
+    @staticmethod
+    def field(status: TaskStatusEnum, interval_seconds: int) -> str:
+        return f"{TaskStatusEnum(status).value}:{interval_seconds}"
+
+    @asynccontextmanager
+    async def writing(self):
+        """
+        Wraps a task write. Yields a {(status, interval_seconds): delta} dict for
+        the changes the write made, applied when the block exits.
+        """
+        write_id = uuid.uuid4().hex
+        await self.redis_client.eval(WRITE_STARTED_SCRIPT, 2, self.writes_key, self.seeding_key, time.time(), write_id)
+        changes = defaultdict(int)
+        try:
+            yield changes
+        finally:
+            args = [write_id]
+            for (status, interval_seconds), delta in changes.items():
+                if delta:
+                    args += [self.field(status, interval_seconds), delta]
+            await self.redis_client.eval(ADJUST_COUNTS_SCRIPT, 3, self.key, self.writes_key, self.seeding_key, *args)
+
+    async def seed(self, db: Session) -> Dict[str, int]:
+        """
+        Counts the tasks in MySQL and stores the counts, unless a write overlapped
+        the count; then they are only returned, and the next summary counts again.
+        """
+        token = uuid.uuid4().hex
+        await self.redis_client.set(self.seeding_key, token, ex=SEED_MARKER_SECONDS)
+        query = db.query(Task.status, Task.interval_seconds, func.count()).filter(Task.task_type == self.task_type).group_by(Task.status, Task.interval_seconds)
+        rows = await run_blocking(query.all, release=(db,))
+        counts = {self.field(status, interval_seconds): count for status, interval_seconds, count in rows}
+        args = [token, time.time() - WRITE_STALE_SECONDS, SEEDED_FIELD, 1]
+        for field, count in counts.items():
+            args += [field, count]
+        await self.redis_client.eval(SEED_COUNTS_SCRIPT, 3, self.key, self.writes_key, self.seeding_key, *args)
+        return counts
+
+    async def summary(self, db: Session) -> dict:
+        counts = await self.redis_client.hgetall(self.key)
+        if SEEDED_FIELD in counts:
+            counts.pop(SEEDED_FIELD)
+        else:
+            counts = await self.seed(db)
+
+        by_status = {status: 0 for status in TaskStatusEnum}
+        by_interval = {}
+        for field, count in counts.items():
+            status, interval_seconds = field.split(":")
+            by_status[TaskStatusEnum(status)] += int(count)
+            by_interval[int(interval_seconds)] = by_interval.get(int(interval_seconds), 0) + int(count)
+        return {"total": sum(by_status.values()), "by_status": by_status, "by_interval": dict(sorted(by_interval.items()))}
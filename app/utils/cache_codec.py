@@ -0,0 +1,159 @@
+import logging
+import struct
+import sys
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, Optional, Sequence
+
+import msgpack
+
+from app.utils.history import dump_history_response
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+logger = logging.getLogger(__name__)
+
+# Every cached value starts with MAGIC + version. 0xC1 is never emitted by JSON or
+# msgpack, so entries written before versioning are never mistaken for new ones.
+MAGIC = 0xC1
+CODEC_VERSION = 1
+HEADER = struct.Struct("!BBBB")
+
+FORMAT_JSON = 1
+FORMAT_COLUMNAR = 2
+FORMATS = {"json": FORMAT_JSON, "columnar": FORMAT_COLUMNAR}
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZSTD = 1
+COMPRESSION_LZ4 = 2
+COMPRESSIONS = {"none": COMPRESSION_NONE, "zstd": COMPRESSION_ZSTD, "lz4": COMPRESSION_LZ4}
+
+INT_NULL = -(2 ** 63)
+EPOCH = datetime(1970, 1, 1)
+
+
+def _compress(method: int, payload: bytes) -> tuple[int, bytes]:
+    if method == COMPRESSION_ZSTD and zstandard:
+        return method, zstandard.ZstdCompressor(level=3).compress(payload)
+    if method == COMPRESSION_LZ4 and lz4_frame:
+        return method, lz4_frame.compress(payload)
+    if method != COMPRESSION_NONE:
+        name = next(k for k, v in COMPRESSIONS.items() if v == method)
+        logger.warning(f"{name} is not installed, caching history uncompressed.")
+    return COMPRESSION_NONE, payload
+
+
+def _decompress(method: int, payload: bytes) -> Optional[bytes]:
+    if method == COMPRESSION_NONE:
+        return payload
+    if method == COMPRESSION_ZSTD and zstandard:
+        return zstandard.ZstdDecompressor().decompress(payload)
+    if method == COMPRESSION_LZ4 and lz4_frame:
+        return lz4_frame.decompress(payload)
+    return None
+
+
+def _pack_array(typecode: str, values) -> bytes:
+    packed = array(typecode, values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack_array(typecode: str, data: bytes) -> array:
+    packed = array(typecode)
+    packed.frombytes(data)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed
+
+
+def _encode_column(python_type: type, values: list) -> list:
+    if python_type is datetime:
+        return ["t", _pack_array("q", (
+            INT_NULL if v is None else (v - EPOCH) // timedelta(microseconds=1) for v in values
+        ))]
+    if python_type is int:
+        return ["i", _pack_array("q", (INT_NULL if v is None else v for v in values))]
+    if python_type is float:
+        return ["f", _pack_array("d", (float("nan") if v is None else v for v in values))]
+    # Text columns (e.g. bio) rarely change, so each distinct value is stored once.
+    distinct = {}
+    indexes = [distinct.setdefault(v, len(distinct)) for v in values]
+    return ["s", list(distinct), _pack_array("I", indexes)]
+
+
+def _decode_column(column: list) -> list:
+    kind = column[0]
+    if kind == "t":
+        return [None if v == INT_NULL else EPOCH + timedelta(microseconds=v) for v in _unpack_array("q", column[1])]
+    if kind == "i":
+        return [None if v == INT_NULL else v for v in _unpack_array("q", column[1])]
+    if kind == "f":
+        return [None if v != v else v for v in _unpack_array("d", column[1])]
+    values = column[1]
+    return [values[i] for i in _unpack_array("I", column[2])]
+
+
+class HistoryCodec:
+    """
+    Encodes history rows for the Redis cache, either as the ready-to-send JSON
+    response body or as a compact columnar msgpack document.
+    """
+
+    def __init__(self, key_name: str, columns: Sequence[Any], fmt: str = "json", compression: str = "none", compress_min_bytes: int = 0):
+        self.key_name = key_name
+        self.fields = tuple(column.key for column in columns)
+        self.types = tuple(column.type.python_type for column in columns)
+        self.format = FORMATS[fmt]
+        self.compression = COMPRESSIONS[compression]
+        self.compress_min_bytes = compress_min_bytes
+
+    def encode(self, rows: Sequence[Sequence[Any]], body: bytes) -> bytes:
+        if self.format == FORMAT_COLUMNAR:
+            columns = list(zip(*rows)) if rows else [()] * len(self.fields)
+            payload = msgpack.packb({
+                "n": len(rows),
+                "fields": self.fields,
+                "columns": [_encode_column(t, list(c)) for t, c in zip(self.types, columns)],
+            }, use_bin_type=True)
+        else:
+            payload = body
+
+        compression = COMPRESSION_NONE
+        if len(payload) >= self.compress_min_bytes:
+            compression, payload = _compress(self.compression, payload)
+        return HEADER.pack(MAGIC, CODEC_VERSION, self.format, compression) + payload
+
+    def decode(self, key: str, value: bytes) -> Optional[bytes]:
+        """
+        Returns the response body for a cached value, or None if the value was
+        written by another codec version and should be treated as a miss.
+        """
+        if len(value) < HEADER.size:
+            return None
+        magic, version, fmt, compression = HEADER.unpack_from(value)
+        if magic != MAGIC or version != CODEC_VERSION:
+            return None
+
+        payload = _decompress(compression, value[HEADER.size:])
+        if payload is None:
+            return None
+        if fmt == FORMAT_JSON:
+            return payload
+        if fmt != FORMAT_COLUMNAR:
+            return None
+
+        document = msgpack.unpackb(payload, raw=False)
+        if tuple(document["fields"]) != self.fields:
+            return None
+        columns = [_decode_column(c) for c in document["columns"]]
+        return dump_history_response(self.key_name, key, self.fields, zip(*columns))
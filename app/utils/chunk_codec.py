@@ -0,0 +1,159 @@
+import struct
+import sys
+import zlib
+from array import array
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import Any, List, Optional, Sequence, Tuple
+
+import msgpack
+
+# Every chunk payload starts with MAGIC + version, so the format can evolve
+# without rewriting sealed chunks.
+MAGIC = 0xC7
+CHUNK_VERSION = 1
+HEADER = struct.Struct("!BBI")
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+# Narrowest array typecode that holds every delta in a column.
+WIDTHS = (("b", 2 ** 7), ("h", 2 ** 15), ("i", 2 ** 31), ("q", 2 ** 63))
+
+
+def _pack_array(values: Sequence[int]) -> Tuple[str, bytes]:
+    bound = max((max(values), -min(values) - 1)) if values else 0
+    typecode = next(code for code, limit in WIDTHS if bound < limit)
+    packed = array(typecode, values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return typecode, packed.tobytes()
+
+
+def _pack_array_float(values: Sequence[float]) -> bytes:
+    packed = array("d", (float(v) for v in values))
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack_array(typecode: str, data: bytes) -> array:
+    packed = array(typecode)
+    packed.frombytes(data)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed
+
+
+def _deltas(values: Sequence[int]) -> List[int]:
+    return [b - a for a, b in zip(values, values[1:])]
+
+
+def _fill_nulls(values: Sequence[Any]) -> Tuple[list, List[int]]:
+    """
+    Replaces each None with the previous value (so it costs a zero delta) and
+    returns the positions that were None.
+    """
+    nulls, filled, previous = [], [], 0
+    for i, value in enumerate(values):
+        if value is None:
+            nulls.append(i)
+            value = previous
+        filled.append(value)
+        previous = value
+    return filled, nulls
+
+
+def _restore_nulls(values: list, nulls: Sequence[int]) -> list:
+    for i in nulls:
+        values[i] = None
+    return values
+
+
+def _encode_ints(values: Sequence[int], order: int) -> list:
+    """
+    Stores the first `order` values of the delta chain, then the order-th deltas
+    at the narrowest width that fits. Order 2 (delta of delta) suits regularly
+    spaced timestamps, order 1 slowly moving counters.
+    """
+    heads = []
+    for _ in range(order):
+        if not values:
+            break
+        heads.append(values[0])
+        values = _deltas(values)
+    typecode, packed = _pack_array(values)
+    return [heads, typecode, packed]
+
+
+def _decode_ints(heads: Sequence[int], typecode: str, packed: bytes) -> list:
+    values = _unpack_array(typecode, packed)
+    for head in reversed(heads):
+        values = accumulate(values, initial=head)
+    return list(values)
+
+
+def _encode_column(python_type: type, values: list) -> list:
+    filled, nulls = _fill_nulls(values)
+    if python_type is datetime:
+        micros = [(v - EPOCH) // MICROSECOND if v else 0 for v in filled]
+        # Samples written by MySQL's NOW() are whole seconds; keep the deltas small.
+        unit = 1_000_000 if all(v % 1_000_000 == 0 for v in micros) else 1
+        return ["t", nulls, unit, *_encode_ints([v // unit for v in micros], order=2)]
+    if python_type is int:
+        return ["i", nulls, *_encode_ints(filled, order=1)]
+    if python_type is float:
+        return ["f", nulls, _pack_array_float(filled)]
+    # Text columns (e.g. bio) rarely change, so only the runs are stored.
+    distinct, starts, indexes = {}, [], []
+    for i, value in enumerate(values):
+        index = distinct.setdefault(value, len(distinct))
+        if not indexes or indexes[-1] != index:
+            starts.append(i)
+            indexes.append(index)
+    return ["s", list(distinct), _pack_array(starts), _pack_array(indexes)]
+
+
+def _decode_column(column: list, count: int) -> list:
+    kind = column[0]
+    if kind == "t":
+        _, nulls, unit, heads, typecode, packed = column
+        step = MICROSECOND * unit
+        return _restore_nulls([EPOCH + v * step for v in _decode_ints(heads, typecode, packed)], nulls)
+    if kind == "i":
+        _, nulls, heads, typecode, packed = column
+        return _restore_nulls(_decode_ints(heads, typecode, packed), nulls)
+    if kind == "f":
+        _, nulls, packed = column
+        return _restore_nulls(list(_unpack_array("d", packed)), nulls)
+    _, distinct, (starts_code, starts), (indexes_code, indexes) = column
+    starts = list(_unpack_array(starts_code, starts)) + [count]
+    values = []
+    for start, end, index in zip(starts, starts[1:], _unpack_array(indexes_code, indexes)):
+        values.extend([distinct[index]] * (end - start))
+    return values
+
+
+def encode_chunk(types: Sequence[type], rows: Sequence[Sequence[Any]]) -> bytes:
+    """
+    Packs history rows (plain column tuples, oldest first) column by column:
+    timestamps as deltas of deltas, counters as deltas, text as runs. The
+    result is zlib-compressed, which is always available wherever a sealed
+    chunk has to be read back.
+    """
+    columns = list(zip(*rows)) if rows else [()] * len(types)
+    payload = msgpack.packb([_encode_column(t, list(c)) for t, c in zip(types, columns)], use_bin_type=True)
+    return HEADER.pack(MAGIC, CHUNK_VERSION, len(rows)) + zlib.compress(payload, 6)
+
+
+def decode_chunk(payload: bytes, width: Optional[int] = None) -> List[tuple]:
+    """
+    Returns the rows packed by encode_chunk, oldest first. With `width`,
+    columns appended since the chunk was sealed are filled with None.
+    """
+    magic, version, count = HEADER.unpack_from(payload)
+    if magic != MAGIC or version != CHUNK_VERSION:
+        raise ValueError(f"Unsupported chunk format {magic:#x}/{version}")
+    columns = [_decode_column(c, count) for c in msgpack.unpackb(zlib.decompress(payload[HEADER.size:]), raw=False)]
+    if width:
+        columns.extend([[None] * count] * (width - len(columns)))
+    return list(zip(*columns))
@@ -0,0 +1,16 @@
+from typing import Any, Iterable, Sequence
+import orjson
+
+
+def dump_history_response(key_name: str, key: str, fields: Sequence[str], rows: Iterable[Sequence[Any]]) -> bytes:
+    """
+    Serializes history rows (plain column tuples) straight into the response envelope.
+    """
+    return orjson.dumps({
+        "status_code": 200,
+        "success": True,
+        "data": {
+            key_name: key,
+            "history": [dict(zip(fields, row)) for row in rows],
+        },
+    })
@@ -0,0 +1,46 @@
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Mapping, Optional
+
+
+def history_cache_headers(meta: Optional[dict]) -> dict:
+    """
+    Builds ETag, Last-Modified and Cache-Control headers from history metadata.
+    The response stays fresh until the monitor's next sample is due.
+    """
+    if not meta:
+        return {}
+    last = meta["last"]
+    max_age = min(meta["interval"], max(0, int(last + meta["interval"] - time.time())))
+    return {
+        "ETag": f'W/"{meta["count"]}-{int(last * 1000)}"',
+        "Last-Modified": formatdate(last, usegmt=True),
+        "Cache-Control": f"max-age={max_age}",
+    }
+
+
+def is_not_modified(request_headers: Mapping[str, str], response_headers: Mapping[str, str]) -> bool:
+    """
+    Evaluates If-None-Match / If-Modified-Since against the response validators.
+    If-None-Match takes precedence, as required by RFC 9110.
+    """
+    etag = response_headers.get("ETag")
+    if not etag:
+        return False
+
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag.removeprefix("W/") in candidates
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+            last_modified = parsedate_to_datetime(response_headers["Last-Modified"])
+        except (TypeError, ValueError):
+            return False
+        return last_modified <= since
+    return False
@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+# Invalidation counters are striped over this many slots, so they take fixed
+# memory however many keys are invalidated; keys sharing a slot only cost an
+# occasional skipped fill.
+GENERATION_SLOTS = 4096
+
+
+class ByteLRUCache:
+    """
+    In-process LRU bounded by the total size of its values in bytes.
+    Entries also expire after their ttl, as a backstop for missed invalidations.
+
+    A value read from elsewhere can be stored with the key's `generation()`
+    taken before the read: if the key was deleted (invalidated) in between,
+    the value is stale and set() drops it.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, tuple[Any, int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._generations = [0] * GENERATION_SLOTS
+        self._epoch = 0
+
+    def _slot(self, key: str) -> int:
+        return hash(key) % GENERATION_SLOTS
+
+    def generation(self, key: str) -> Tuple[int, int]:
+        with self._lock:
+            return self._epoch, self._generations[self._slot(key)]
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: str, value: Any, size: int, ttl: float, generation: Optional[Tuple[int, int]] = None):
+        with self._lock:
+            if generation is not None and generation != (self._epoch, self._generations[self._slot(key)]):
+                return
+            if key in self._entries:
+                self._remove(key)
+            # Too big to keep; dropping the old value above keeps it from being served stale.
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size, time.monotonic() + ttl)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._generations[self._slot(key)] += 1
+                if key in self._entries:
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self.size -= size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None,
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
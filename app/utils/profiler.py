@@ -0,0 +1,230 @@
+"""
+Opt-in stack-sampling profiler.
+
+A background thread snapshots the stacks of the profiled threads every
+PROFILE_INTERVAL_MS via `sys._current_frames()` and, when stopped, writes a
+speedscope file (https://www.speedscope.app) to PROFILE_DIR with one sampled
+profile per thread. Only the profiled unit of work is sampled: a Celery run's
+thread, or a request's own asyncio task plus the threadpool work it runs
+inside `profile_thread()`. Nothing is installed unless PROFILE_ENABLED is set.
+"""
+import asyncio
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+import orjson
+from app.core.config import settings
+from app.core.security import ADMIN_TOKEN_HEADER, is_admin_token
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+ADMIN_HEADER = ADMIN_TOKEN_HEADER.lower().encode()
+SUFFIX = ".speedscope.json"
+
+# Leaf frames of threads that are just waiting; their samples are dropped.
+IDLE_LEAVES = {("wait", "threading.py"), ("_worker", "thread.py"), ("select", "selectors.py")}
+
+
+class SamplingProfiler:
+    """
+    Samples the threads in `thread_ids` and, given an asyncio `task`, the
+    thread it was created on while that task is the one running there.
+    """
+
+    def __init__(self, kind: str, label: str, thread_ids: Iterable[int] = (), interval_ms: float = None, task=None):
+        self.kind = kind
+        self.label = label
+        self.thread_ids = set(thread_ids)
+        self.task = task
+        self._task_thread = threading.get_ident() if task else None
+        self.interval = (interval_ms or settings.PROFILE_INTERVAL_MS) / 1000
+        self._frames: Dict[Tuple[str, str, int], int] = {}
+        self._samples: Dict[int, List[Tuple[Tuple[int, ...], float]]] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self) -> "SamplingProfiler":
+        self._started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def _frame_index(self, code) -> int:
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        index = self._frames.get(key)
+        if index is None:
+            index = self._frames[key] = len(self._frames)
+        return index
+
+    def add_thread(self, thread_id: int):
+        self.thread_ids.add(thread_id)
+
+    def remove_thread(self, thread_id: int):
+        self.thread_ids.discard(thread_id)
+
+    def _task_running(self, frame) -> bool:
+        # A task is running when its coroutine's frame is on its thread's stack.
+        root = self.task.get_coro().cr_frame
+        while frame is not None:
+            if frame is root:
+                return True
+            frame = frame.f_back
+        return False
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            frames = sys._current_frames()
+            for thread_id in list(self.thread_ids):
+                self._sample(thread_id, frames.get(thread_id), now - last)
+            task_frame = frames.get(self._task_thread) if self.task else None
+            if task_frame is not None and self._task_running(task_frame):
+                self._sample(self._task_thread, task_frame, now - last)
+            last = now
+
+    def _sample(self, thread_id: int, frame, elapsed: float):
+        if frame is None:
+            return
+        code = frame.f_code
+        if (code.co_name, os.path.basename(code.co_filename)) in IDLE_LEAVES:
+            return
+        stack = []
+        while frame is not None:
+            stack.append(self._frame_index(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        self._samples.setdefault(thread_id, []).append((tuple(stack), elapsed * 1000))
+
+    def stop(self) -> Optional[str]:
+        """
+        Stops sampling and writes the capture. Returns its path, or None if nothing was sampled.
+        """
+        self._stop.set()
+        self._thread.join()
+        duration_ms = (time.perf_counter() - self._started) * 1000
+        if not self._samples:
+            return None
+
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        profiles = []
+        for thread_id, samples in self._samples.items():
+            profiles.append({
+                "type": "sampled",
+                "name": f"{self.label} [{names.get(thread_id, thread_id)}]",
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": duration_ms,
+                "samples": [list(stack) for stack, _ in samples],
+                "weights": [weight for _, weight in samples],
+            })
+        frames = [{"name": name, "file": file, "line": line} for name, file, line in self._frames]
+        document = {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.label,
+            "exporter": "instagram-monitor",
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", self.label).strip("_")[:80]
+        path = os.path.join(settings.PROFILE_DIR, f"{stamp}-{self.kind}-{slug}{SUFFIX}")
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(document))
+        logger.info(f"Wrote profile {path} ({duration_ms:.0f} ms, {sum(map(len, self._samples.values()))} samples)")
+        prune_profiles()
+        return path
+
+
+def list_profiles(limit: int = 50) -> List[dict]:
+    """
+    Most recent captures first.
+    """
+    if not os.path.isdir(settings.PROFILE_DIR):
+        return []
+    names = sorted((name for name in os.listdir(settings.PROFILE_DIR) if name.endswith(SUFFIX)), reverse=True)[:limit]
+    profiles = []
+    for name in names:
+        stat = os.stat(os.path.join(settings.PROFILE_DIR, name))
+        stamp, kind, label = name[:-len(SUFFIX)].split("-", 2)
+        profiles.append({
+            "name": name,
+            "kind": kind,
+            "label": label,
+            "created_at": datetime.strptime(stamp, "%Y%m%dT%H%M%S%f").replace(tzinfo=timezone.utc),
+            "size_bytes": stat.st_size,
+        })
+    return profiles
+
+
+def prune_profiles():
+    names = sorted(name for name in os.listdir(settings.PROFILE_DIR) if name.endswith(SUFFIX))
+    for name in names[:-settings.PROFILE_KEEP]:
+        os.remove(os.path.join(settings.PROFILE_DIR, name))
+
+
+def should_profile_task(task_id: Optional[str]) -> bool:
+    return task_id in settings.PROFILE_TASK_IDS or random.random() < settings.PROFILE_SAMPLE_RATE
+
+
+_request_profiler: ContextVar[Optional[SamplingProfiler]] = ContextVar("request_profiler", default=None)
+
+
+@contextmanager
+def profile_thread():
+    """
+    Includes the calling thread in the current request's profile for the
+    duration of the block. Threadpool work inherits the request's context, so
+    this is how it gets sampled.
+    """
+    profiler = _request_profiler.get()
+    if profiler is None:
+        yield
+        return
+    thread_id = threading.get_ident()
+    profiler.add_thread(thread_id)
+    try:
+        yield
+    finally:
+        profiler.remove_thread(thread_id)
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling a PROFILE_SAMPLE_RATE fraction of requests, plus
+    requests that send `X-Profile: 1` with a valid `X-Admin-Token`. Only the
+    request's own task (and threadpool work in `profile_thread()`) is sampled,
+    never the other requests served meanwhile.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+        profiler = SamplingProfiler("request", f"{scope['method']} {scope['path']}", task=asyncio.current_task()).start()
+        token = _request_profiler.set(profiler)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_profiler.reset(token)
+            profiler.stop()
+
+    @staticmethod
+    def _wanted(scope) -> bool:
+        headers = dict(scope["headers"])
+        if PROFILE_HEADER in headers:
+            return headers[PROFILE_HEADER] == b"1" and is_admin_token(headers.get(ADMIN_HEADER, b"").decode("latin-1"))
+        return random.random() < settings.PROFILE_SAMPLE_RATE
@@ -0,0 +1,43 @@
+import bisect
+import hashlib
+import zlib
+from typing import Iterable, List, Optional
+
+# Number of scheduler shards. Task.shard is stored when a task is inserted, so
+# this is a constant rather than a setting: after changing it, re-shard the
+# stored tasks (python -m scripts.reshard_tasks) before restarting the
+# dispatchers, which refuse to start while stored shards don't match.
+SHARD_COUNT = 64
+
+
+def shard_for(task_id: str, shard_count: int = SHARD_COUNT) -> int:
+    """
+    Stable shard of a task. Matches MySQL's `CRC32(id) % shard_count`, which the
+    migration uses to backfill existing tasks.
+    """
+    return zlib.crc32(task_id.encode()) % shard_count
+
+
+def _ring_hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring mapping shards to nodes. When a node joins or leaves,
+    only the shards next to its virtual points change owner.
+    """
+
+    def __init__(self, nodes: Iterable[str], replicas: int = 100):
+        points = sorted((_ring_hash(f"{node}#{i}"), node) for node in set(nodes) for i in range(replicas))
+        self._hashes = [h for h, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def owner(self, shard: int) -> Optional[str]:
+        if not self._nodes:
+            return None
+        index = bisect.bisect(self._hashes, _ring_hash(f"shard-{shard}")) % len(self._hashes)
+        return self._nodes[index]
+
+    def shards_for(self, node: str, shard_count: int) -> List[int]:
+        return [shard for shard in range(shard_count) if self.owner(shard) == node]
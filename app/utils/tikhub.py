@@ -1,6 +1,16 @@
+import re
+import time
+from typing import Callable
 import httpx
+import orjson
 from app.core.config import settings
 import logging
+from app.db.enums import TaskTypeEnum
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 logger = logging.getLogger(__name__)
 
@@ -11,17 +21,35 @@ headers = {
     "Authorization": f"Bearer {TOKEN}"
 }
 
-async def fetch_from_tikhub(endpoint: str, params: dict) -> dict | None:
+# Benchmarks and tests can route requests through e.g. an httpx.MockTransport.
+transport: httpx.AsyncBaseTransport | None = None
+
+# Where a task type's metrics sit in the response (most specific first) and the
+# fields create_metrics_history reads from them.
+METRIC_FIELDS = {
+    TaskTypeEnum.influencer: (("data",), ("id", "biography", "follower_count", "following_count", "media_count")),
+    TaskTypeEnum.post: (("data.data.metrics", "data"), ("id", "like_count", "comment_count", "play_count")),
+}
+SCALAR_EVENTS = frozenset(("string", "number", "boolean", "null"))
+
+async def fetch_from_tikhub(endpoint: str, params: dict, timings: dict | None = None) -> dict | None:
+    """
+    GETs a TikHub endpoint and returns the decoded JSON, or None on failure.
+    If `timings` is given it receives the HTTP `status` and the request `elapsed_ms`.
+    """
     if not TOKEN:
         logger.warning("Tikhub API token is not set. Please update it in your .env file.")
         return None
 
     url = f"{BASE_URL}{endpoint}"
     logger.info(f"Making request to Tikhub API: URL={url}, Params={params}")
+    timings = timings if timings is not None else {}
+    started = time.perf_counter()
     
-    async with httpx.AsyncClient() as client:
+    async with httpx.AsyncClient(transport=transport) as client:
         try:
             response = await client.get(url, params=params, headers=headers, timeout=60.0)
+            timings["status"] = response.status_code
             response.raise_for_status()
             return response.json()
         except httpx.HTTPStatusError as e:
@@ -29,4 +57,190 @@ async def fetch_from_tikhub(endpoint: str, params: dict) -> dict | None:
             return None
         except Exception as e:
             logger.error("An unexpected error occurred while fetching from Tikhub.", exc_info=True)
-            return None 
\ No newline at end of file
+            return None
+        finally:
+            timings["elapsed_ms"] = int((time.perf_counter() - started) * 1000)
+
+class MetricsParser:
+    """
+    Parses a metrics response fed chunk by chunk and keeps only its
+    METRIC_FIELDS, so the rest of the document (captions, media, related
+    profiles) is never built. Without ijson the body is buffered and decoded
+    whole at close().
+    """
+
+    def __init__(self, task_type: TaskTypeEnum):
+        self.task_type = task_type
+        self.prefixes, self.fields = METRIC_FIELDS[task_type]
+        self.wanted = {f"{prefix}.{field}": (prefix, field) for prefix in self.prefixes for field in self.fields}
+        self.found = {prefix: {} for prefix in self.prefixes}
+        if ijson:
+            self._events = ijson.sendable_list()
+            self._parser = ijson.parse_coro(self._events, use_float=True)
+        else:
+            self._body = bytearray()
+
+    def feed(self, chunk: bytes):
+        if not ijson:
+            self._body += chunk
+            return
+        self._parser.send(chunk)
+        for prefix, event, value in self._events:
+            if event in SCALAR_EVENTS and prefix in self.wanted:
+                path, field = self.wanted[prefix]
+                self.found[path][field] = value
+        del self._events[:]
+
+    def close(self) -> dict | None:
+        """
+        The selected metrics, or None if the response had none. Raises on malformed JSON.
+        """
+        if not ijson:
+            metrics = extract_metrics(self.task_type, orjson.loads(self._body))
+            if not isinstance(metrics, dict):
+                return None
+            return {field: metrics[field] for field in self.fields if field in metrics} or None
+        self._parser.close()
+        return next((found for found in map(self.found.get, self.prefixes) if found), None)
+
+
+class PostCodesParser:
+    """
+    Parses a user posts response fed chunk by chunk and keeps only the code
+    (or shortcode) of each listed item, as extract_recent_post_codes reads
+    them. It is `complete` once it has `limit` codes, so the rest of the
+    listing need not be read. Without ijson the body is buffered and decoded
+    whole at close().
+    """
+    ITEM_PREFIX = re.compile(r"data(\.data)*(\.items)?\.item")
+    CODE_FIELDS = ("code", "shortcode")
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.codes: list[str] = []
+        self.complete = limit <= 0
+        self._item: dict | None = None
+        self._item_prefix: str | None = None
+        if ijson:
+            self._events = ijson.sendable_list()
+            self._parser = ijson.parse_coro(self._events)
+        else:
+            self._body = bytearray()
+
+    def feed(self, chunk: bytes):
+        if not ijson:
+            self._body += chunk
+            return
+        self._parser.send(chunk)
+        for prefix, event, value in self._events:
+            if self.complete:
+                break
+            if event == "start_map" and self._item is None and self.ITEM_PREFIX.fullmatch(prefix) and self._item_prefix in (None, prefix):
+                self._item, self._item_prefix = {}, prefix
+            elif self._item is None:
+                continue
+            elif event == "end_map" and prefix == self._item_prefix:
+                code = self._item.get("code") or self._item.get("shortcode")
+                if code:
+                    self.codes.append(code)
+                    self.complete = len(self.codes) >= self.limit
+                self._item = None
+            elif event == "string" and prefix.startswith(self._item_prefix) and prefix[len(self._item_prefix) + 1:] in self.CODE_FIELDS:
+                self._item[prefix[len(self._item_prefix) + 1:]] = value
+        del self._events[:]
+
+    def close(self) -> list[str]:
+        """
+        The codes, newest first. Raises on malformed JSON unless the parser completed early.
+        """
+        if not ijson:
+            return extract_recent_post_codes(orjson.loads(self._body), self.limit)
+        if not self.complete:
+            self._parser.close()
+        return self.codes[:self.limit]
+
+
+async def _stream_from_tikhub(endpoint: str, params: dict, parser, timings: dict | None = None, sink: Callable[[bytes], None] | None = None):
+    """
+    GETs a TikHub endpoint, feeds the body to `parser` chunk by chunk and
+    returns parser.close(), or None on failure. Each raw chunk is also passed
+    to `sink`. Reading stops early once the parser is `complete`. `timings`
+    receives the HTTP `status`, the request `elapsed_ms` and, once the body
+    has been parsed, the `bytes` read. Bodies over TIKHUB_MAX_RESPONSE_BYTES
+    are abandoned.
+    """
+    if not TOKEN:
+        logger.warning("Tikhub API token is not set. Please update it in your .env file.")
+        return None
+
+    url = f"{BASE_URL}{endpoint}"
+    logger.info(f"Making request to Tikhub API: URL={url}, Params={params}")
+    timings = timings if timings is not None else {}
+    started = time.perf_counter()
+    received = 0
+
+    async with httpx.AsyncClient(transport=transport) as client:
+        try:
+            async with client.stream("GET", url, params=params, headers=headers, timeout=60.0) as response:
+                timings["status"] = response.status_code
+                if response.is_error:
+                    await response.aread()
+                    logger.error(f"HTTP error occurred while fetching from Tikhub: {response.status_code} - {response.text[:1000]}")
+                    return None
+                async for chunk in response.aiter_bytes():
+                    received += len(chunk)
+                    if received > settings.TIKHUB_MAX_RESPONSE_BYTES:
+                        logger.error(f"Tikhub response from {endpoint} exceeds {settings.TIKHUB_MAX_RESPONSE_BYTES} bytes; abandoned.")
+                        return None
+                    parser.feed(chunk)
+                    if sink:
+                        sink(chunk)
+                    if getattr(parser, "complete", False):
+                        break
+            result = parser.close()
+            timings["bytes"] = received
+            return result
+        except Exception as e:
+            logger.error("An unexpected error occurred while fetching from Tikhub.", exc_info=True)
+            return None
+        finally:
+            timings["elapsed_ms"] = int((time.perf_counter() - started) * 1000)
+
+
+async def fetch_metrics_from_tikhub(task_type: TaskTypeEnum, endpoint: str, params: dict, timings: dict | None = None, sink: Callable[[bytes], None] | None = None) -> dict | None:
+    """
+    Like extract_metrics(fetch_from_tikhub(...)), but streams the response
+    through a MetricsParser and returns only the METRIC_FIELDS, or None on
+    failure. Each raw chunk is also passed to `sink` (e.g. an ArchiveSpool).
+    `timings` additionally receives the body size as `bytes` once it has been
+    read and parsed completely. Bodies over TIKHUB_MAX_RESPONSE_BYTES are abandoned.
+    """
+    return await _stream_from_tikhub(endpoint, params, MetricsParser(task_type), timings, sink)
+
+
+async def fetch_recent_post_codes_from_tikhub(endpoint: str, params: dict, limit: int) -> list[str] | None:
+    """
+    Like extract_recent_post_codes(fetch_from_tikhub(...), limit), but streams
+    the listing through a PostCodesParser and stops reading once it has
+    `limit` codes. None on failure.
+    """
+    return await _stream_from_tikhub(endpoint, params, PostCodesParser(limit))
+
+def extract_metrics(task_type: TaskTypeEnum, api_response: dict | None) -> dict | None:
+    """Pulls the metrics payload out of a TikHub response for the given task type."""
+    if not api_response or not api_response.get("data"):
+        return None
+    metrics_data = api_response["data"]
+    # For post tasks, the metrics are nested deeper
+    if task_type == TaskTypeEnum.post and "data" in metrics_data and "metrics" in metrics_data["data"]:
+        metrics_data = metrics_data["data"]["metrics"]
+    return metrics_data
+
+def extract_recent_post_codes(api_response: dict | None, limit: int) -> list[str]:
+    """Shortcodes of the posts in a TikHub user posts response, newest first."""
+    data = api_response.get("data") if api_response else None
+    while isinstance(data, dict) and "items" not in data and isinstance(data.get("data"), (dict, list)):
+        data = data["data"]
+    items = data.get("items") if isinstance(data, dict) else data
+    codes = [item.get("code") or item.get("shortcode") for item in items or [] if isinstance(item, dict)]
+    return [code for code in codes if code][:limit]
@@ -0,0 +1,237 @@
+"""
+Sharded scheduler.
+
+Tasks are split into SHARD_COUNT shards (see app.utils.sharding).
+Every dispatcher node heartbeats into Redis; the live nodes form a consistent
+hash ring over the shards, and each node takes a Redis lease on the shards the
+ring assigns to it. Each tick, a node only queries and enqueues the due tasks of
+the shards it holds. When a node dies its heartbeat and leases expire and the
+remaining nodes pick up its shards within SCHEDULER_LEASE_TTL_SECONDS.
+
+Run one process per node:
+    python -m app.worker.dispatcher --node-id scheduler-1
+"""
+import argparse
+import logging
+import os
+import random
+import socket
+import time
+from typing import List, Optional
+import redis
+from sqlalchemy import func
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.task import Task
+from app.schemas.enums import INTERVAL_MAP
+from app.utils.sharding import SHARD_COUNT, HashRing, shard_for
+from app.worker.tasks import get_scheduled_tasks, process_task
+
+logger = logging.getLogger(__name__)
+
+NODES_KEY = "scheduler:nodes"
+
+# Only the current holder may renew or release a lease.
+RENEW_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Claims the due shards of one interval and moves their next due time in the
+# same step, so two ticks (or a node that just lost a lease) can't both enqueue
+# a shard. KEYS: the interval's due hash, then each shard's lease. ARGV: now,
+# interval, node id, then shard/jitter pairs. A shard without a due time is
+# only seeded, `jitter` seconds from now, so a fresh start spreads the first
+# runs over one interval instead of firing every interval at once.
+CLAIM_DUE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local claimed = {}
+for i = 2, #KEYS do
+    local shard = ARGV[2 * i]
+    if redis.call('GET', KEYS[i]) == ARGV[3] then
+        local at = tonumber(redis.call('HGET', KEYS[1], shard))
+        if not at then
+            redis.call('HSET', KEYS[1], shard, tostring(now + tonumber(ARGV[2 * i + 1])))
+        elseif at <= now then
+            -- Keep the cadence, but don't replay ticks missed while no node held the shard.
+            local next_at = at + interval
+            if next_at <= now then
+                next_at = now + interval
+            end
+            redis.call('HSET', KEYS[1], shard, tostring(next_at))
+            table.insert(claimed, shard)
+        end
+    end
+end
+return claimed
+"""
+
+
+def check_task_shards(db, shard_count: int = SHARD_COUNT, sample_size: int = 100) -> Optional[str]:
+    """
+    Why the stored task shards don't match `shard_count`, or None if they do:
+    a task in a shard past the count would never be dispatched, and sampled
+    tasks stored under a different count mean the tasks were never re-sharded.
+    """
+    max_shard = db.query(func.max(Task.shard)).scalar()
+    if max_shard is not None and max_shard >= shard_count:
+        return f"tasks are stored in shard {max_shard}, past the shard count {shard_count}"
+    sample = db.query(Task.id, Task.shard).order_by(Task.id).limit(sample_size).all()
+    stale = sum(1 for task_id, shard in sample if shard != shard_for(task_id, shard_count))
+    if stale:
+        return f"{stale}/{len(sample)} sampled tasks were sharded for a different shard count than {shard_count}"
+    return None
+
+
+def lease_key(shard: int) -> str:
+    return f"scheduler:lease:{shard}"
+
+
+def due_key(interval_seconds: int) -> str:
+    """Hash of shard -> timestamp at which that shard's tasks are next due."""
+    return f"scheduler:due:{interval_seconds}"
+
+
+class ShardDispatcher:
+    def __init__(self, node_id: str, redis_client: redis.Redis, shard_count: int = SHARD_COUNT):
+        self.node_id = node_id
+        self.redis_client = redis_client
+        self.shard_count = shard_count
+        self.leased = set()
+        self._renew_lease = redis_client.register_script(RENEW_LEASE_SCRIPT)
+        self._release_lease = redis_client.register_script(RELEASE_LEASE_SCRIPT)
+        self._claim_due = redis_client.register_script(CLAIM_DUE_SCRIPT)
+
+    def heartbeat(self, now: float) -> List[str]:
+        """
+        Registers this node and returns the live nodes.
+        """
+        with self.redis_client.pipeline() as pipe:
+            pipe.zadd(NODES_KEY, {self.node_id: now})
+            pipe.zremrangebyscore(NODES_KEY, "-inf", now - settings.SCHEDULER_NODE_TTL_SECONDS)
+            pipe.zrange(NODES_KEY, 0, -1)
+            return pipe.execute()[-1]
+
+    def rebalance(self, nodes: List[str]):
+        """
+        Renews the leases on shards this node still owns, tries to take the newly
+        assigned ones and releases the rest so their new owner gets them at once.
+        """
+        owned = set(HashRing(nodes).shards_for(self.node_id, self.shard_count))
+        ttl_ms = settings.SCHEDULER_LEASE_TTL_SECONDS * 1000
+
+        with self.redis_client.pipeline() as pipe:
+            for shard in self.leased - owned:
+                self._release_lease(keys=[lease_key(shard)], args=[self.node_id], client=pipe)
+            held = sorted(self.leased & owned)
+            for shard in held:
+                self._renew_lease(keys=[lease_key(shard)], args=[self.node_id, ttl_ms], client=pipe)
+            wanted = sorted(owned - self.leased)
+            for shard in wanted:
+                pipe.set(lease_key(shard), self.node_id, nx=True, px=ttl_ms)
+            results = pipe.execute()[len(self.leased - owned):]
+
+        leased = {shard for shard, ok in zip(held + wanted, results) if ok}
+        if leased != self.leased:
+            logger.info(f"Node {self.node_id} now holds {len(leased)}/{self.shard_count} shards ({len(nodes)} live nodes).")
+        self.leased = leased
+
+    def claim_due(self, interval_seconds: int, shards: List[int], now: float) -> List[int]:
+        """
+        The shards (among those leased) whose tasks of this interval are due,
+        with their next due time already moved on.
+        """
+        args = [now, interval_seconds, self.node_id]
+        for shard in shards:
+            args += [shard, random.uniform(0, interval_seconds)]
+        claimed = self._claim_due(keys=[due_key(interval_seconds)] + [lease_key(shard) for shard in shards], args=args)
+        return [int(shard) for shard in claimed]
+
+    def dispatch_due(self, now: float) -> int:
+        """
+        Enqueues the tasks of every leased shard whose interval is due.
+        """
+        if not self.leased:
+            return 0
+
+        dispatched = 0
+        shards = sorted(self.leased)
+        for interval_seconds in INTERVAL_MAP.values():
+            # Claimed before enqueueing: if this node dies in between, the tick is skipped rather than repeated.
+            due = self.claim_due(interval_seconds, shards, now)
+            if not due:
+                continue
+
+            db = SessionLocal()
+            try:
+                task_ids = get_scheduled_tasks(db, interval_seconds, due)
+            finally:
+                db.close()
+
+            for task_id in task_ids:
+                process_task.delay(task_id=task_id, enqueued_at=time.time())
+            dispatched += len(task_ids)
+            logger.info(f"Dispatched {len(task_ids)} tasks for interval {interval_seconds}s from {len(due)} shards.")
+        return dispatched
+
+    def shutdown(self):
+        with self.redis_client.pipeline() as pipe:
+            for shard in self.leased:
+                self._release_lease(keys=[lease_key(shard)], args=[self.node_id], client=pipe)
+            pipe.zrem(NODES_KEY, self.node_id)
+            pipe.execute()
+        self.leased = set()
+
+    def check_shards(self):
+        """
+        Refuses to dispatch while the stored task shards don't match this node's shard count.
+        """
+        db = SessionLocal()
+        try:
+            mismatch = check_task_shards(db, self.shard_count)
+        finally:
+            db.close()
+        if mismatch:
+            raise RuntimeError(f"Not starting dispatcher node {self.node_id}: {mismatch}. Run python -m scripts.reshard_tasks first.")
+
+    def run_forever(self):
+        self.check_shards()
+        logger.info(f"Starting dispatcher node {self.node_id} with {self.shard_count} shards.")
+        try:
+            while True:
+                started = time.time()
+                try:
+                    self.rebalance(self.heartbeat(started))
+                    self.dispatch_due(started)
+                except redis.RedisError as e:
+                    # Leases can't be renewed without Redis; stop dispatching until it is back.
+                    logger.error(f"Redis error in dispatcher: {e}")
+                    self.leased = set()
+                except Exception as e:
+                    logger.error(f"Error in dispatcher tick: {e}", exc_info=True)
+                time.sleep(max(0.0, settings.SCHEDULER_TICK_SECONDS - (time.time() - started)))
+        finally:
+            self.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--node-id", default=f"{socket.gethostname()}-{os.getpid()}")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    redis_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, decode_responses=True)
+    ShardDispatcher(args.node_id, redis_client).run_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Memory cap for worker pools that Celery doesn't recycle.
+
+worker_max_memory_per_child only applies to prefork children. The gevent,
+threads and solo pools run every task in the worker process itself, so after
+each task the watchdog checks that process's RSS and, once it passes
+WORKER_MAX_MEMORY_PER_CHILD_KB, asks the worker for a warm shutdown: running
+tasks finish, no new ones are taken, and the process supervisor starts a
+fresh worker.
+"""
+import logging
+import os
+import sys
+from typing import Callable, Optional
+from celery.concurrency import get_implementation
+from celery.signals import task_postrun
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def rss_kb() -> Optional[int]:
+    """
+    Resident set size of this process in KiB, or None where it can't be read.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, AttributeError):
+        pass
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                    "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage",
+                )
+            ]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        if ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize // 1024
+        return None
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Peak rather than current RSS, as Celery's own prefork check uses; KiB on Linux, bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def is_recycled(pool_cls) -> bool:
+    """Whether Celery itself replaces the pool's processes (prefork only)."""
+    return get_implementation(pool_cls).__module__ == "celery.concurrency.prefork"
+
+
+class MemoryWatchdog:
+    def __init__(self, hostname: str, shutdown: Callable[[str], None], max_kb: int = settings.WORKER_MAX_MEMORY_PER_CHILD_KB, rss: Callable[[], Optional[int]] = rss_kb):
+        self.hostname = hostname
+        self.shutdown = shutdown
+        self.max_kb = max_kb
+        self.rss = rss
+        self.requested = False
+
+    def check(self, **_):
+        """Connected to task_postrun: requests the shutdown once, when the RSS is over the cap."""
+        if self.requested:
+            return
+        rss = self.rss()
+        if rss is not None and rss > self.max_kb:
+            logger.warning(f"Worker {self.hostname} RSS {rss} KiB is over WORKER_MAX_MEMORY_PER_CHILD_KB ({self.max_kb}); shutting down for a restart.")
+            self.requested = True
+            self.shutdown(self.hostname)
+
+
+def watch_memory(sender=None, **_):
+    """
+    Connected to worker_init: installs a MemoryWatchdog on workers whose pool Celery doesn't recycle.
+    """
+    if not settings.WORKER_MAX_MEMORY_PER_CHILD_KB or is_recycled(sender.pool_cls):
+        return
+    if rss_kb() is None:
+        logger.warning("Can't read the worker's RSS on this platform; WORKER_MAX_MEMORY_PER_CHILD_KB is not enforced.")
+        return
+    watchdog = MemoryWatchdog(sender.hostname, lambda hostname: sender.app.control.shutdown(destination=[hostname]), settings.WORKER_MAX_MEMORY_PER_CHILD_KB)
+    task_postrun.connect(watchdog.check, weak=False)
+    sender.memory_watchdog = watchdog
@@ -1,10 +1,18 @@
 import logging
 import json
+import time
+from typing import Optional
+from app.archive import ArchiveSpool, get_archive_writer
+from app.core.config import settings
 from app.db.session import SessionLocal
-from app.db.redis import get_redis_client
+from app.db.redis import new_redis_client
 from app.models.task import Task
-from app.db.enums import TaskTypeEnum
-from app.utils.tikhub import fetch_from_tikhub
+from app.db.enums import RunOutcomeEnum, TaskTypeEnum
+from app.services.engagement import EngagementEnricher
+from app.services.rate_budget import RateBudget
+from app.services.refresh import finish_run, start_run
+from app.services.task_runs import record_run
+from app.utils.tikhub import fetch_metrics_from_tikhub
 from app.services.influencer import InfluencerService
 from app.services.post import PostService
 from sqlalchemy.orm import Session
@@ -12,21 +20,52 @@ from redis.asyncio import Redis
 
 logger = logging.getLogger(__name__)
 
-async def _update_history(task: Task, data: dict, db: Session, redis_client: Redis):
+async def _update_history(task: Task, data: dict, db: Session, redis_client: Redis, cache_client: Redis):
     """Updates the metrics history for a task and invalidates relevant caches."""
     if task.task_type == TaskTypeEnum.influencer:
-        influencerService = InfluencerService(db, redis_client)
-        await influencerService.create_metrics_history(task.username, data)
+        influencerService = InfluencerService(db, redis_client, cache_client)
+        await influencerService.create_metrics_history(task.username, data, task)
     elif task.task_type == TaskTypeEnum.post:
-        postService = PostService(db, redis_client)
-        await postService.create_metrics_history(task.post_code, data)
+        postService = PostService(db, redis_client, cache_client)
+        await postService.create_metrics_history(task.post_code, data, task)
     logger.info(f"Updated DB and cleared cache for task {task.id}")
 
 
-async def process_task_by_id(task_id: str):
+def _archive_response(task: Task, spool: ArchiveSpool):
+    """Appends the spooled raw response to the archive; archiving never fails the task."""
+    try:
+        writer = get_archive_writer()
+        if writer:
+            key = task.username if task.task_type == TaskTypeEnum.influencer else task.post_code
+            writer.append_payload(task.id, task.task_type, key, *spool.compress())
+    except Exception as e:
+        logger.error(f"Failed to archive response for task {task.id}: {e}", exc_info=True)
+    finally:
+        spool.close()
+
+
+async def _engagement_rate(task: Task, metrics_data: dict, db: Session, redis_client: Redis) -> Optional[float]:
+    """Engagement over the influencer's recent posts; enrichment never fails the task."""
+    try:
+        return await EngagementEnricher(db, redis_client).engagement_rate(task.username, metrics_data.get("follower_count"))
+    except Exception as e:
+        logger.error(f"Failed to compute engagement rate for task {task.id}: {e}", exc_info=True)
+        return None
+
+
+async def process_task_by_id(task_id: str, enqueued_at: Optional[float] = None, after_seq: Optional[int] = None):
+    """
+    Fetches and stores one sample for a task. `after_seq` is set for on-demand
+    refreshes; the run is skipped if another run already covers it.
+    """
     db = SessionLocal()
-    redis_client = await get_redis_client()
+    # Created per run and closed below: each run has its own event loop.
+    redis_client = new_redis_client()
+    cache_client = new_redis_client(binary=True)
     metrics_data = None
+    started_at = time.time()
+    started = time.perf_counter()
+    run = None
     
     try:
         task = db.query(Task).filter(Task.id == task_id).first()
@@ -34,6 +73,18 @@ async def process_task_by_id(task_id: str):
             logger.warning(f"Task with id {task_id} not found.")
             return
 
+        if not await start_run(redis_client, task.id, after_seq):
+            logger.info(f"Skipping task {task.id}: merged into a run already in flight.")
+            return
+
+        run = {
+            "task_id": task.id,
+            "task_type": task.task_type.value,
+            "started_at": started_at,
+            "outcome": RunOutcomeEnum.failed.value,
+            "queue_wait_ms": int((started_at - enqueued_at) * 1000) if enqueued_at else None,
+        }
+
         # Determine API endpoint and parameters
         endpoint = ""
         params = {}
@@ -44,17 +95,33 @@ async def process_task_by_id(task_id: str):
             endpoint = "/fetch_post_details_by_url"
             params = {"url": f"https://www.instagram.com/p/{task.post_code}/"}
 
-        # Attempt to fetch live data from the API
-        api_response = await fetch_from_tikhub(endpoint, params)
+        # Fetch within the TikHub budget shared by all workers. Without a token nothing
+        # is fetched, so the run is skipped: storing the fallback would add a stale
+        # duplicate sample. The task's next scheduled run tries again.
+        if not await RateBudget(redis_client).acquire():
+            logger.warning(f"Skipping task {task.id}: TikHub rate budget exhausted.")
+            run["outcome"] = RunOutcomeEnum.throttled.value
+            return
+
+        # The response is streamed: only the metrics are parsed out, and the raw body is spooled for the archive.
+        timings = {}
+        spool = ArchiveSpool() if settings.ARCHIVE_ENABLED else None
+        metrics_data = await fetch_metrics_from_tikhub(task.task_type, endpoint, params, timings, spool.write if spool else None)
+        run["fetch_ms"] = timings.get("elapsed_ms")
+        run["http_status"] = timings.get("status")
         fallback_key = f"fallback:{task.id}"
-        
-        if api_response and api_response.get("data"):
+
+        if spool:
+            if "bytes" in timings:
+                _archive_response(task, spool)
+            else:
+                spool.close()
+
+        if metrics_data:
             logger.info(f"Successfully fetched data for task {task.id}")
-            metrics_data = api_response["data"]
-            # For post tasks, the metrics are nested deeper
-            if task.task_type == TaskTypeEnum.post and "data" in metrics_data and "metrics" in metrics_data["data"]:
-                 metrics_data = metrics_data["data"]["metrics"]
-            
+            run["outcome"] = RunOutcomeEnum.success.value
+            if task.task_type == TaskTypeEnum.influencer and settings.ENGAGEMENT_RECENT_POSTS > 0:
+                metrics_data["engagement_rate"] = await _engagement_rate(task, metrics_data, db, redis_client)
             # Store successful response in Redis as a fallback
             await redis_client.set(fallback_key, json.dumps(metrics_data), ex=3 * task.interval_seconds)
         else:
@@ -62,16 +129,30 @@ async def process_task_by_id(task_id: str):
             fallback_data = await redis_client.get(fallback_key)
             if fallback_data:
                 logger.info(f"Found fallback data for task {task.id}.")
+                run["outcome"] = RunOutcomeEnum.fallback.value
                 metrics_data = json.loads(fallback_data)
             else:
                 logger.error(f"No fallback data available for task {task.id}.")
 
         # If we have metrics (from API or fallback), update the history
         if metrics_data:
-            await _update_history(task, metrics_data, db, redis_client)
+            write_started = time.perf_counter()
+            await _update_history(task, metrics_data, db, redis_client, cache_client)
+            run["write_ms"] = int((time.perf_counter() - write_started) * 1000)
 
     except Exception as e:
         logger.error(f"An unexpected error occurred while processing task {task_id}: {e}", exc_info=True)
+        if run:
+            run["outcome"] = RunOutcomeEnum.failed.value
+            run["error"] = f"{type(e).__name__}: {e}"[:255]
     finally:
         db.close()
-        await redis_client.close() 
\ No newline at end of file
+        if run:
+            run["total_ms"] = int((time.perf_counter() - started) * 1000)
+            try:
+                await finish_run(redis_client, task_id, run["outcome"])
+                await record_run(redis_client, run)
+            except Exception as e:
+                logger.error(f"Failed to record run for task {task_id}: {e}")
+        await redis_client.aclose()
+        await cache_client.aclose()
@@ -1,42 +1,133 @@
 import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional
+from celery.signals import task_prerun, task_postrun
 from app.celery_app import celery_app
-from app.db.session import SessionLocal
+from app.core.config import settings
 from app.models.task import Task
 from app.db.enums import TaskStatusEnum
 import logging
 from app.worker.processing import process_task_by_id
+from app.db.redis import new_redis_client
+from app.db.session import SessionLocal
+from app.services.influencer import InfluencerService
+from app.services.post import PostService
+from app.services.task_runs import flush_task_runs, prune_task_runs
+from app.utils.profiler import SamplingProfiler, should_profile_task
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Held while sealing, so overlapping runs don't both create the same chunk row.
+# Sealing normally takes far less; the expiry only matters if a sealer dies holding it.
+SEAL_LOCK_KEY = "history_chunks:seal_lock"
+SEAL_LOCK_SECONDS = 6 * 60 * 60
+
+
+def get_scheduled_tasks(db, interval_seconds: int, shards: Iterable[int]) -> List[str]:
+    """
+    Ids of the active tasks with the given interval in the given shards.
+    """
+    rows = db.query(Task.id).filter(
+        Task.interval_seconds == interval_seconds,
+        Task.status == TaskStatusEnum.active,
+        Task.shard.in_(list(shards)),
+    ).all()
+    return [task_id for task_id, in rows]
+
 
 @celery_app.task
-async def process_task(task_id: str):
+def process_task(task_id: str, enqueued_at: Optional[float] = None, after_seq: Optional[int] = None):
     """
     Celery task to process a single monitoring task.
-    It calls the asynchronous processing logic.
+    It runs the asynchronous processing logic to completion.
     """
     logger.info(f"Starting processing for task: {task_id}")
-    await process_task_by_id(task_id)
+    asyncio.run(process_task_by_id(task_id, enqueued_at, after_seq))
     logger.info(f"Finished processing for task: {task_id}")
 
 
+async def _flush_task_runs() -> int:
+    db = SessionLocal()
+    redis_client = new_redis_client()
+    try:
+        return await flush_task_runs(db, redis_client)
+    finally:
+        db.close()
+        await redis_client.aclose()
+
+
 @celery_app.task
-def retrieve_scheduled_tasks(interval_seconds: int):
-    logger.info(f"Retrieving tasks with interval: {interval_seconds} seconds")
+def flush_runs():
+    """
+    Moves the run records buffered in Redis into the task_run table.
+    """
+    written = asyncio.run(_flush_task_runs())
+    if written:
+        logger.info(f"Flushed {written} task runs.")
+
+
+@celery_app.task
+def prune_runs():
+    """
+    Deletes task runs older than TASK_RUN_RETENTION_DAYS.
+    """
     db = SessionLocal()
     try:
-        tasks = db.query(Task).filter(
-            Task.interval_seconds == interval_seconds,
-            Task.status == TaskStatusEnum.active
-        ).all()
-
-        logger.info(f"Found {len(tasks)} tasks to run for interval {interval_seconds}s.")
-
-        for task in tasks:
-            process_task.delay(task_id=task.id)
-            
-    except Exception as e:
-        logger.error(f"Error retrieving scheduled tasks: {e}", exc_info=True)
+        deleted = prune_task_runs(db)
+    finally:
+        db.close()
+    logger.info(f"Pruned {deleted} task runs.")
+
+
+async def _seal_chunks(before: datetime) -> Optional[int]:
+    redis_client = new_redis_client()
+    try:
+        lock = redis_client.lock(SEAL_LOCK_KEY, timeout=SEAL_LOCK_SECONDS)
+        if not await lock.acquire(blocking=False):
+            return None
+        try:
+            db = SessionLocal()
+            try:
+                return InfluencerService(db, None).seal_history(before) + PostService(db, None).seal_history(before)
+            finally:
+                db.close()
+        finally:
+            await lock.release()
     finally:
-        db.close() 
\ No newline at end of file
+        await redis_client.aclose()
+
+
+@celery_app.task
+def seal_chunks():
+    """
+    Packs the history rows of every chunk that ended over CHUNK_SEAL_DELAY_SECONDS
+    ago into chunk rows. Skipped while another run is still sealing.
+    """
+    before = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=settings.CHUNK_SEAL_DELAY_SECONDS)
+    sealed = asyncio.run(_seal_chunks(before))
+    if sealed is None:
+        logger.info("Skipped sealing: another run holds the seal lock.")
+    else:
+        logger.info(f"Sealed {sealed} history rows.")
+
+
+_task_profiles = {}
+
+
+def start_task_profile(task_id=None, task=None, kwargs=None, **_):
+    if task is process_task and should_profile_task((kwargs or {}).get("task_id")):
+        _task_profiles[task_id] = SamplingProfiler("task", f"process_task {kwargs['task_id']}", [threading.get_ident()]).start()
+
+
+def stop_task_profile(task_id=None, **_):
+    profiler = _task_profiles.pop(task_id, None)
+    if profiler:
+        profiler.stop()
+
+
+# Only hooked up when profiling is enabled, so disabled runs pay nothing.
+if settings.PROFILE_ENABLED:
+    task_prerun.connect(start_task_profile)
+    task_postrun.connect(stop_task_profile)
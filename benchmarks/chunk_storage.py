@@ -0,0 +1,122 @@
+"""
+Compares one-row-per-sample history storage with sealed chunks: bytes on
+disk (table plus indexes) and range-scan latency for the whole history and
+for the last day.
+
+Runs against SQLite, whose per-row and per-index-entry overhead is smaller
+than InnoDB's, so the ratio on MySQL is at least as large.
+
+Usage:
+    python -m benchmarks.chunk_storage --days 30 --interval 30
+"""
+import argparse
+import logging
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("REDIS_HOST", "127.0.0.1")
+os.environ.setdefault("REDIS_PORT", "6379")
+os.environ.setdefault("TIKHUB_API_KEY", "")
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.db.session import Base
+from app.models import InfluencerMetricsChunk, InfluencerMetricsHistory
+from app.services.influencer import HISTORY_CHUNKS
+
+USERNAME = "benchmark"
+# Other monitors sharing the table, so the index isn't trivially small.
+NEIGHBOURS = 9
+
+
+def seed(session, days: int, interval: int):
+    """
+    Samples with realistic noise: irregular follower growth and a second or
+    two of scheduling jitter, which is what the deltas have to absorb.
+    """
+    rng = random.Random(0)
+    start = datetime(2024, 1, 1)
+    samples = days * 24 * 60 * 60 // interval
+    for n, username in enumerate([USERNAME] + [f"neighbour_{i}" for i in range(NEIGHBOURS)]):
+        followers = 690_000_000
+        rows = []
+        for i in range(samples):
+            followers += rng.randint(-20, 120)
+            rows.append({
+                "user_id": n,
+                "username": username,
+                "bio": "Discover what's new on Instagram" if i < samples // 2 else "Discover what's new on Instagram!",
+                "follower_count": followers,
+                "following_count": 167 + i // 20000,
+                "post_count": 8000 + i // 1000,
+                "recorded_at": start + timedelta(seconds=interval * i + rng.choice((0, 0, 0, 1, 2))),
+            })
+        session.bulk_insert_mappings(InfluencerMetricsHistory, rows)
+        session.commit()
+    return start + timedelta(seconds=interval * samples)
+
+
+def table_bytes(session, *tables) -> int:
+    """
+    Pages used by the tables and their indexes.
+    """
+    rows = session.execute(text("SELECT name, tbl_name FROM sqlite_master")).all()
+    names = [name for name, table in rows if table in {t.name for t in tables}]
+    placeholders = ", ".join(f":n{i}" for i in range(len(names)))
+    return session.execute(text(f"SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name IN ({placeholders})"), {f"n{i}": n for i, n in enumerate(names)}).scalar()
+
+
+def measure(label: str, fn, repeat: int):
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    elapsed = (time.perf_counter() - started) / repeat
+    print(f"{label:<24} {elapsed * 1000:>10.1f} ms {len(result):>10} samples")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--interval", type=int, default=30, help="Seconds between samples.")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{directory}/chunks.db")
+        Base.metadata.create_all(engine, tables=[InfluencerMetricsHistory.__table__, InfluencerMetricsChunk.__table__])
+        session = sessionmaker(bind=engine)()
+        end = seed(session, args.days, args.interval)
+        last_day = end - timedelta(days=1)
+        samples = session.query(InfluencerMetricsHistory).filter(InfluencerMetricsHistory.username == USERNAME).count()
+        print(f"{args.days} days at {args.interval}s: {samples} samples per monitor, {NEIGHBOURS + 1} monitors")
+
+        session.execute(text("VACUUM"))
+        row_bytes = table_bytes(session, InfluencerMetricsHistory.__table__)
+        print(f"{'rows storage':<24} {row_bytes / 1024 / 1024:>10.1f} MiB {row_bytes / samples / (NEIGHBOURS + 1):>10.1f} bytes/sample")
+        rows = measure("rows full scan", lambda: HISTORY_CHUNKS.history(session, USERNAME), args.repeat)
+        rows_day = measure("rows last day", lambda: HISTORY_CHUNKS.history(session, USERNAME, since=last_day), args.repeat)
+
+        logging.getLogger("app.services.chunks").disabled = True
+        for username, in session.query(InfluencerMetricsHistory.username).distinct().all():
+            HISTORY_CHUNKS.seal(session, username, end + timedelta(days=1))
+        session.execute(text("VACUUM"))
+        chunk_bytes = table_bytes(session, InfluencerMetricsHistory.__table__, InfluencerMetricsChunk.__table__)
+        print(f"{'chunk storage':<24} {chunk_bytes / 1024 / 1024:>10.1f} MiB {chunk_bytes / samples / (NEIGHBOURS + 1):>10.1f} bytes/sample")
+        chunks = measure("chunks full scan", lambda: HISTORY_CHUNKS.history(session, USERNAME), args.repeat)
+        chunks_day = measure("chunks last day", lambda: HISTORY_CHUNKS.history(session, USERNAME, since=last_day), args.repeat)
+
+        assert [tuple(row) for row in rows] == chunks and [tuple(row) for row in rows_day] == chunks_day
+        print(f"compression ratio {row_bytes / chunk_bytes:.1f}x")
+        session.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Reports cached bytes per history point for each cache format and compression.
+
+Usage:
+    python -m benchmarks.history_cache_encoding --rows 100000
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("REDIS_HOST", "127.0.0.1")
+os.environ.setdefault("REDIS_PORT", "6379")
+os.environ.setdefault("TIKHUB_API_KEY", "")
+
+from app.services.influencer import HISTORY_COLUMNS, HISTORY_FIELDS
+from app.utils.cache_codec import HistoryCodec
+from app.utils.history import dump_history_response
+
+
+START = datetime(2024, 1, 1)
+
+
+def sample_value(column, position: int, i: int):
+    """
+    The value of one HISTORY_COLUMNS column in the i-th newest row: counters
+    that drift like follower counts, rates that vary slightly, a bio that
+    never changes and timestamps 30 s apart.
+    """
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return START - timedelta(seconds=30 * i)
+    if python_type is int:
+        return 10 ** (8 - position) + i // (position + 1)
+    if python_type is float:
+        return round(2.5 + (i % 97) / 1000, 4)
+    return "Discover what's new on Instagram"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    # Built from HISTORY_COLUMNS so the rows keep the shape the cache actually stores.
+    rows = [tuple(sample_value(column, position, i) for position, column in enumerate(HISTORY_COLUMNS)) for i in range(args.rows)]
+    body = dump_history_response("username", "benchmark", HISTORY_FIELDS, rows)
+
+    print(f"{args.rows} rows")
+    print(f"{'format':<10} {'compression':<12} {'bytes':>12} {'bytes/point':>12} {'encode':>10} {'decode':>10}")
+    for fmt in ("json", "columnar"):
+        for compression in ("none", "zstd", "lz4"):
+            codec = HistoryCodec("username", HISTORY_COLUMNS, fmt, compression)
+            started = time.perf_counter()
+            value = codec.encode(rows, body)
+            encoded = time.perf_counter()
+            codec.decode("benchmark", value)
+            decoded = time.perf_counter()
+            print(
+                f"{fmt:<10} {compression:<12} {len(value):>12} {len(value) / len(rows):>12.1f} "
+                f"{(encoded - started) * 1000:>8.1f}ms {(decoded - encoded) * 1000:>8.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
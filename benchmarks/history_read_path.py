@@ -0,0 +1,107 @@
+"""
+Compares the ORM-based history read path with the lean tuple + orjson path.
+
+Usage:
+    python -m benchmarks.history_read_path --rows 100000
+"""
+import argparse
+import json
+import os
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("REDIS_HOST", "127.0.0.1")
+os.environ.setdefault("REDIS_PORT", "6379")
+os.environ.setdefault("TIKHUB_API_KEY", "")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.session import Base
+from app.models import InfluencerMetricsHistory
+from app.schemas.influencer import UserHistoryData
+from app.schemas.response import Response
+from app.services.influencer import HISTORY_COLUMNS, HISTORY_FIELDS
+from app.utils.history import dump_history_response
+
+USERNAME = "benchmark"
+
+
+def seed(session, rows: int):
+    start = datetime(2024, 1, 1)
+    session.bulk_insert_mappings(InfluencerMetricsHistory, [
+        {
+            "user_id": 1,
+            "username": USERNAME,
+            "bio": "Discover what's new on Instagram",
+            "follower_count": 690_000_000 + i,
+            "following_count": 167,
+            "post_count": 8000 + i // 1000,
+            "recorded_at": start + timedelta(seconds=30 * i),
+        }
+        for i in range(rows)
+    ])
+    session.commit()
+
+
+def orm_miss(session) -> tuple[bytes, str]:
+    history = session.query(InfluencerMetricsHistory).filter(InfluencerMetricsHistory.username == USERNAME).order_by(InfluencerMetricsHistory.recorded_at.desc()).all()
+    to_cache = []
+    for h in history:
+        h_dict = dict(h.__dict__)
+        h_dict.pop("_sa_instance_state", None)
+        h_dict["recorded_at"] = h.recorded_at.isoformat() if h.recorded_at else None
+        to_cache.append(h_dict)
+    cached = json.dumps(to_cache)
+    body = Response(data=UserHistoryData(username=USERNAME, history=history)).model_dump_json().encode()
+    return body, cached
+
+
+def orm_hit(cached: str) -> bytes:
+    history = [InfluencerMetricsHistory(**item) for item in json.loads(cached)]
+    return Response(data=UserHistoryData(username=USERNAME, history=history)).model_dump_json().encode()
+
+
+def lean_miss(session) -> bytes:
+    history = session.query(*HISTORY_COLUMNS).filter(InfluencerMetricsHistory.username == USERNAME).order_by(InfluencerMetricsHistory.recorded_at.desc()).all()
+    return dump_history_response("username", USERNAME, HISTORY_FIELDS, history)
+
+
+def lean_hit(cached: bytes) -> bytes:
+    return cached
+
+
+def measure(label: str, fn, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<12} {elapsed * 1000:>10.1f} ms {peak / 1024 / 1024:>10.1f} MiB")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[InfluencerMetricsHistory.__table__])
+    session = sessionmaker(bind=engine)()
+    seed(session, args.rows)
+
+    print(f"{args.rows} rows")
+    print(f"{'path':<12} {'latency':>13} {'peak memory':>14}")
+    _, cached = measure("orm miss", orm_miss, session)
+    session.expunge_all()
+    measure("orm hit", orm_hit, cached)
+    body = measure("lean miss", lean_miss, session)
+    measure("lean hit", lean_hit, body)
+
+
+if __name__ == "__main__":
+    main()
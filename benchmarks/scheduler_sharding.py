@@ -0,0 +1,46 @@
+"""
+Shows how shards and tasks spread over dispatcher nodes, and how many shards
+move when a node joins.
+
+Usage:
+    python -m benchmarks.scheduler_sharding --tasks 100000 --max-nodes 8
+"""
+import argparse
+import os
+import uuid
+from collections import Counter
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("REDIS_HOST", "127.0.0.1")
+os.environ.setdefault("REDIS_PORT", "6379")
+os.environ.setdefault("TIKHUB_API_KEY", "")
+
+from app.utils.sharding import SHARD_COUNT, HashRing, shard_for
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=100_000)
+    parser.add_argument("--max-nodes", type=int, default=8)
+    args = parser.parse_args()
+
+    shard_count = SHARD_COUNT
+    tasks_per_shard = Counter(shard_for(str(uuid.uuid4())) for _ in range(args.tasks))
+
+    print(f"{args.tasks} tasks, {shard_count} shards")
+    print(f"{'nodes':>5} {'max tasks/node':>15} {'ideal':>8} {'shards moved on join':>21}")
+    previous = None
+    for count in range(1, args.max_nodes + 1):
+        nodes = [f"node-{i}" for i in range(count)]
+        ring = HashRing(nodes)
+        owners = {shard: ring.owner(shard) for shard in range(shard_count)}
+        load = Counter()
+        for shard, tasks in tasks_per_shard.items():
+            load[owners[shard]] += tasks
+        moved = sum(1 for shard in owners if previous and owners[shard] != previous[shard])
+        print(f"{count:>5} {max(load.values()):>15} {args.tasks // count:>8} {moved if previous else '-':>21}")
+        previous = owners
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Peak worker memory for concurrent TikHub fetches: the whole-document path
+(response.json() + extract_metrics, the body re-serialized for the archive)
+vs the streaming path (fetch_metrics_from_tikhub parsing only the metric
+fields, the raw body spooled for the archive).
+
+Each mode runs in a fresh interpreter, so its peak RSS (ru_maxrss) is its
+own. `--fetches` requests are started at once against an httpx.MockTransport
+that serves a synthetic `--payload-kb` user info response in `--chunk-kb`
+chunks, yielding between chunks as a slow upstream would; every fetch then
+holds its result for `--hold-ms`, as a run does while it writes the sample.
+
+Usage:
+    python -m benchmarks.streaming_parse --fetches 1000 --payload-kb 256
+    python -m benchmarks.streaming_parse --fetches 1000 --payload-kb 1024 --no-archive
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("REDIS_HOST", "127.0.0.1")
+os.environ.setdefault("REDIS_PORT", "6379")
+os.environ.setdefault("TIKHUB_API_KEY", "benchmark")
+
+MODES = ("full", "stream")
+ENDPOINT = "/fetch_user_info_by_username_v2"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fetches", type=int, default=1000, help="Concurrent fetches.")
+    parser.add_argument("--payload-kb", type=int, default=256, help="Response size.")
+    parser.add_argument("--chunk-kb", type=int, default=16, help="Size of the chunks the response arrives in.")
+    parser.add_argument("--hold-ms", type=int, default=50, help="How long each fetch keeps its result afterwards.")
+    parser.add_argument("--no-archive", action="store_true", help="Skip archiving the raw response.")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def build_payload(size: int) -> bytes:
+    """
+    A user info response shaped like TikHub's: the metrics up front, then a
+    timeline of media nodes (captions, URLs, counters) up to `size` bytes.
+    """
+    edges, length, i = [], 0, 0
+    while length < size:
+        node = {
+            "id": str(3_000_000_000_000_000_000 + i),
+            "shortcode": f"C{i:010d}",
+            "display_url": f"https://scontent.cdninstagram.com/v/t51.29350-15/{i}_n.jpg?stp=dst-jpg_e35&_nc_ht=scontent&oh=00_{i:032x}",
+            "dimensions": {"height": 1350, "width": 1080},
+            "is_video": i % 3 == 0,
+            "edge_media_to_caption": {"edges": [{"node": {"text": f"Post {i} #travel #food #photography " * 4}}]},
+            "edge_liked_by": {"count": 10_000 + i},
+            "edge_media_to_comment": {"count": 100 + i},
+            "taken_at_timestamp": 1_700_000_000 + i * 3600,
+        }
+        edges.append({"node": node})
+        length += len(json.dumps(node)) + 12
+        i += 1
+    response = {
+        "code": 200,
+        "data": {
+            "id": "25025320",
+            "username": "instagram",
+            "biography": "Discover what's new on Instagram",
+            "follower_count": 690_000_000,
+            "following_count": 167,
+            "media_count": 8000,
+            "edge_owner_to_timeline_media": {"count": 8000, "edges": edges},
+        },
+    }
+    return json.dumps(response).encode()
+
+
+def peak_rss_kb() -> int:
+    # KiB on Linux, bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+async def run_mode(args) -> dict:
+    import httpx
+    from app.archive import ArchiveSpool
+    from app.archive.segments import _compress
+    from app.db.enums import TaskTypeEnum
+    from app.utils import tikhub
+
+    payload = build_payload(args.payload_kb * 1024)
+    chunk_size = args.chunk_kb * 1024
+
+    async def body():
+        for i in range(0, len(payload), chunk_size):
+            yield payload[i:i + chunk_size]
+            await asyncio.sleep(0)
+
+    tikhub.transport = httpx.MockTransport(lambda request: httpx.Response(200, content=body()))
+    archive = not args.no_archive
+
+    async def full():
+        response = await tikhub.fetch_from_tikhub(ENDPOINT, {"username": "instagram"})
+        metrics = tikhub.extract_metrics(TaskTypeEnum.influencer, response)
+        if archive:
+            import orjson
+            _compress(orjson.dumps(response))
+        await asyncio.sleep(args.hold_ms / 1000)
+        return metrics is not None
+
+    async def stream():
+        spool = ArchiveSpool() if archive else None
+        metrics = await tikhub.fetch_metrics_from_tikhub(TaskTypeEnum.influencer, ENDPOINT, {"username": "instagram"}, sink=spool.write if spool else None)
+        if spool:
+            spool.compress()
+        await asyncio.sleep(args.hold_ms / 1000)
+        return metrics is not None
+
+    fetch = full if args.mode == "full" else stream
+    # Warm up imports and lazily built state before the baseline.
+    await fetch()
+    baseline = peak_rss_kb()
+    started = time.perf_counter()
+    results = await asyncio.gather(*(fetch() for _ in range(args.fetches)))
+    elapsed = time.perf_counter() - started
+    peak = peak_rss_kb()
+    return {
+        "mode": args.mode,
+        "ok": sum(results),
+        "seconds": round(elapsed, 2),
+        "baseline_mib": round(baseline / 1024, 1),
+        "peak_mib": round(peak / 1024, 1),
+        "growth_mib_per_1k": round((peak - baseline) / 1024 * 1000 / args.fetches, 1),
+    }
+
+
+def main():
+    args = parse_args()
+    if args.mode:
+        print(json.dumps(asyncio.run(run_mode(args))))
+        return
+
+    print(f"{args.fetches} concurrent fetches of a {args.payload_kb} KiB response in {args.chunk_kb} KiB chunks, archive {'off' if args.no_archive else 'on'}")
+    print(f"{'mode':<8} {'ok':>6} {'seconds':>8} {'baseline MiB':>13} {'peak MiB':>9} {'growth MiB/1k':>14}")
+    results = {}
+    for mode in MODES:
+        child = subprocess.run([sys.executable, "-m", "benchmarks.streaming_parse", *sys.argv[1:], "--mode", mode], capture_output=True, text=True, check=True)
+        result = results[mode] = json.loads(child.stdout.strip().splitlines()[-1])
+        print(f"{mode:<8} {result['ok']:>6} {result['seconds']:>8} {result['baseline_mib']:>13} {result['peak_mib']:>9} {result['growth_mib_per_1k']:>14}")
+    if results["stream"]["growth_mib_per_1k"] > 0:
+        print(f"peak growth reduced {results['full']['growth_mib_per_1k'] / results['stream']['growth_mib_per_1k']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Reseeds the Redis leaderboards from the history tables.
+
+Drops every leaderboard and per-monitor sample set, then replays the last
+7 days of history (plus one anchor sample per monitor) for every task that
+is not stopped.
+
+Usage:
+    python -m scripts.rebuild_leaderboards [--task-type influencer|post]
+"""
+import argparse
+import asyncio
+
+from app.db.enums import TaskTypeEnum
+from app.db.redis import new_redis_client
+from app.db.session import SessionLocal
+from app.services.influencer import InfluencerService
+from app.services.post import PostService
+
+SERVICES = {TaskTypeEnum.influencer: InfluencerService, TaskTypeEnum.post: PostService}
+
+
+async def rebuild(task_types):
+    db = SessionLocal()
+    redis_client = new_redis_client()
+    try:
+        for task_type in task_types:
+            count = await SERVICES[task_type](db, redis_client).rebuild_leaderboard()
+            print(f"{task_type.value}: rebuilt leaderboards from {count} monitors")
+    finally:
+        db.close()
+        await redis_client.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--task-type", type=TaskTypeEnum, choices=list(TaskTypeEnum))
+    args = parser.parse_args()
+    asyncio.run(rebuild([args.task_type] if args.task_type else list(TaskTypeEnum)))
+
+
+if __name__ == "__main__":
+    main()
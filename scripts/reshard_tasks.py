@@ -0,0 +1,49 @@
+"""
+Moves every task to its shard under the current SHARD_COUNT (see
+app.utils.sharding), e.g. after the count was changed.
+
+Stop the dispatchers first; they refuse to start until the stored shards
+match. Tasks are updated in batches, each committed on its own, so the
+script can be re-run after an interruption.
+
+Usage:
+    python -m scripts.reshard_tasks [--batch-size 1000]
+"""
+import argparse
+
+from app.db.session import SessionLocal
+from app.models.task import Task
+from app.utils.sharding import SHARD_COUNT, shard_for
+
+
+def reshard(db, shard_count: int = SHARD_COUNT, batch_size: int = 1000) -> int:
+    """
+    Re-shards the tasks in id order and returns how many moved.
+    """
+    moved, last_id = 0, ""
+    while True:
+        rows = db.query(Task.id, Task.shard).filter(Task.id > last_id).order_by(Task.id).limit(batch_size).all()
+        if not rows:
+            return moved
+        changes = [{"id": task_id, "shard": shard_for(task_id, shard_count)} for task_id, shard in rows if shard != shard_for(task_id, shard_count)]
+        if changes:
+            db.bulk_update_mappings(Task, changes)
+            db.commit()
+        moved += len(changes)
+        last_id = rows[-1][0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        print(f"moved {reshard(db, batch_size=args.batch_size)} tasks to their shard of {SHARD_COUNT}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import pytest
+
+from app.core.config import settings
+from app.db.enums import TaskTypeEnum
+from app.services.anomalies import AnomalyDetector
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def detector(redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "ANOMALY_ALPHA", 0.5)
+    monkeypatch.setattr(settings, "ANOMALY_MIN_SAMPLES", 3)
+    return AnomalyDetector(redis_client, TaskTypeEnum.influencer, "username", ("follower_count",))
+
+
+async def stats(detector, key="alice"):
+    raw = await detector.redis_client.hgetall(detector.stats_key(key))
+    return int(raw["follower_count:n"]), float(raw["follower_count:mean"]), float(raw["follower_count:var"])
+
+
+async def test_first_rate_seeds_the_mean(detector):
+    assert await detector.observe("alice", "t1", {"follower_count": 1000}, recorded_at=1000) == []
+    assert not await detector.redis_client.hexists(detector.stats_key("alice"), "follower_count:n")
+
+    await detector.observe("alice", "t1", {"follower_count": 1100}, recorded_at=1010)
+    assert await stats(detector) == (1, 10.0, 0.0)
+
+
+async def test_ewma_update(detector):
+    await detector.observe("alice", "t1", {"follower_count": 1000}, recorded_at=1000)
+    await detector.observe("alice", "t1", {"follower_count": 1100}, recorded_at=1010)
+    await detector.observe("alice", "t1", {"follower_count": 1300}, recorded_at=1020)
+    # rate 20, diff 10: mean 10 + 0.5 * 10, var 0.5 * (0 + 10 * 5)
+    assert await stats(detector) == (2, 15.0, 25.0)
+
+
+async def test_steady_growth_is_not_flagged_and_a_spike_is(detector):
+    followers = 1000
+    for i, step in enumerate((100, 110, 90, 100, 105, 95)):
+        followers += step
+        assert await detector.observe("alice", "t1", {"follower_count": followers}, recorded_at=1000 + 10 * i) == []
+
+    assert await detector.observe("alice", "t1", {"follower_count": followers + 5000}, recorded_at=1060) == ["follower_count"]
+    [event], cursor = await detector.feed("alice")
+    assert cursor is None
+    assert event["username"] == "alice" and event["metric"] == "follower_count" and event["rate"] == 500.0
+    # The per-type stream gets the same event under its own entry id.
+    [type_event], _ = await detector.feed()
+    assert {**type_event, "id": None} == {**event, "id": None}
+
+
+async def test_spike_after_a_flat_series_is_flagged(detector):
+    for i in range(6):
+        assert await detector.observe("alice", "t1", {"follower_count": 1000 + 100 * i}, recorded_at=1000 + 10 * i) == []
+    assert (await stats(detector))[2] == 0.0
+
+    assert await detector.observe("alice", "t1", {"follower_count": 6500}, recorded_at=1060) == ["follower_count"]
+
+
+async def test_spike_after_no_growth_is_flagged(detector):
+    # Hourly samples: one new follower stays within the ANOMALY_MIN_STD floor, a thousand don't.
+    for i in range(6):
+        assert await detector.observe("alice", "t1", {"follower_count": 1000}, recorded_at=3600 * i) == []
+
+    assert await detector.observe("alice", "t1", {"follower_count": 1001}, recorded_at=3600 * 6) == []
+    assert await detector.observe("alice", "t1", {"follower_count": 2000}, recorded_at=3600 * 7) == ["follower_count"]
@@ -0,0 +1,79 @@
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import httpx
+import orjson
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.db.dependencies import get_db
+from app.db.enums import TaskStatusEnum, TaskTypeEnum
+from app.db.history_cache import local_history_cache
+from app.db.redis import get_redis_binary_client, get_redis_client
+from app.main import app
+from app.models import InfluencerMetricsHistory, Task
+from app.services.influencer import InfluencerService
+
+pytestmark = pytest.mark.anyio
+HISTORY = "/api/v1/instagram/influencer_monitor/user_history/alice"
+
+
+@pytest.fixture
+async def client(engine, db, redis_client, cache_client):
+    factory = sessionmaker(bind=engine, autoflush=False)
+
+    def session():
+        session = factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    db.add(Task(id=str(uuid.uuid4()), task_type=TaskTypeEnum.influencer, username="alice", interval_seconds=3600, status=TaskStatusEnum.active))
+    start = datetime.utcnow() - timedelta(minutes=10)
+    for i in range(3):
+        db.add(InfluencerMetricsHistory(username="alice", user_id=1, follower_count=100 + i, recorded_at=start + timedelta(minutes=i)))
+    db.commit()
+
+    app.dependency_overrides.update({get_db: session, get_redis_client: lambda: redis_client, get_redis_binary_client: lambda: cache_client})
+    if local_history_cache:
+        local_history_cache.clear()
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            yield client
+    finally:
+        app.dependency_overrides.clear()
+
+
+async def test_history_and_conditional_requests(client):
+    response = await client.get(HISTORY)
+    assert response.status_code == 200
+    assert [row["follower_count"] for row in orjson.loads(response.content)["data"]["history"]] == [102, 101, 100]
+
+    cached = await client.get(HISTORY)
+    assert cached.content == response.content
+    not_modified = await client.get(HISTORY, headers={"If-None-Match": response.headers["ETag"]})
+    assert not_modified.status_code == 304
+
+
+async def test_slow_history_reads_dont_block_the_event_loop(client, monkeypatch):
+    query_history = InfluencerService.query_history
+
+    def slow_query_history(self, *args):
+        time.sleep(0.3)
+        return query_history(self, *args)
+
+    monkeypatch.setattr(InfluencerService, "query_history", slow_query_history)
+
+    async def health_done():
+        await asyncio.sleep(0.05)
+        assert (await client.get("/health")).status_code == 200
+        return time.perf_counter()
+
+    # /health is answered while the history reads are still waiting on the database.
+    started = time.perf_counter()
+    *responses, health_at = await asyncio.gather(*(client.get(HISTORY) for _ in range(4)), health_done())
+    assert all(response.status_code == 200 for response in responses)
+    assert health_at - started < 0.25
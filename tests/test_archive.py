@@ -0,0 +1,85 @@
+import os
+from datetime import date, datetime, timezone
+
+import orjson
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.archive import ArchiveWriter, list_segments, prune_archive
+from app.archive import replay
+from app.db.enums import TaskTypeEnum
+from app.models import InfluencerMetricsHistory
+
+DAY = 24 * 60 * 60
+T0 = datetime(2024, 1, 10, 12, tzinfo=timezone.utc).timestamp()
+
+
+def user_info(user_id: int, followers: int) -> bytes:
+    return orjson.dumps({"code": 200, "data": {"id": str(user_id), "follower_count": followers, "following_count": 1, "media_count": 2}})
+
+
+def naive(ts: float) -> datetime:
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None)
+
+
+def test_prune_archive_keeps_recent_days(tmp_path):
+    for day in ("20240101", "20240105", "20240110", "notaday"):
+        os.makedirs(tmp_path / day)
+
+    assert prune_archive(str(tmp_path), date(2024, 1, 6)) == 2
+    assert sorted(os.listdir(tmp_path)) == ["20240110", "notaday"]
+    assert prune_archive(str(tmp_path / "missing"), date(2024, 1, 6)) == 0
+
+
+def test_writer_prunes_on_day_roll(tmp_path):
+    writer = ArchiveWriter(str(tmp_path), 1 << 20, name="w", retention_days=3)
+    try:
+        for days in (0, 1, 2, 5):
+            writer.append("task", TaskTypeEnum.influencer, "alice", user_info(1, days), recorded_at=T0 + days * DAY)
+    finally:
+        writer.close()
+    assert sorted(os.listdir(tmp_path)) == ["20240112", "20240115"]
+
+
+@pytest.fixture
+def archive(tmp_path):
+    root = str(tmp_path / "archive")
+    writer = ArchiveWriter(root, 1 << 20, name="w")
+    try:
+        writer.append("t1", TaskTypeEnum.influencer, "alice", user_info(1, 100), recorded_at=T0)
+        writer.append("t1", TaskTypeEnum.influencer, "alice", user_info(1, 110), recorded_at=T0 + 30)
+        writer.append("t2", TaskTypeEnum.influencer, "bob", user_info(2, 200), recorded_at=T0)
+    finally:
+        writer.close()
+    [segment] = list_segments(root)
+    return segment
+
+
+@pytest.fixture
+def session_factory(engine, monkeypatch):
+    import app.db.session
+
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(app.db.session, "SessionLocal", factory)
+    return factory
+
+
+def test_replay_dry_run_builds_rows(archive, session_factory):
+    assert replay.replay_segment(archive) == (3, 3, 0)
+    with session_factory() as db:
+        assert db.query(InfluencerMetricsHistory).count() == 0
+
+
+def test_replay_write_skips_recorded_samples(archive, session_factory):
+    with session_factory() as db:
+        # The run's own row, written (and truncated to the second) a few seconds after the fetch.
+        db.add(InfluencerMetricsHistory(username="alice", user_id=1, follower_count=100, recorded_at=naive(T0 + 3)))
+        db.commit()
+
+    assert replay.replay_segment(archive, write=True) == (3, 3, 1)
+    # Replaying the same range again adds nothing.
+    assert replay.replay_segment(archive, write=True) == (3, 3, 3)
+
+    with session_factory() as db:
+        rows = db.query(InfluencerMetricsHistory.username, InfluencerMetricsHistory.follower_count).order_by(InfluencerMetricsHistory.username, InfluencerMetricsHistory.follower_count).all()
+    assert rows == [("alice", 100), ("alice", 110), ("bob", 200)]
@@ -0,0 +1,63 @@
+from datetime import datetime
+
+import pytest
+
+from app.services.influencer import HISTORY_COLUMNS, HISTORY_FIELDS
+from app.utils import cache_codec
+from app.utils.cache_codec import HEADER, MAGIC, HistoryCodec
+from app.utils.history import dump_history_response
+
+ROWS = [
+    (1_000_123, 167, 8000, "Discover what's new", datetime(2024, 1, 1, 12, 0, 30), 1.25),
+    (1_000_100, 167, 8000, "Discover what's new", datetime(2024, 1, 1, 12, 0, 0, 500), None),
+    (None, 166, 7999, None, datetime(2024, 1, 1, 11, 59, 30), 0.0),
+]
+
+
+def body(rows):
+    return dump_history_response("username", "alice", HISTORY_FIELDS, rows)
+
+
+@pytest.mark.parametrize("fmt", ["json", "columnar"])
+@pytest.mark.parametrize("compression", ["none", "zstd", "lz4"])
+def test_round_trip(fmt, compression):
+    codec = HistoryCodec("username", HISTORY_COLUMNS, fmt=fmt, compression=compression)
+    value = codec.encode(ROWS, body(ROWS))
+    assert value[0] == MAGIC
+    # Stored with the configured compression, not silently uncompressed.
+    assert value[3] == cache_codec.COMPRESSIONS[compression]
+    assert codec.decode("alice", value) == body(ROWS)
+
+
+def test_columnar_empty_history():
+    codec = HistoryCodec("username", HISTORY_COLUMNS, fmt="columnar")
+    assert codec.decode("alice", codec.encode([], body([]))) == body([])
+
+
+def test_compress_min_bytes():
+    codec = HistoryCodec("username", HISTORY_COLUMNS, compression="zstd", compress_min_bytes=1 << 20)
+    value = codec.encode(ROWS, body(ROWS))
+    assert HEADER.unpack_from(value)[3] == cache_codec.COMPRESSION_NONE
+    assert value[HEADER.size:] == body(ROWS)
+
+
+def test_other_versions_are_misses():
+    codec = HistoryCodec("username", HISTORY_COLUMNS)
+    value = codec.encode(ROWS, body(ROWS))
+    # Pre-versioning entries were the bare JSON body.
+    assert codec.decode("alice", body(ROWS)) is None
+    assert codec.decode("alice", bytes([MAGIC, cache_codec.CODEC_VERSION + 1]) + value[2:]) is None
+    assert codec.decode("alice", b"") is None
+
+
+def test_columnar_with_other_fields_is_a_miss():
+    value = HistoryCodec("username", HISTORY_COLUMNS[:-1], fmt="columnar").encode([row[:-1] for row in ROWS], b"")
+    assert HistoryCodec("username", HISTORY_COLUMNS, fmt="columnar").decode("alice", value) is None
+
+
+def test_missing_compressor_falls_back_to_none(monkeypatch):
+    monkeypatch.setattr(cache_codec, "zstandard", None)
+    codec = HistoryCodec("username", HISTORY_COLUMNS, compression="zstd")
+    value = codec.encode(ROWS, body(ROWS))
+    assert HEADER.unpack_from(value)[3] == cache_codec.COMPRESSION_NONE
+    assert codec.decode("alice", value) == body(ROWS)
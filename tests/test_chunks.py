@@ -0,0 +1,95 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fakeredis.aioredis import FakeRedis
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db.enums import TaskStatusEnum, TaskTypeEnum
+from app.models import InfluencerMetricsChunk, InfluencerMetricsHistory, Task
+from app.services.chunks import chunk_start
+from app.services.influencer import HISTORY_CHUNKS
+from app.utils.chunk_codec import decode_chunk, encode_chunk
+from app.worker import tasks
+
+DAY = datetime(2024, 1, 10)
+
+
+def sample(i, bio="bio", rate=1.5, whole_seconds=True):
+    recorded_at = DAY + timedelta(seconds=30 * i, microseconds=0 if whole_seconds else 123 * i)
+    return (1000 + 3 * i, 10, 5 + i // 10, bio, recorded_at, rate)
+
+
+@pytest.mark.parametrize("whole_seconds", [True, False])
+def test_chunk_round_trip(whole_seconds):
+    rows = [sample(i, whole_seconds=whole_seconds) for i in range(100)]
+    # Nulls, a text change and a counter going down.
+    rows[3] = (None, 10, 5, None, rows[3][4], None)
+    rows[50] = (900, 10, 9, "new bio", rows[50][4], 2.0)
+    assert decode_chunk(encode_chunk(HISTORY_CHUNKS.types, rows)) == rows
+
+
+def test_chunk_edge_cases():
+    assert decode_chunk(encode_chunk(HISTORY_CHUNKS.types, [])) == []
+    huge = [(2 ** 40, 0, 0, "", DAY, 0.0), (-2 ** 40, 0, 0, "", DAY + timedelta(days=365), 0.0)]
+    assert decode_chunk(encode_chunk(HISTORY_CHUNKS.types, huge)) == huge
+    # Chunks sealed before a column was appended read it as None.
+    old = encode_chunk(HISTORY_CHUNKS.types[:-1], [row[:-1] for row in huge])
+    assert decode_chunk(old, len(HISTORY_CHUNKS.fields)) == [row[:-1] + (None,) for row in huge]
+    with pytest.raises(ValueError):
+        decode_chunk(b"\x00" + old[1:])
+
+
+def add_rows(db, indexes):
+    for i in indexes:
+        follower_count, following_count, post_count, bio, recorded_at, rate = sample(i)
+        db.add(InfluencerMetricsHistory(username="alice", user_id=1, follower_count=follower_count, following_count=following_count,
+                                        post_count=post_count, bio=bio, recorded_at=recorded_at, engagement_rate=rate))
+    db.commit()
+
+
+def test_seal_merges_late_rows_into_the_chunk(db):
+    end_of_day = chunk_start(DAY) + timedelta(seconds=settings.CHUNK_SECONDS)
+    add_rows(db, range(0, 100, 2))
+    # A row in the next chunk isn't sealed yet.
+    db.add(InfluencerMetricsHistory(username="alice", user_id=1, follower_count=1, recorded_at=end_of_day + timedelta(minutes=1)))
+    db.commit()
+
+    assert HISTORY_CHUNKS.seal(db, "alice", end_of_day) == 50
+    # A late write for the sealed chunk is merged into it on the next run.
+    add_rows(db, range(1, 100, 2))
+    assert HISTORY_CHUNKS.seal(db, "alice", end_of_day) == 50
+
+    [chunk] = db.query(InfluencerMetricsChunk).all()
+    assert chunk.sample_count == 100 and chunk.first_recorded_at == DAY and chunk.last_recorded_at == sample(99)[4]
+    assert db.query(InfluencerMetricsHistory).count() == 1
+    history = HISTORY_CHUNKS.history(db, "alice", desc=False)
+    assert history[:-1] == [sample(i) for i in range(100)]
+    assert HISTORY_CHUNKS.history(db, "alice", since=sample(10)[4], until=sample(20)[4], desc=False) == [sample(i) for i in range(10, 20)]
+    assert HISTORY_CHUNKS.stats(db, "alice") == (101, end_of_day + timedelta(minutes=1))
+
+
+@pytest.fixture
+def sealer(engine, redis_server, monkeypatch):
+    monkeypatch.setattr(tasks, "SessionLocal", sessionmaker(bind=engine, autoflush=False))
+    monkeypatch.setattr(tasks, "new_redis_client", lambda binary=False: FakeRedis(server=redis_server, decode_responses=not binary))
+    return redis_server
+
+
+@pytest.mark.anyio
+async def test_seal_chunks_is_exclusive(sealer, db):
+    db.add(Task(id=str(uuid.uuid4()), task_type=TaskTypeEnum.influencer, username="alice", interval_seconds=30, status=TaskStatusEnum.active))
+    add_rows(db, range(10))
+    before = chunk_start(DAY) + timedelta(seconds=settings.CHUNK_SECONDS)
+
+    holder = FakeRedis(server=sealer, decode_responses=True)
+    lock = holder.lock(tasks.SEAL_LOCK_KEY, timeout=60)
+    assert await lock.acquire(blocking=False)
+    assert await tasks._seal_chunks(before) is None
+    assert db.query(InfluencerMetricsChunk).count() == 0
+
+    await lock.release()
+    assert await tasks._seal_chunks(before) == 10
+    assert db.query(InfluencerMetricsChunk).count() == 1
+    assert not await holder.exists(tasks.SEAL_LOCK_KEY)
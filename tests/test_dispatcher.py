@@ -0,0 +1,92 @@
+import fakeredis
+import pytest
+
+from app.worker import dispatcher
+from app.worker.dispatcher import ShardDispatcher, due_key, lease_key
+
+INTERVAL = 30
+
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def enqueued(monkeypatch):
+    enqueued = []
+
+    class FakeProcessTask:
+        @staticmethod
+        def delay(task_id, enqueued_at):
+            enqueued.append(task_id)
+
+    monkeypatch.setattr(dispatcher, "process_task", FakeProcessTask)
+    monkeypatch.setattr(dispatcher, "SessionLocal", lambda: type("Session", (), {"close": lambda self: None})())
+    monkeypatch.setattr(dispatcher, "get_scheduled_tasks", lambda db, interval_seconds, shards: [f"{interval_seconds}:{s}" for s in sorted(shards)])
+    return enqueued
+
+
+def test_leases_are_renewed_and_released_only_by_their_holder(client):
+    a = ShardDispatcher("a", client, shard_count=8)
+    a.rebalance(["a"])
+    assert a.leased == set(range(8))
+
+    b = ShardDispatcher("b", client, shard_count=8)
+    b.rebalance(["a", "b"])
+    # b's shards are still leased to a until a releases them.
+    assert b.leased == set()
+    a.rebalance(["a", "b"])
+    b.rebalance(["a", "b"])
+    assert a.leased and b.leased
+    assert a.leased | b.leased == set(range(8)) and not a.leased & b.leased
+
+    # A lease taken over by another node isn't renewed or released by the old holder.
+    shard = min(b.leased)
+    assert a._renew_lease(keys=[lease_key(shard)], args=["a", 10_000]) == 0
+    assert a._release_lease(keys=[lease_key(shard)], args=["a"]) == 0
+    assert client.get(lease_key(shard)) == "b"
+
+    b.shutdown()
+    assert not any(client.exists(lease_key(s)) for s in range(8) if s not in a.leased)
+
+
+def test_first_tick_seeds_due_times_within_one_interval(client, enqueued):
+    node = ShardDispatcher("a", client, shard_count=4)
+    node.rebalance(["a"])
+    assert node.claim_due(INTERVAL, [0, 1, 2, 3], now=1000.0) == []
+    due = {int(s): float(at) for s, at in client.hgetall(due_key(INTERVAL)).items()}
+    assert set(due) == {0, 1, 2, 3}
+    assert all(1000.0 <= at <= 1000.0 + INTERVAL for at in due.values())
+
+
+def test_due_shards_are_claimed_once_and_keep_their_cadence(client, enqueued):
+    node = ShardDispatcher("a", client, shard_count=2)
+    node.rebalance(["a"])
+    client.hset(due_key(INTERVAL), mapping={0: 1000.0, 1: 1020.0})
+
+    assert node.claim_due(INTERVAL, [0, 1], now=1010.0) == [0]
+    assert node.claim_due(INTERVAL, [0, 1], now=1010.0) == []
+    assert float(client.hget(due_key(INTERVAL), 0)) == 1030.0
+    # Ticks missed while no node held the shard aren't replayed.
+    assert node.claim_due(INTERVAL, [0, 1], now=1200.0) == [0, 1]
+    assert float(client.hget(due_key(INTERVAL), 0)) == 1230.0
+
+
+def test_shards_leased_elsewhere_are_not_claimed(client, enqueued):
+    node = ShardDispatcher("a", client, shard_count=2)
+    client.set(lease_key(0), "b")
+    client.set(lease_key(1), "a")
+    client.hset(due_key(INTERVAL), mapping={0: 0, 1: 0})
+    assert node.claim_due(INTERVAL, [0, 1], now=10.0) == [1]
+    assert float(client.hget(due_key(INTERVAL), 0)) == 0
+
+
+def test_dispatch_due_enqueues_claimed_shards(client, enqueued):
+    node = ShardDispatcher("a", client, shard_count=2)
+    node.rebalance(["a"])
+    assert node.dispatch_due(now=1000.0) == 0
+    assert enqueued == []
+    dispatched = node.dispatch_due(now=1000.0 + 7 * 24 * 3600)
+    assert dispatched == len(enqueued) > 0
+    assert f"{INTERVAL}:0" in enqueued and f"{INTERVAL}:1" in enqueued
@@ -0,0 +1,108 @@
+import asyncio
+import uuid
+
+import httpx
+import orjson
+import pytest
+
+from app.core.config import settings
+from app.db.enums import TaskStatusEnum, TaskTypeEnum
+from app.models.task import Task
+from app.services.engagement import EngagementEnricher, engagement_post_key, engagement_rate
+from app.services.refresh import finish_run, start_run
+from app.utils import tikhub
+
+pytestmark = pytest.mark.anyio
+
+POSTS = {"data": {"items": [{"code": "A"}, {"code": "B"}, {"code": "C"}]}}
+
+
+class Budget:
+    """Allows the first `allowed` requests."""
+
+    def __init__(self, allowed):
+        self.allowed = allowed
+
+    async def acquire(self):
+        self.allowed -= 1
+        return self.allowed >= 0
+
+
+@pytest.fixture
+def fetched(monkeypatch):
+    """Mock TikHub: the listing, and post details with likes = 100 * (index of the code in POSTS)."""
+    fetched = []
+
+    def handler(request):
+        if request.url.path == settings.TIKHUB_USER_POSTS_ENDPOINT:
+            return httpx.Response(200, json=POSTS)
+        code = request.url.params["url"].rstrip("/").rsplit("/", 1)[-1]
+        fetched.append(code)
+        return httpx.Response(200, json={"data": {"like_count": 100 * "ABC".index(code), "comment_count": 10}})
+
+    monkeypatch.setattr(tikhub, "TOKEN", "test")
+    monkeypatch.setattr(tikhub, "BASE_URL", "http://tikhub.test")
+    monkeypatch.setattr(tikhub, "transport", httpx.MockTransport(handler))
+    return fetched
+
+
+def add_post_task(db, post_code):
+    task = Task(id=str(uuid.uuid4()), task_type=TaskTypeEnum.post, post_code=post_code, interval_seconds=30, status=TaskStatusEnum.active)
+    db.add(task)
+    db.commit()
+    return task.id
+
+
+def test_engagement_rate():
+    assert engagement_rate(1000, [{"like_count": 90, "comment_count": 10}, {"like_count": None, "comment_count": 0}]) == 5.0
+    assert engagement_rate(0, [{"like_count": 1}]) is None
+    assert engagement_rate(1000, []) is None
+
+
+async def test_disabled_without_recent_posts(db, redis_client, fetched):
+    assert await EngagementEnricher(db, redis_client, Budget(10), recent_posts=0).engagement_rate("alice", 1000) is None
+    assert fetched == []
+
+
+async def test_posts_are_fetched_once_then_cached(db, redis_client, fetched):
+    enricher = EngagementEnricher(db, redis_client, Budget(10), recent_posts=3)
+    # (0 + 100 + 200 likes + 3 * 10 comments) / 3 posts / 1000 followers
+    assert await enricher.engagement_rate("alice", 1000) == 11.0
+    assert sorted(fetched) == ["A", "B", "C"]
+    assert orjson.loads(await redis_client.get(engagement_post_key("B"))) == {"like_count": 100, "comment_count": 10}
+
+    assert await enricher.engagement_rate("alice", 1000) == 11.0
+    assert len(fetched) == 3
+
+
+async def test_monitored_posts_reuse_the_monitor_result(db, redis_client, fetched):
+    task_id = add_post_task(db, "B")
+    await redis_client.set(f"fallback:{task_id}", orjson.dumps({"like_count": 5000, "comment_count": 0, "play_count": 1}))
+
+    assert await EngagementEnricher(db, redis_client, Budget(10), recent_posts=2).engagement_rate("alice", 1000) == round((10 + 5000) / 2 / 1000 * 100, 4)
+    assert fetched == ["A"]
+
+
+async def test_a_monitored_post_waits_for_its_run_in_flight(db, redis_client, fetched):
+    task_id = add_post_task(db, "A")
+    await redis_client.set(f"fallback:{task_id}", orjson.dumps({"like_count": 1, "comment_count": 0}))
+    assert await start_run(redis_client, task_id)
+
+    async def finish():
+        await asyncio.sleep(0.1)
+        await redis_client.set(f"fallback:{task_id}", orjson.dumps({"like_count": 700, "comment_count": 0}))
+        await finish_run(redis_client, task_id, "success")
+
+    finishing = asyncio.create_task(finish())
+    assert await EngagementEnricher(db, redis_client, Budget(10), recent_posts=1).engagement_rate("alice", 1000) == 70.0
+    await finishing
+    assert fetched == []
+
+
+async def test_budget_denials_leave_posts_out(db, redis_client, fetched):
+    # No token for the listing: no rate at all.
+    assert await EngagementEnricher(db, redis_client, Budget(0), recent_posts=3).engagement_rate("alice", 1000) is None
+    # Tokens for the listing and one post: the rate covers that post only.
+    assert await EngagementEnricher(db, redis_client, Budget(2), recent_posts=3).engagement_rate("alice", 1000) is not None
+    assert len(fetched) == 1
+    assert [await redis_client.exists(engagement_post_key(code)) for code in "ABC"].count(1) == 1
@@ -0,0 +1,14 @@
+from sqlalchemy import create_engine
+
+from scripts.explain_audit import audit
+
+
+def test_service_queries_use_indexes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/audit.db")
+    try:
+        results = audit(engine, monitors=200, samples=10)
+    finally:
+        engine.dispose()
+    assert results
+    failures = {name: problems for name, problems in results.items() if problems}
+    assert not failures, failures
@@ -0,0 +1,50 @@
+import uuid
+
+import pytest
+
+from app.db.enums import TaskStatusEnum, TaskTypeEnum
+from app.models import Task
+from app.services.influencer import InfluencerService
+
+METRICS = {"id": "1", "biography": "bio", "follower_count": 100, "following_count": 10, "media_count": 5}
+
+
+@pytest.fixture
+def service(db, redis_client, cache_client):
+    return InfluencerService(db, redis_client, cache_client)
+
+
+@pytest.fixture
+def task(db):
+    task = Task(id=str(uuid.uuid4()), task_type=TaskTypeEnum.influencer, username="alice", interval_seconds=30, status=TaskStatusEnum.active)
+    db.add(task)
+    db.commit()
+    return task
+
+
+@pytest.mark.anyio
+async def test_meta_seeded_before_a_write_is_not_counted_twice(service, task, cache_client):
+    await service.create_metrics_history("alice", METRICS, task)
+    await cache_client.delete(service.history_cache.meta_key("alice"))
+    # A read seeds the meta, already counting every stored sample ...
+    assert (await service.get_user_history_meta("alice"))["count"] == 1
+    # ... and the next write stores the new count instead of adding to it.
+    await service.create_metrics_history("alice", METRICS, task)
+    await service.create_metrics_history("alice", METRICS, task)
+    meta = await service.history_cache.get_meta("alice")
+    assert meta["count"] == 3 == len(service.query_history("alice"))
+    assert await cache_client.ttl(service.history_cache.meta_key("alice")) > 0
+
+
+@pytest.mark.anyio
+async def test_seed_does_not_overwrite_a_recorded_sample(service, task):
+    await service.create_metrics_history("alice", METRICS, task)
+    recorded = await service.history_cache.get_meta("alice")
+    # A seed computed before that sample arrives late.
+    await service.history_cache.seed_meta("alice", count=0, last=0, interval=30)
+    assert await service.history_cache.get_meta("alice") == recorded
+
+
+@pytest.mark.anyio
+async def test_meta_for_unknown_history(service):
+    assert await service.get_user_history_meta("nobody") is None
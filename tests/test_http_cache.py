@@ -0,0 +1,45 @@
+import time
+from email.utils import formatdate
+
+from app.utils.http_cache import history_cache_headers, is_not_modified
+
+META = {"count": 12, "last": 1_700_000_000.5, "interval": 60}
+
+
+def test_headers():
+    headers = history_cache_headers(META)
+    assert headers["ETag"] == 'W/"12-1700000000500"'
+    assert headers["Last-Modified"] == formatdate(META["last"], usegmt=True)
+    # The next sample was due long ago.
+    assert headers["Cache-Control"] == "max-age=0"
+
+
+def test_max_age_runs_until_next_sample():
+    headers = history_cache_headers({**META, "last": time.time() - 20})
+    assert headers["Cache-Control"] in ("max-age=39", "max-age=40")
+
+
+def test_no_meta_no_headers():
+    assert history_cache_headers(None) == {}
+    assert not is_not_modified({"if-none-match": "*"}, {})
+
+
+def test_if_none_match():
+    headers = history_cache_headers(META)
+    assert is_not_modified({"if-none-match": 'W/"12-1700000000500"'}, headers)
+    assert is_not_modified({"if-none-match": '"other", "12-1700000000500"'}, headers)
+    assert is_not_modified({"if-none-match": "*"}, headers)
+    assert not is_not_modified({"if-none-match": 'W/"11-1700000000500"'}, headers)
+
+
+def test_if_none_match_takes_precedence():
+    headers = history_cache_headers(META)
+    assert not is_not_modified({"if-none-match": '"stale"', "if-modified-since": headers["Last-Modified"]}, headers)
+
+
+def test_if_modified_since():
+    headers = history_cache_headers(META)
+    assert is_not_modified({"if-modified-since": headers["Last-Modified"]}, headers)
+    assert is_not_modified({"if-modified-since": formatdate(META["last"] + 60, usegmt=True)}, headers)
+    assert not is_not_modified({"if-modified-since": formatdate(META["last"] - 60, usegmt=True)}, headers)
+    assert not is_not_modified({"if-modified-since": "not a date"}, headers)
@@ -0,0 +1,33 @@
+import pytest
+
+from benchmarks.import_time import BUDGETS_MS, ENTRY_POINTS, LAZY, WORKER_FORBIDDEN, eager_imports, measure, total_ms
+
+ATTEMPTS = 3
+
+
+@pytest.fixture(scope="module")
+def imports():
+    return {name: measure(statement) for name, statement in ENTRY_POINTS.items()}
+
+
+def test_worker_does_not_import_the_web_stack(imports):
+    assert eager_imports(imports["worker"], WORKER_FORBIDDEN) == []
+
+
+@pytest.mark.parametrize("name", ENTRY_POINTS)
+def test_db_drivers_are_loaded_on_first_use(imports, name):
+    assert eager_imports(imports[name], LAZY) == []
+
+
+@pytest.mark.parametrize("name", ENTRY_POINTS)
+def test_import_time_stays_within_budget(imports, name):
+    # Best of a few runs: a single cold import is at the mercy of the machine.
+    totals = [total_ms(imports[name])]
+    while min(totals) > BUDGETS_MS[name] and len(totals) < ATTEMPTS:
+        totals.append(total_ms(measure(ENTRY_POINTS[name])))
+    assert min(totals) <= BUDGETS_MS[name], f"{name} imports in {min(totals):.0f} ms, over its {BUDGETS_MS[name]} ms budget"
+
+
+def test_eager_imports_matches_packages_not_prefixes():
+    imports = [(0, 0, 0, "fastapi"), (0, 0, 1, "fastapi.routing"), (0, 0, 0, "fastapi_utils"), (0, 0, 0, "sqlalchemy.dialects.mysql.base")]
+    assert eager_imports(imports, ("fastapi", "sqlalchemy.dialects.mysql")) == ["fastapi", "fastapi.routing", "sqlalchemy.dialects.mysql.base"]
@@ -0,0 +1,129 @@
+import time
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+from app.db.enums import TaskStatusEnum, TaskTypeEnum
+from app.models import InfluencerMetricsHistory, Task
+from app.services.influencer import LEADERBOARD_METRICS
+from app.services.leaderboards import WINDOWS, Leaderboard
+from scripts import rebuild_leaderboards
+
+pytestmark = pytest.mark.anyio
+
+HOUR = 3600
+NOW = 1_700_000_000
+
+
+@pytest.fixture
+def board(redis_client):
+    return Leaderboard(redis_client, TaskTypeEnum.influencer, "username", LEADERBOARD_METRICS)
+
+
+async def record(board, key, followers, at, posts=0):
+    await board.record(key, {"follower_count": followers, "post_count": posts}, at)
+
+
+async def scores(board, board_name, metric="follower_count"):
+    return {entry["username"]: entry["score"] for entry in await board.top(metric, board_name, limit=100)}
+
+
+async def test_boards_rank_by_growth_over_their_window(board):
+    # alice grows 500 in the last hour but is the smallest; carol is the largest but flat.
+    for key, start, growth in (("alice", 1000, 500), ("bob", 5000, 100), ("carol", 90000, 0)):
+        await record(board, key, start, NOW - 2 * HOUR)
+        await record(board, key, start + growth, NOW)
+
+    assert [entry["username"] for entry in await board.top("follower_count", "1h")] == ["alice", "bob", "carol"]
+    assert await scores(board, "1h") == {"alice": 500, "bob": 100, "carol": 0}
+    assert [entry["username"] for entry in await board.top("follower_count", "total")] == ["carol", "bob", "alice"]
+    assert await board.rank("follower_count", "1h", "bob") == {"rank": 2, "username": "bob", "score": 100}
+    assert await board.rank("follower_count", "1h", "nobody") is None
+
+
+async def test_growth_is_measured_from_the_last_sample_before_the_window(board):
+    await record(board, "alice", 1000, NOW - 3 * HOUR)
+    await record(board, "alice", 1100, NOW - 90 * 60)
+    await record(board, "alice", 1150, NOW - 30 * 60)
+    await record(board, "alice", 1300, NOW)
+    # 1h: from the sample at -90 min, the latest one at the window start; 24h: from the first.
+    assert (await scores(board, "1h"))["alice"] == 200
+    assert (await scores(board, "24h"))["alice"] == 300
+
+    # An hour later the window has rolled past the -30 min sample.
+    await record(board, "alice", 1320, NOW + HOUR)
+    assert (await scores(board, "1h"))["alice"] == 20
+
+
+async def test_a_monitor_younger_than_the_window_is_measured_from_its_first_sample(board):
+    await record(board, "alice", 1000, NOW - 10 * 60)
+    await record(board, "alice", 1040, NOW)
+    assert (await scores(board, "7d"))["alice"] == 40
+
+
+async def test_samples_are_trimmed_to_the_longest_window_and_an_anchor(board, redis_client):
+    for day in range(10):
+        await record(board, "alice", 1000 + day, NOW + day * 86400)
+    samples = await redis_client.zrange(board.samples_key("alice"), 0, -1, withscores=True)
+    # Days 2-9 (the last 7 days, inclusive) plus day 1 as the anchor before them.
+    assert [int((at - NOW) // 86400) for _, at in samples] == list(range(1, 10))
+    assert (await scores(board, "7d"))["alice"] == 7
+
+
+async def test_monitors_that_stop_reporting_expire(board):
+    await record(board, "alice", 1000, NOW)
+    await record(board, "bob", 2000, NOW)
+    # bob keeps reporting; alice's 1h entry lapses and is dropped on bob's next ingest.
+    await record(board, "bob", 2100, NOW + 2 * HOUR)
+    assert set(await scores(board, "1h")) == {"bob"}
+    assert set(await scores(board, "24h")) == {"alice", "bob"}
+
+    await board.expire(NOW + 8 * 86400 + 1)
+    for name in WINDOWS:
+        assert await scores(board, name) == {}
+
+
+async def test_negative_growth_and_ties(board):
+    for key, start, end in (("alice", 1000, 900), ("bob", 1000, 1050), ("carol", 1000, 1050), ("dave", 1000, 1000)):
+        await record(board, key, start, NOW - 2 * HOUR)
+        await record(board, key, end, NOW)
+
+    assert await scores(board, "1h") == {"alice": -100, "bob": 50, "carol": 50, "dave": 0}
+    top = [entry["username"] for entry in await board.top("follower_count", "1h")]
+    # Ties share no rank: they are ordered by key, as Redis orders equal scores.
+    assert top == ["carol", "bob", "dave", "alice"]
+    assert (await board.rank("follower_count", "1h", "alice"))["rank"] == 4
+    assert [entry["rank"] for entry in await board.top("follower_count", "1h", limit=2, offset=2)] == [3, 4]
+
+
+async def dump(redis_client):
+    keys = sorted([key async for key in redis_client.scan_iter(match="leaderboard*")])
+    return {key: await redis_client.zrange(key, 0, -1, withscores=True) for key in keys}
+
+
+async def test_rebuild_reproduces_live_recording(board, db, engine, redis_client, monkeypatch):
+    from sqlalchemy.orm import sessionmaker
+
+    now = int(time.time())
+    history = {
+        "alice": [(now - 5 * HOUR, 1000, 10), (now - 2 * HOUR, 1200, 11), (now - 20 * 60, 1250, 11)],
+        "bob": [(now - 30 * HOUR, 500, 3), (now - 3 * HOUR, 480, 3), (now - 60, 700, 4)],
+        "carol": [(now - 10 * 60, 99, 1)],
+    }
+    for key, samples in history.items():
+        db.add(Task(id=str(uuid.uuid4()), task_type=TaskTypeEnum.influencer, username=key, interval_seconds=60, status=TaskStatusEnum.active))
+        for at, followers, posts in samples:
+            recorded_at = datetime.fromtimestamp(at, timezone.utc).replace(tzinfo=None)
+            db.add(InfluencerMetricsHistory(user_id=1, username=key, follower_count=followers, following_count=0, post_count=posts, recorded_at=recorded_at))
+            await record(board, key, followers, at, posts)
+    db.commit()
+    live = await dump(redis_client)
+    assert live
+
+    monkeypatch.setattr(rebuild_leaderboards, "SessionLocal", sessionmaker(bind=engine))
+    monkeypatch.setattr(rebuild_leaderboards, "new_redis_client", lambda: redis_client)
+    await board.clear()
+    await rebuild_leaderboards.rebuild([TaskTypeEnum.influencer])
+
+    assert await dump(redis_client) == live
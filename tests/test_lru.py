@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+
+from app.db.history_cache import HistoryCache, listen_for_invalidations
+from app.services.influencer import HISTORY_COLUMNS
+from app.utils import lru
+from app.utils.lru import ByteLRUCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(lru.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_evicts_least_recently_used_by_bytes(clock):
+    cache = ByteLRUCache(100)
+    cache.set("a", "A", 40, ttl=60)
+    cache.set("b", "B", 40, ttl=60)
+    assert cache.get("a") == "A"
+
+    cache.set("c", "C", 40, ttl=60)
+    assert cache.get("b") is None
+    assert cache.get("a") == "A" and cache.get("c") == "C"
+    assert cache.size == 80
+    assert cache.stats()["evictions"] == 1
+
+
+def test_replacing_a_key_adjusts_the_size(clock):
+    cache = ByteLRUCache(100)
+    cache.set("a", "old", 60, ttl=60)
+    cache.set("a", "new", 30, ttl=60)
+    assert cache.get("a") == "new"
+    assert cache.size == 30
+
+
+def test_oversized_value_is_not_kept_and_drops_the_old_one(clock):
+    cache = ByteLRUCache(100)
+    cache.set("a", "small", 10, ttl=60)
+    cache.set("a", "huge", 101, ttl=60)
+    assert cache.get("a") is None
+    assert cache.size == 0
+
+
+def test_entries_expire(clock):
+    cache = ByteLRUCache(100)
+    cache.set("a", "A", 10, ttl=5)
+    clock[0] += 4.9
+    assert cache.get("a") == "A"
+    clock[0] += 0.2
+    assert cache.get("a") is None
+    assert cache.size == 0
+
+
+def test_delete_clear_and_stats(clock):
+    cache = ByteLRUCache(100)
+    assert cache.stats()["hit_ratio"] is None
+    cache.set("a", "A", 10, ttl=60)
+    cache.set("b", "B", 20, ttl=60)
+    cache.delete("a", "missing")
+    assert cache.get("a") is None and cache.get("b") == "B"
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_ratio": 0.5, "entries": 1, "bytes": 20, "max_bytes": 100, "evictions": 0}
+
+    cache.clear()
+    assert cache.size == 0 and cache.get("b") is None
+
+
+@pytest.mark.anyio
+async def test_recorded_sample_drops_the_local_copy(redis_client, cache_client):
+    local = ByteLRUCache(1 << 20)
+    cache = HistoryCache(cache_client, "user_history", "username", HISTORY_COLUMNS, local=local)
+    await cache.set("alice", [], b"[]", ttl=60)
+    assert local.get("user_history:alice") == b"[]"
+
+    listener = asyncio.create_task(listen_for_invalidations(redis_client, local))
+    try:
+        # The listener starts by clearing the tier once subscribed.
+        while local.stats()["entries"]:
+            await asyncio.sleep(0.01)
+        local.set("user_history:alice", b"[]", 2, ttl=60)
+        local.set("user_history:bob", b"[]", 2, ttl=60)
+
+        await cache.record_sample("alice", None)
+        for _ in range(100):
+            if local.get("user_history:alice") is None:
+                break
+            await asyncio.sleep(0.01)
+        assert local.get("user_history:alice") is None
+        assert local.get("user_history:bob") == b"[]"
+    finally:
+        listener.cancel()
+
+
+def test_a_fill_read_before_an_invalidation_is_dropped(clock):
+    cache = ByteLRUCache(100)
+    generation = cache.generation("a")
+    cache.delete("a")
+    cache.set("a", "stale", 10, ttl=60, generation=generation)
+    assert cache.get("a") is None
+
+    generation = cache.generation("a")
+    cache.clear()
+    cache.set("a", "stale", 10, ttl=60, generation=generation)
+    assert cache.get("a") is None
+
+    # Invalidating other keys doesn't matter, unless they share the key's slot.
+    generation = cache.generation("a")
+    cache.delete(next(key for key in map(str, range(10_000)) if cache._slot(key) != cache._slot("a")))
+    cache.set("a", "fresh", 10, ttl=60, generation=generation)
+    assert cache.get("a") == "fresh"
+
+
+@pytest.mark.anyio
+async def test_an_invalidation_during_the_redis_read_is_not_undone(cache_client):
+    local = ByteLRUCache(1 << 20)
+    cache = HistoryCache(cache_client, "user_history", "username", HISTORY_COLUMNS, local=local)
+    await cache.set("alice", [], b"[]", ttl=60)
+    await cache_client.hset("user_history_meta:alice", mapping={"count": 1, "last": 1.0, "interval": 30})
+    local.clear()
+
+    get, hgetall = cache_client.get, cache_client.hgetall
+
+    async def get_then_invalidate(name):
+        value = await get(name)
+        # A sample is recorded and the listener drops the key while the read is in flight.
+        local.delete("user_history:alice", "user_history_meta:alice")
+        return value
+
+    async def hgetall_then_invalidate(name):
+        value = await hgetall(name)
+        local.delete("user_history:alice", "user_history_meta:alice")
+        return value
+
+    cache.client.get, cache.client.hgetall = get_then_invalidate, hgetall_then_invalidate
+    assert await cache.get("alice") == b"[]"
+    assert await cache.get_meta("alice") == {"count": 1, "last": 1.0, "interval": 30}
+    assert local.get("user_history:alice") is None
+    assert local.get("user_history_meta:alice") is None
+
+    # Without an invalidation in between, reads fill the local tier as before.
+    cache.client.get, cache.client.hgetall = get, hgetall
+    await cache.get("alice")
+    await cache.get_meta("alice")
+    assert local.get("user_history:alice") == b"[]"
+    assert local.get("user_history_meta:alice")["count"] == 1
@@ -0,0 +1,83 @@
+import json
+import uuid
+
+import fakeredis
+import httpx
+import pytest
+from fakeredis.aioredis import FakeRedis
+from sqlalchemy.orm import sessionmaker
+
+from app.db.enums import RunOutcomeEnum, TaskStatusEnum, TaskTypeEnum
+from app.models import InfluencerMetricsHistory, Task
+from app.services.task_runs import PENDING_RUNS_KEY
+from app.utils import tikhub
+from app.worker import processing
+from app.worker.tasks import process_task
+
+USER_INFO = {"code": 200, "data": {"id": "1", "biography": "bio", "follower_count": 100, "following_count": 10, "media_count": 5}}
+
+
+@pytest.fixture
+def clients(engine, redis_server, monkeypatch):
+    """
+    Runs the worker against the test database, fakeredis and a mock TikHub,
+    recording every Redis client it creates.
+    """
+    clients = []
+
+    class TrackedRedis(FakeRedis):
+        closed = False
+
+        async def aclose(self, *args, **kwargs):
+            self.closed = True
+            await super().aclose(*args, **kwargs)
+
+    def new_redis_client(binary=False):
+        clients.append(TrackedRedis(server=redis_server, decode_responses=not binary))
+        return clients[-1]
+
+    monkeypatch.setattr(processing, "SessionLocal", sessionmaker(bind=engine, autoflush=False))
+    monkeypatch.setattr(processing, "new_redis_client", new_redis_client)
+    monkeypatch.setattr(tikhub, "TOKEN", "test")
+    monkeypatch.setattr(tikhub, "BASE_URL", "http://tikhub.test")
+    monkeypatch.setattr(tikhub, "transport", httpx.MockTransport(lambda request: httpx.Response(200, json=USER_INFO)))
+    return clients
+
+
+def test_each_run_uses_and_closes_its_own_clients(clients, db, redis_server):
+    task = Task(id=str(uuid.uuid4()), task_type=TaskTypeEnum.influencer, username="alice", interval_seconds=30, status=TaskStatusEnum.active)
+    db.add(task)
+    db.commit()
+
+    # Each call is its own asyncio.run, as on a Celery worker.
+    process_task(task.id)
+    process_task(task.id)
+
+    assert db.query(InfluencerMetricsHistory).filter_by(username="alice").count() == 2
+    # A decoding and a binary client per run, none reused across loops.
+    assert len(clients) == 4 and all(client.closed for client in clients)
+
+    redis = fakeredis.FakeRedis(server=redis_server, decode_responses=True)
+    runs = [json.loads(run) for run in redis.lrange(PENDING_RUNS_KEY, 0, -1)]
+    assert [run["outcome"] for run in runs] == [RunOutcomeEnum.success.value] * 2
+    assert redis.hget("user_history_meta:alice", "count") == "2"
+
+
+def test_a_throttled_run_records_no_sample(clients, db, redis_server, monkeypatch):
+    task = Task(id=str(uuid.uuid4()), task_type=TaskTypeEnum.influencer, username="alice", interval_seconds=30, status=TaskStatusEnum.active)
+    db.add(task)
+    db.commit()
+    process_task(task.id)
+
+    async def exhausted(self, max_wait=0):
+        return False
+
+    monkeypatch.setattr(processing.RateBudget, "acquire", exhausted)
+    # The fallback from the first run is still cached, but isn't stored as a new sample.
+    process_task(task.id)
+
+    assert db.query(InfluencerMetricsHistory).filter_by(username="alice").count() == 1
+    redis = fakeredis.FakeRedis(server=redis_server, decode_responses=True)
+    runs = [json.loads(run) for run in redis.lrange(PENDING_RUNS_KEY, 0, -1)]
+    assert [run["outcome"] for run in runs] == [RunOutcomeEnum.success.value, RunOutcomeEnum.throttled.value]
+    assert json.loads(redis.get(f"run_last:{task.id}"))["outcome"] == RunOutcomeEnum.throttled.value
@@ -0,0 +1,109 @@
+import asyncio
+import contextvars
+import threading
+import time
+
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.utils.profiler import ProfilingMiddleware, SamplingProfiler, profile_thread, _request_profiler
+
+TOKEN = "s3cret"
+
+
+@pytest.fixture(autouse=True)
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "PROFILE_SAMPLE_RATE", 0.0)
+
+
+def frame_names(path):
+    document = orjson.loads(open(path, "rb").read())
+    frames = document["shared"]["frames"]
+    return {frames[i]["name"] for profile in document["profiles"] for stack in profile["samples"] for i in stack}
+
+
+def spin_profiled():
+    time.sleep(0.05)
+
+
+def spin_other():
+    time.sleep(0.05)
+
+
+async def run_profiled():
+    profiler = SamplingProfiler("request", "profiled", interval_ms=1, task=asyncio.current_task()).start()
+    for _ in range(5):
+        spin_profiled()
+        await asyncio.sleep(0)
+    return profiler.stop()
+
+
+async def run_other():
+    for _ in range(5):
+        spin_other()
+        await asyncio.sleep(0)
+
+
+def test_samples_only_the_profiled_task():
+    async def main():
+        path, _ = await asyncio.gather(run_profiled(), run_other())
+        return path
+
+    names = frame_names(asyncio.run(main()))
+    assert "spin_profiled" in names
+    assert "spin_other" not in names
+
+
+def test_profile_thread_adds_threadpool_work():
+    def work():
+        with profile_thread():
+            spin_profiled()
+
+    def bystander():
+        spin_other()
+
+    profiler = SamplingProfiler("request", "threads", interval_ms=1).start()
+    token = _request_profiler.set(profiler)
+    try:
+        threads = [threading.Thread(target=contextvars.copy_context().run, args=(work,)), threading.Thread(target=bystander)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        _request_profiler.reset(token)
+    names = frame_names(profiler.stop())
+    assert "spin_profiled" in names
+    assert "spin_other" not in names
+
+
+@pytest.mark.parametrize("headers, admin_token, wanted", [
+    ({"x-profile": "1"}, "", False),
+    ({"x-profile": "1"}, TOKEN, False),
+    ({"x-profile": "1", "x-admin-token": "wrong"}, TOKEN, False),
+    ({"x-profile": "1", "x-admin-token": TOKEN}, "", False),
+    ({"x-profile": "1", "x-admin-token": TOKEN}, TOKEN, True),
+    ({"x-profile": "0", "x-admin-token": TOKEN}, TOKEN, False),
+])
+def test_profile_header_needs_the_admin_token(monkeypatch, headers, admin_token, wanted):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", admin_token)
+    scope = {"headers": [(name.encode(), value.encode()) for name, value in headers.items()]}
+    assert ProfilingMiddleware._wanted(scope) is wanted
+
+
+def test_admin_endpoints_need_the_admin_token(monkeypatch):
+    from app.main import app
+
+    client = TestClient(app)
+    assert client.get("/api/v1/admin/profiles").status_code == 403
+    assert client.get("/api/v1/admin/profiles", headers={"X-Admin-Token": TOKEN}).status_code == 403
+
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", TOKEN)
+    assert client.get("/api/v1/admin/profiles", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert client.get("/api/v1/admin/profiles/missing.speedscope.json").status_code == 403
+    response = client.get("/api/v1/admin/profiles", headers={"X-Admin-Token": TOKEN})
+    assert response.status_code == 200
+    assert response.json()["data"]["profiles"] == []
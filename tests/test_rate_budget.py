@@ -0,0 +1,51 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.rate_budget import RateBudget
+
+pytestmark = pytest.mark.anyio
+
+
+async def take(budget, count):
+    return [await budget.acquire(max_wait=0) for _ in range(count)]
+
+
+async def test_burst_then_exhausted(redis_client):
+    budget = RateBudget(redis_client, key="budget:test", rate=1, burst=3)
+    assert await take(budget, 4) == [True, True, True, False]
+
+
+async def test_tokens_refill_at_the_rate(redis_client):
+    budget = RateBudget(redis_client, key="budget:test", rate=20, burst=2)
+    assert await take(budget, 3) == [True, True, False]
+    await asyncio.sleep(0.06)
+    assert await take(budget, 2) == [True, False]
+    # Refills never exceed the burst.
+    await asyncio.sleep(0.3)
+    assert await take(budget, 3) == [True, True, False]
+
+
+async def test_acquire_waits_for_a_token(redis_client):
+    budget = RateBudget(redis_client, key="budget:test", rate=10, burst=1)
+    assert await budget.acquire(max_wait=0)
+    started = time.perf_counter()
+    assert await budget.acquire(max_wait=1)
+    assert 0.05 < time.perf_counter() - started < 0.5
+
+
+async def test_workers_share_one_bucket_per_key(redis_server):
+    from fakeredis.aioredis import FakeRedis
+
+    workers = [RateBudget(FakeRedis(server=redis_server), key="budget:test", rate=1, burst=4) for _ in range(3)]
+    taken = [await worker.acquire(max_wait=0) for _ in range(2) for worker in workers]
+    assert taken.count(True) == 4
+    # Another key has its own bucket.
+    assert await RateBudget(FakeRedis(server=redis_server), key="budget:other", rate=1, burst=4).acquire(max_wait=0)
+
+
+async def test_zero_rate_allows_everything(redis_client):
+    budget = RateBudget(redis_client, key="budget:test", rate=0, burst=1)
+    assert await take(budget, 5) == [True] * 5
+    assert not await redis_client.exists("budget:test")
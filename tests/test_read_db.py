@@ -0,0 +1,34 @@
+import time
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+
+import app.db.session
+from app.db.dependencies import READ_AFTER_HEADER, get_db, get_read_db
+
+
+@pytest.fixture
+def client():
+    api = FastAPI()
+
+    @api.get("/")
+    def sessions(db=Depends(get_db), read_db=Depends(get_read_db)):
+        return {"shared": db is read_db, "read_url": str(read_db.get_bind().url)}
+
+    return TestClient(api)
+
+
+def test_read_db_shares_the_primary_session_without_replicas(client):
+    assert client.get("/").json()["shared"] is True
+
+
+def test_read_db_uses_a_replica_when_configured(client, monkeypatch):
+    replica = create_engine("sqlite:///replica.db")
+    monkeypatch.setattr(app.db.session, "get_replica_engines", lambda: (replica,))
+    monkeypatch.setattr(app.db.session, "_replica_cycle", None)
+
+    assert client.get("/").json() == {"shared": False, "read_url": "sqlite:///replica.db"}
+    # Reading right after a write stays on the primary session.
+    assert client.get("/", headers={READ_AFTER_HEADER: str(time.time())}).json()["shared"] is True
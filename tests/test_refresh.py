@@ -0,0 +1,99 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.core.config import settings
+from app.services.refresh import RefreshCoordinator, finish_run, inflight_key, start_run
+
+pytestmark = pytest.mark.anyio
+
+TASK_ID = "task-1"
+
+
+@pytest.fixture
+def coordinator(redis_client, monkeypatch):
+    """A coordinator whose enqueued runs are recorded with the thread they were sent from."""
+    coordinator = RefreshCoordinator(redis_client)
+    coordinator.enqueued = []
+    monkeypatch.setattr(coordinator, "enqueue", lambda task_id, after_seq: coordinator.enqueued.append((task_id, after_seq, threading.get_ident())))
+    return coordinator
+
+
+async def run(redis_client, outcome="success", delay=0.0, after_seq=None):
+    """What a worker does for one run."""
+    await asyncio.sleep(delay)
+    assert await start_run(redis_client, TASK_ID, after_seq)
+    await finish_run(redis_client, TASK_ID, outcome)
+
+
+async def test_concurrent_refreshes_collapse_into_one_run(coordinator):
+    results = await asyncio.gather(*(coordinator.request(TASK_ID) for _ in range(10)))
+    assert len(coordinator.enqueued) == 1
+    assert {result["state"] for result in results} == {"queued"}
+    assert {result["after_seq"] for result in results} == {0}
+    # send_task blocks, so it isn't called on the event loop's thread.
+    assert coordinator.enqueued[0][2] != threading.get_ident()
+
+
+async def test_a_refresh_during_the_cooldown_is_refused(coordinator, redis_client):
+    await coordinator.request(TASK_ID)
+    await run(redis_client, after_seq=0)
+    result = await coordinator.request(TASK_ID)
+    assert result["state"] == "cooldown" and 0 < result["retry_after"] <= settings.REFRESH_COOLDOWN_SECONDS
+    assert len(coordinator.enqueued) == 1
+
+
+async def test_waiters_get_the_run_result_through_pubsub(coordinator, redis_client):
+    worker = asyncio.create_task(run(redis_client, "fallback", delay=0.1, after_seq=0))
+    waiters = [coordinator.request(TASK_ID, wait=5) for _ in range(3)]
+    results = await asyncio.gather(*waiters)
+    await worker
+    assert all(result == {"task_id": TASK_ID, "state": "done", "after_seq": 0, "run_seq": 1, "outcome": "fallback"} for result in results)
+    assert await coordinator.status(TASK_ID, 0) == results[0]
+    assert len(coordinator.enqueued) == 1
+
+
+async def test_a_scheduled_run_finishing_first_satisfies_the_refresh(coordinator, redis_client):
+    result = await coordinator.request(TASK_ID)
+    await run(redis_client)
+    # The refresh's own run then has nothing left to do.
+    assert not await start_run(redis_client, TASK_ID, result["after_seq"])
+    assert (await coordinator.status(TASK_ID, result["after_seq"]))["state"] == "done"
+
+
+async def test_wait_times_out_with_the_inflight_state(coordinator):
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    result = await coordinator.request(TASK_ID, wait=0.2)
+    assert 0.2 <= loop.time() - started < 1
+    assert result == {"task_id": TASK_ID, "state": "queued", "after_seq": 0}
+    assert await coordinator.wait(TASK_ID, 0, 0.05) is None
+
+
+async def test_an_expired_claim_is_reclaimed(coordinator, redis_client):
+    await coordinator.request(TASK_ID)
+    # The queued run was lost (e.g. its worker died): the claim and the cooldown lapse.
+    await redis_client.pexpire(inflight_key(TASK_ID), 10)
+    await redis_client.pexpire(f"refresh_cooldown:{TASK_ID}", 10)
+    await asyncio.sleep(0.05)
+    assert (await coordinator.request(TASK_ID))["state"] == "queued"
+    assert len(coordinator.enqueued) == 2
+
+
+async def test_an_expired_running_claim_lets_the_next_run_start(redis_client):
+    assert await start_run(redis_client, TASK_ID)
+    assert not await start_run(redis_client, TASK_ID)
+    await redis_client.pexpire(inflight_key(TASK_ID), 10)
+    await asyncio.sleep(0.05)
+    assert await start_run(redis_client, TASK_ID)
+
+
+async def test_a_failed_enqueue_releases_the_claim(coordinator, redis_client, monkeypatch):
+    def unreachable(task_id, after_seq):
+        raise ConnectionError("broker down")
+
+    monkeypatch.setattr(coordinator, "enqueue", unreachable)
+    with pytest.raises(ConnectionError):
+        await coordinator.request(TASK_ID)
+    assert not await redis_client.exists(inflight_key(TASK_ID), f"refresh_cooldown:{TASK_ID}")
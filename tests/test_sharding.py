@@ -0,0 +1,87 @@
+import uuid
+from collections import Counter
+
+import fakeredis
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.db.enums import TaskStatusEnum, TaskTypeEnum
+from app.models.task import Task
+from app.utils.sharding import SHARD_COUNT, HashRing, shard_for
+from app.worker import dispatcher
+from app.worker.dispatcher import ShardDispatcher, check_task_shards
+from scripts.reshard_tasks import reshard
+
+NODES = [f"node-{i}" for i in range(4)]
+
+
+def test_shard_for_is_stable_crc32():
+    # SELECT CRC32('task-1') returns 3386884591 on MySQL.
+    assert shard_for("task-1") == 3386884591 % 64
+    assert shard_for("task-1") == shard_for("task-1")
+
+
+def test_every_shard_has_one_owner_independent_of_node_order():
+    ring = HashRing(NODES)
+    assert [ring.owner(s) for s in range(64)] == [HashRing(reversed(NODES)).owner(s) for s in range(64)]
+    assigned = [s for node in NODES for s in ring.shards_for(node, 64)]
+    assert sorted(assigned) == list(range(64))
+
+
+def test_shards_are_spread_over_the_nodes():
+    counts = Counter(HashRing(NODES).owner(s) for s in range(1024))
+    assert set(counts) == set(NODES)
+    assert max(counts.values()) < 2 * 1024 / len(NODES)
+
+
+def test_a_joining_node_only_takes_shards():
+    before = HashRing(NODES)
+    after = HashRing(NODES + ["node-new"])
+    moved = [s for s in range(1024) if before.owner(s) != after.owner(s)]
+    assert moved and all(after.owner(s) == "node-new" for s in moved)
+
+
+def test_empty_ring():
+    assert HashRing([]).owner(0) is None
+    assert HashRing([]).shards_for("node-0", 8) == []
+
+
+def add_tasks(db, count):
+    ids = [str(uuid.uuid4()) for _ in range(count)]
+    db.add_all(Task(id=task_id, task_type=TaskTypeEnum.influencer, username=task_id, interval_seconds=30, status=TaskStatusEnum.active) for task_id in ids)
+    db.commit()
+    return ids
+
+
+def test_tasks_are_stored_in_their_shard(db):
+    ids = add_tasks(db, 20)
+    assert dict(db.query(Task.id, Task.shard).all()) == {task_id: shard_for(task_id) for task_id in ids}
+    assert check_task_shards(db) is None
+
+
+@pytest.mark.parametrize("shard_count", [8, 128])
+def test_a_changed_shard_count_is_refused_until_tasks_are_resharded(db, engine, monkeypatch, shard_count):
+    ids = add_tasks(db, 50)
+    assert check_task_shards(db, shard_count)
+    monkeypatch.setattr(dispatcher, "SessionLocal", sessionmaker(bind=engine))
+    node = ShardDispatcher("a", fakeredis.FakeRedis(decode_responses=True), shard_count=shard_count)
+    with pytest.raises(RuntimeError, match="reshard_tasks"):
+        node.check_shards()
+
+    moved = reshard(db, shard_count, batch_size=7)
+    assert moved == sum(1 for task_id in ids if shard_for(task_id, shard_count) != shard_for(task_id))
+    assert check_task_shards(db, shard_count) is None
+    node.check_shards()
+    db.expire_all()
+    assert dict(db.query(Task.id, Task.shard).all()) == {task_id: shard_for(task_id, shard_count) for task_id in ids}
+    # Re-running moves nothing; going back restores the original shards.
+    assert reshard(db, shard_count) == 0
+    reshard(db, SHARD_COUNT)
+    assert check_task_shards(db) is None
+
+
+def test_check_finds_tasks_past_the_shard_count(db):
+    add_tasks(db, 3)
+    db.query(Task).update({Task.shard: SHARD_COUNT})
+    db.commit()
+    assert "past the shard count" in check_task_shards(db)
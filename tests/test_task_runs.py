@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+import fakeredis
+import pytest
+
+from app.db.enums import RunOutcomeEnum, TaskTypeEnum
+from app.models.task_run import TaskRun
+from app.services import task_runs
+from app.services.task_runs import FLUSH_LOCK_KEY, PENDING_RUNS_KEY, flush_task_runs, percentiles, record_run
+
+pytestmark = pytest.mark.anyio
+
+
+async def record(redis_client, count):
+    for i in range(count):
+        await record_run(redis_client, {
+            "task_id": f"task-{i}",
+            "task_type": TaskTypeEnum.influencer.value,
+            "started_at": 1_700_000_000 + i,
+            "outcome": RunOutcomeEnum.success.value,
+            "total_ms": 10 + i,
+        })
+
+
+async def test_flush_moves_runs_in_batches(db, redis_client):
+    await record(redis_client, 5)
+
+    assert await flush_task_runs(db, redis_client, batch_size=2) == 5
+    assert await redis_client.llen(PENDING_RUNS_KEY) == 0
+    assert [task_id for task_id, in db.query(TaskRun.task_id).order_by(TaskRun.id)] == [f"task-{i}" for i in range(5)]
+    assert await flush_task_runs(db, redis_client) == 0
+
+
+async def test_failed_insert_keeps_the_batch(db, redis_client, monkeypatch):
+    await record(redis_client, 3)
+
+    def fail(*args):
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(db, "bulk_insert_mappings", fail)
+    with pytest.raises(RuntimeError):
+        await flush_task_runs(db, redis_client)
+    assert await redis_client.llen(PENDING_RUNS_KEY) == 3
+    assert not await redis_client.exists(FLUSH_LOCK_KEY)
+
+    monkeypatch.undo()
+    db.rollback()
+    assert await flush_task_runs(db, redis_client) == 3
+    assert db.query(TaskRun).count() == 3
+
+
+async def test_flush_skips_while_another_holds_the_lock(db, redis_client):
+    await record(redis_client, 2)
+    lock = redis_client.lock(FLUSH_LOCK_KEY, timeout=60)
+    assert await lock.acquire(blocking=False)
+
+    assert await flush_task_runs(db, redis_client) == 0
+    assert await redis_client.llen(PENDING_RUNS_KEY) == 2
+
+    await lock.release()
+    assert await flush_task_runs(db, redis_client) == 2
+
+
+async def test_a_flush_slower_than_the_lock_timeout_keeps_the_lock(db, redis_client, monkeypatch):
+    await record(redis_client, 3)
+    monkeypatch.setattr(task_runs, "FLUSH_LOCK_SECONDS", 0.3)
+    insert = task_runs._insert_runs
+
+    def slow_insert(db, rows):
+        time.sleep(1)
+        insert(db, rows)
+
+    monkeypatch.setattr(task_runs, "_insert_runs", slow_insert)
+    flush = asyncio.create_task(flush_task_runs(db, redis_client))
+    await asyncio.sleep(0.8)
+    # Well past the lock timeout, a second flush still finds the lock held.
+    assert await flush_task_runs(db, redis_client) == 0
+    assert await flush == 3
+
+    assert db.query(TaskRun).count() == 3
+    assert await redis_client.llen(PENDING_RUNS_KEY) == 0
+    assert not await redis_client.exists(FLUSH_LOCK_KEY)
+
+
+async def test_a_flush_that_lost_the_lock_leaves_the_batch(db, redis_client, redis_server, monkeypatch):
+    await record(redis_client, 2)
+    insert = task_runs._insert_runs
+
+    def insert_after_the_lock_moved_on(db, rows):
+        fakeredis.FakeRedis(server=redis_server).set(FLUSH_LOCK_KEY, "another flush")
+        insert(db, rows)
+
+    monkeypatch.setattr(task_runs, "_insert_runs", insert_after_the_lock_moved_on)
+    assert await flush_task_runs(db, redis_client) == 2
+    # The other flush owns the head of the list now; trimming it could drop records it hasn't written.
+    assert await redis_client.llen(PENDING_RUNS_KEY) == 2
+    assert await redis_client.get(FLUSH_LOCK_KEY) == "another flush"
+
+
+def test_percentiles():
+    assert percentiles([]) == {"p50": None, "p95": None, "p99": None}
+    assert percentiles(list(range(100, 0, -1))) == {"p50": 50, "p95": 95, "p99": 99}
@@ -0,0 +1,146 @@
+import uuid
+
+import pytest
+
+from app.db.enums import TaskStatusEnum, TaskTypeEnum
+from app.models import Task
+from app.schemas.enums import IntervalEnum
+from app.schemas.influencer import CreateMonitorTaskRequest
+from app.services.influencer import InfluencerService
+from app.services.post import PostService
+from app.services.tasks import paginate_tasks
+
+
+def add_task(db, task_type, key, status=TaskStatusEnum.active, interval_seconds=30):
+    task = Task(
+        id=str(uuid.uuid4()),
+        task_type=task_type,
+        username=key if task_type == TaskTypeEnum.influencer else None,
+        post_code=key if task_type == TaskTypeEnum.post else None,
+        interval_seconds=interval_seconds,
+        status=status,
+    )
+    db.add(task)
+    db.commit()
+    # Ids rather than instances: the services release the session after their DB work.
+    return task.id
+
+
+def test_keyset_pages_cover_every_task_once(db):
+    usernames = [f"user_{i:02d}" for i in range(25)]
+    for username in reversed(usernames):
+        add_task(db, TaskTypeEnum.influencer, username)
+    query = db.query(Task).filter(Task.task_type == TaskTypeEnum.influencer)
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = paginate_tasks(query, Task.username, 10, cursor)
+        seen += [task.username for task in page]
+        if cursor is None:
+            break
+    assert seen == usernames
+
+
+def test_last_full_page_has_no_cursor(db):
+    for i in range(10):
+        add_task(db, TaskTypeEnum.influencer, f"user_{i}")
+    page, cursor = paginate_tasks(db.query(Task), Task.username, 10)
+    assert len(page) == 10 and cursor is None
+
+
+def test_prefix_is_matched_literally(db):
+    for username in ("a_b", "a_bc", "axb", "a_"):
+        add_task(db, TaskTypeEnum.influencer, username)
+    page, _ = paginate_tasks(db.query(Task), Task.username, 10, prefix="a_b")
+    assert [task.username for task in page] == ["a_b", "a_bc"]
+
+
+def test_list_tasks_filters(db, redis_client):
+    add_task(db, TaskTypeEnum.influencer, "alice")
+    add_task(db, TaskTypeEnum.influencer, "bob", status=TaskStatusEnum.paused)
+    add_task(db, TaskTypeEnum.influencer, "carol", interval_seconds=3600)
+    add_task(db, TaskTypeEnum.post, "POST1")
+    service = InfluencerService(db, redis_client)
+    assert [t.username for t in service.list_tasks()[0]] == ["alice", "bob", "carol"]
+    assert [t.username for t in service.list_tasks(status=TaskStatusEnum.paused)[0]] == ["bob"]
+    assert [t.username for t in service.list_tasks(interval_seconds=3600)[0]] == ["carol"]
+    assert [t.username for t in service.list_tasks(cursor="alice", limit=1)[0]] == ["bob"]
+
+
+@pytest.mark.anyio
+async def test_status_changes_stay_within_the_service_type(db, redis_client):
+    post = add_task(db, TaskTypeEnum.post, "POST1")
+    influencers = InfluencerService(db, redis_client)
+    before = await influencers.task_summary()
+
+    assert influencers.get_task(post) is None
+    assert await influencers.update_task_status(post, TaskStatusEnum.paused) is None
+    assert await influencers.stop_tasks([post]) == []
+    assert db.get(Task, post).status == TaskStatusEnum.active
+    assert await influencers.task_summary() == before
+
+
+@pytest.mark.anyio
+async def test_counts_follow_status_changes(db, redis_client):
+    alice = add_task(db, TaskTypeEnum.influencer, "alice")
+    bob = add_task(db, TaskTypeEnum.influencer, "bob")
+    post = add_task(db, TaskTypeEnum.post, "POST1")
+    service = InfluencerService(db, redis_client)
+    await service.task_summary()
+
+    await service.update_task_status(alice, TaskStatusEnum.paused)
+    # Only tasks of this type that weren't stopped yet are reported.
+    assert await service.stop_tasks([bob, post, str(uuid.uuid4())]) == [bob]
+    assert await service.stop_tasks([bob]) == []
+
+    summary = await service.task_summary()
+    assert summary["total"] == 2
+    assert summary["by_status"] == {TaskStatusEnum.active: 0, TaskStatusEnum.paused: 1, TaskStatusEnum.stopped: 1}
+    assert (await PostService(db, redis_client).task_summary())["by_status"][TaskStatusEnum.active] == 1
+
+
+@pytest.mark.anyio
+async def test_a_write_overlapping_the_seed_query_keeps_counts_exact(db, redis_client, monkeypatch):
+    from app.services import tasks
+
+    add_task(db, TaskTypeEnum.influencer, "alice")
+    service = InfluencerService(db, redis_client)
+    real_run_blocking = tasks.run_blocking
+
+    async def create_after_count(func, *args, **kwargs):
+        rows = await real_run_blocking(func, *args, **kwargs)
+        # bob is created after the seed counted, but before it stores the counts.
+        async with service.task_counter.writing() as changes:
+            add_task(db, TaskTypeEnum.influencer, "bob")
+            changes[(TaskStatusEnum.active, 30)] += 1
+        return rows
+
+    monkeypatch.setattr(tasks, "run_blocking", create_after_count)
+    assert (await service.task_summary())["total"] == 1
+    monkeypatch.setattr(tasks, "run_blocking", real_run_blocking)
+    assert (await service.task_summary())["total"] == 2
+
+
+@pytest.mark.anyio
+async def test_a_seed_during_a_write_is_not_stored(db, redis_client):
+    service = InfluencerService(db, redis_client)
+    async with service.task_counter.writing() as changes:
+        add_task(db, TaskTypeEnum.influencer, "alice")
+        # Counted by the seed and adjusted below: storing the seed would count alice twice.
+        assert (await service.task_summary())["total"] == 1
+        changes[(TaskStatusEnum.active, 30)] += 1
+    assert (await service.task_summary())["total"] == 1
+
+    await service.create_monitor_task(CreateMonitorTaskRequest(username="bob", interval=IntervalEnum.thirty_seconds))
+    assert (await service.task_summary())["total"] == 2
+    assert await redis_client.hget(service.task_counter.key, "_seeded") == "1"
+
+
+@pytest.mark.anyio
+async def test_writes_that_never_finished_stop_blocking_the_seed(db, redis_client):
+    service = InfluencerService(db, redis_client)
+    add_task(db, TaskTypeEnum.influencer, "alice")
+    await redis_client.zadd(service.task_counter.writes_key, {"crashed": 0})
+    assert (await service.task_summary())["total"] == 1
+    assert await redis_client.hget(service.task_counter.key, "_seeded") == "1"
+    assert await redis_client.zcard(service.task_counter.writes_key) == 0
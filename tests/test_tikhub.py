@@ -0,0 +1,151 @@
+import httpx
+import orjson
+import pytest
+
+from app.core.config import settings
+from app.db.enums import TaskTypeEnum
+from app.services.engagement import EngagementEnricher, engagement_post_key
+from app.utils import tikhub
+from app.utils.tikhub import MetricsParser, PostCodesParser, extract_metrics, extract_recent_post_codes
+
+USER_INFO = {
+    "code": 200,
+    "data": {
+        "id": "25025320",
+        "username": "instagram",
+        "biography": "Discover what's new",
+        "follower_count": 690_000_000,
+        "following_count": 167,
+        "media_count": 8000,
+        "edge_owner_to_timeline_media": {"edges": [{"node": {"id": "1", "follower_count": 1}}]},
+    },
+}
+POST_DETAILS = {"code": 200, "data": {"id": "outer", "like_count": 1, "data": {"metrics": {"id": "42", "like_count": 150, "comment_count": 12, "play_count": None}}}}
+
+
+def user_posts(codes, nest=("data",), field="code"):
+    items = [{field: code, "caption": {"text": "x" * 100}, "carousel_media": [{"code": f"{code}-child"}]} for code in codes]
+    response = {"items": items, "more_available": True}
+    for key in reversed(nest):
+        response = {key: response}
+    return response
+
+
+def parse(parser, response, chunk_size=7):
+    body = orjson.dumps(response)
+    for i in range(0, len(body), chunk_size):
+        parser.feed(body[i:i + chunk_size])
+        if getattr(parser, "complete", False):
+            break
+    return parser.close()
+
+
+@pytest.fixture(params=["ijson", "buffered"])
+def parser_backend(request, monkeypatch):
+    if request.param == "buffered":
+        monkeypatch.setattr(tikhub, "ijson", None)
+    return request.param
+
+
+def test_metrics_parser_keeps_only_the_metric_fields(parser_backend):
+    assert parse(MetricsParser(TaskTypeEnum.influencer), USER_INFO) == {
+        "id": "25025320",
+        "biography": "Discover what's new",
+        "follower_count": 690_000_000,
+        "following_count": 167,
+        "media_count": 8000,
+    }
+
+
+def test_metrics_parser_prefers_the_nested_post_metrics(parser_backend):
+    assert parse(MetricsParser(TaskTypeEnum.post), POST_DETAILS) == {"id": "42", "like_count": 150, "comment_count": 12, "play_count": None}
+    flat = {"data": {"id": "7", "like_count": 3, "comment_count": 1}}
+    assert parse(MetricsParser(TaskTypeEnum.post), flat) == {"id": "7", "like_count": 3, "comment_count": 1}
+
+
+def test_metrics_parser_matches_extract_metrics(parser_backend):
+    for task_type, response in ((TaskTypeEnum.influencer, USER_INFO), (TaskTypeEnum.post, POST_DETAILS)):
+        fields = tikhub.METRIC_FIELDS[task_type][1]
+        expected = extract_metrics(task_type, response)
+        assert parse(MetricsParser(task_type), response, chunk_size=1) == {field: expected[field] for field in fields if field in expected}
+
+
+def test_metrics_parser_without_metrics_or_with_malformed_json(parser_backend):
+    assert parse(MetricsParser(TaskTypeEnum.influencer), {"code": 404, "data": None}) is None
+    parser = MetricsParser(TaskTypeEnum.influencer)
+    parser.feed(b'{"data": {"id": "1",')
+    with pytest.raises(Exception):
+        parser.close()
+
+
+@pytest.mark.parametrize("nest", [("data",), ("data", "data"), ("data", "data", "data")])
+def test_post_codes_parser_matches_extract_recent_post_codes(parser_backend, nest):
+    response = user_posts(["A", "B", "C"], nest)
+    assert parse(PostCodesParser(2), response) == extract_recent_post_codes(response, 2) == ["A", "B"]
+
+
+def test_post_codes_parser_reads_listed_items_and_shortcodes(parser_backend):
+    listed = {"data": [{"shortcode": "A"}, {"id": "no code"}, {"code": "B", "shortcode": "b"}]}
+    assert parse(PostCodesParser(5), listed) == extract_recent_post_codes(listed, 5) == ["A", "B"]
+    assert parse(PostCodesParser(5), user_posts(["X"], field="shortcode")) == ["X"]
+    assert parse(PostCodesParser(5), {"code": 500, "data": None}) == []
+
+
+def test_post_codes_parser_stops_once_it_has_enough_codes():
+    parser = PostCodesParser(2)
+    body = orjson.dumps(user_posts(["A", "B", "C"]))
+    parser.feed(body[:body.index(b'"C"')])
+    assert parser.complete
+    # The rest of the listing, truncated here, is never parsed.
+    assert parser.close() == ["A", "B"]
+
+
+@pytest.fixture
+def tikhub_server(monkeypatch):
+    """Serves `responses[path]` in small chunks and counts the chunks sent."""
+    responses, sent = {}, {"chunks": 0}
+
+    async def chunks(body):
+        for i in range(0, len(body), 64):
+            sent["chunks"] += 1
+            yield body[i:i + 64]
+
+    def handler(request):
+        body = orjson.dumps(responses[request.url.path])
+        return httpx.Response(200, content=chunks(body))
+
+    monkeypatch.setattr(tikhub, "TOKEN", "test")
+    monkeypatch.setattr(tikhub, "BASE_URL", "http://tikhub.test")
+    monkeypatch.setattr(tikhub, "transport", httpx.MockTransport(handler))
+    return responses, sent
+
+
+@pytest.mark.anyio
+async def test_recent_post_codes_are_streamed_and_bounded(tikhub_server, monkeypatch):
+    responses, sent = tikhub_server
+    responses["/posts"] = user_posts([f"P{i}" for i in range(200)])
+    body_chunks = -(-len(orjson.dumps(responses["/posts"])) // 64)
+
+    assert await tikhub.fetch_recent_post_codes_from_tikhub("/posts", {"username": "alice"}, 3) == ["P0", "P1", "P2"]
+    assert sent["chunks"] < body_chunks
+
+    monkeypatch.setattr(settings, "TIKHUB_MAX_RESPONSE_BYTES", 1024)
+    assert await tikhub.fetch_recent_post_codes_from_tikhub("/posts", {"username": "alice"}, 500) is None
+    timings = {}
+    assert await tikhub.fetch_metrics_from_tikhub(TaskTypeEnum.influencer, "/posts", {}, timings) is None
+    assert "bytes" not in timings
+
+
+@pytest.mark.anyio
+async def test_engagement_rate_from_streamed_listing(tikhub_server, db, redis_client, monkeypatch):
+    responses, _ = tikhub_server
+    monkeypatch.setattr(settings, "TIKHUB_USER_POSTS_ENDPOINT", "/posts")
+    responses["/posts"] = user_posts(["A", "B", "C"])
+    responses["/fetch_post_details_by_url"] = POST_DETAILS
+    await redis_client.set(engagement_post_key("B"), orjson.dumps({"like_count": 50, "comment_count": 0}))
+
+    enricher = EngagementEnricher(db, redis_client, recent_posts=2)
+    # A: 150 + 12 fetched, B: 50 cached, C is past the limit.
+    assert await enricher.engagement_rate("alice", 1000) == round((162 + 50) / 2 / 1000 * 100, 4)
+    assert orjson.loads(await redis_client.get(engagement_post_key("A"))) == {"like_count": 150, "comment_count": 12}
+    assert await redis_client.get(engagement_post_key("C")) is None
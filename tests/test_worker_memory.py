@@ -0,0 +1,76 @@
+import pytest
+from celery.signals import task_postrun
+
+from app.core.config import settings
+from app.worker import memory
+from app.worker.memory import MemoryWatchdog, is_recycled, rss_kb, watch_memory
+
+
+class FakeWorker:
+    """The parts of a WorkController that watch_memory uses."""
+
+    def __init__(self, pool_cls):
+        self.pool_cls = pool_cls
+        self.hostname = "celery@test"
+        self.shutdowns = []
+        control = type("Control", (), {"shutdown": lambda _, destination: self.shutdowns.append(destination)})()
+        self.app = type("App", (), {"control": control})()
+
+
+@pytest.fixture
+def worker(request, monkeypatch):
+    worker = FakeWorker(request.param)
+    yield worker
+    watchdog = getattr(worker, "memory_watchdog", None)
+    if watchdog:
+        task_postrun.disconnect(watchdog.check)
+
+
+def test_rss_is_readable():
+    assert rss_kb() > 1024
+
+
+def test_only_prefork_is_recycled_by_celery():
+    assert is_recycled("prefork")
+    assert not any(is_recycled(pool) for pool in ("gevent", "threads", "solo"))
+
+
+def test_watchdog_requests_one_shutdown_once_over_the_cap():
+    rss = iter([100, 300, 400])
+    shutdowns = []
+    watchdog = MemoryWatchdog("celery@test", shutdowns.append, max_kb=200, rss=lambda: next(rss))
+    for _ in range(3):
+        watchdog.check()
+    assert shutdowns == ["celery@test"]
+
+
+@pytest.mark.parametrize("worker", ["gevent"], indirect=True)
+def test_gevent_workers_shut_down_over_the_cap(worker, monkeypatch):
+    monkeypatch.setattr(settings, "WORKER_MAX_MEMORY_PER_CHILD_KB", 1)
+    watch_memory(sender=worker)
+    task_postrun.send(sender=None, task_id="t1")
+    task_postrun.send(sender=None, task_id="t2")
+    assert worker.shutdowns == [["celery@test"]]
+
+
+@pytest.mark.parametrize("worker", ["gevent"], indirect=True)
+def test_gevent_workers_under_the_cap_keep_running(worker, monkeypatch):
+    monkeypatch.setattr(settings, "WORKER_MAX_MEMORY_PER_CHILD_KB", 100 * 1024 * 1024)
+    watch_memory(sender=worker)
+    task_postrun.send(sender=None, task_id="t1")
+    assert worker.shutdowns == []
+
+
+@pytest.mark.parametrize("worker", ["prefork"], indirect=True)
+def test_prefork_workers_are_left_to_celery(worker, monkeypatch):
+    monkeypatch.setattr(settings, "WORKER_MAX_MEMORY_PER_CHILD_KB", 1)
+    watch_memory(sender=worker)
+    assert not hasattr(worker, "memory_watchdog")
+
+
+@pytest.mark.parametrize("worker", ["gevent"], indirect=True)
+def test_unreadable_rss_disables_the_watchdog(worker, monkeypatch):
+    monkeypatch.setattr(settings, "WORKER_MAX_MEMORY_PER_CHILD_KB", 1)
+    monkeypatch.setattr(memory, "rss_kb", lambda: None)
+    watch_memory(sender=worker)
+    assert not hasattr(worker, "memory_watchdog")